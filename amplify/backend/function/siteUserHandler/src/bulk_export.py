@@ -0,0 +1,293 @@
+"""
+Export en masse de la table des utilisateurs vers des fichiers compressés
+
+Usage:
+    python bulk_export.py ./export --segments 8 --compression zstd --max-bytes 268435456
+
+La table est lue par un scan parallèle segmenté (un thread par segment). Les
+éléments sont écrits au fil de l'eau en NDJSON compressé (gzip ou zstd) ou en
+Parquet (si pyarrow est installé), avec rotation des fichiers par taille.
+Un manifeste (manifest.json) recense les fichiers et leurs nombres de lignes
+ainsi que la clé de reprise de chaque segment : relancer la même commande
+reprend les segments inachevés là où ils s'étaient arrêtés.
+"""
+import argparse
+import gzip
+import json
+import os
+import sys
+import threading
+import time
+
+from user_model import json_default
+from user_service import REQUIRED_FIELDS, TABLE_NAME, get_dynamodb_resource, scan_users
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - dépendance optionnelle
+    zstandard = None
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # pragma: no cover - dépendance optionnelle
+    pyarrow = None
+
+MANIFEST_NAME = 'manifest.json'
+DEFAULT_SEGMENTS = 4
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+EXTENSIONS = {
+    ('ndjson', 'gzip'): '.ndjson.gz',
+    ('ndjson', 'zstd'): '.ndjson.zst',
+    ('ndjson', 'none'): '.ndjson',
+    ('parquet', 'none'): '.parquet'
+}
+
+class NdjsonPartWriter:
+    """Écrit un fichier NDJSON, compressé en gzip ou zstd"""
+
+    def __init__(self, path, compression):
+        self._raw = open(path, 'wb')
+        if compression == 'gzip':
+            self._stream = gzip.GzipFile(fileobj=self._raw, mode='wb')
+        elif compression == 'zstd':
+            self._stream = zstandard.ZstdCompressor().stream_writer(self._raw, closefd=False)
+        else:
+            self._stream = self._raw
+
+    def write(self, items):
+        lines = [json.dumps(item, default=json_default, separators=(',', ':')) for item in items]
+        if lines:
+            self._stream.write(('\n'.join(lines) + '\n').encode('utf-8'))
+
+    def size(self):
+        """Taille compressée écrite jusqu'ici (hors tampon du compresseur)"""
+        return self._raw.tell()
+
+    def close(self):
+        if self._stream is not self._raw:
+            self._stream.close()
+        self._raw.close()
+
+class ParquetPartWriter:
+    """
+    Écrit un fichier Parquet
+
+    Les champs du schéma utilisateur sont des colonnes ; les autres attributs
+    sont regroupés dans une colonne JSON 'attributes'.
+    """
+
+    def __init__(self, path, compression):
+        self._path = path
+        self._schema = pyarrow.schema(
+            [(field, pyarrow.string()) for field in REQUIRED_FIELDS] + [('attributes', pyarrow.string())]
+        )
+        self._writer = pyarrow.parquet.ParquetWriter(path, self._schema, compression='zstd')
+
+    def write(self, items):
+        if not items:
+            return
+        columns = {field: [item.get(field) for item in items] for field in REQUIRED_FIELDS}
+        columns['attributes'] = [
+            json.dumps({k: v for k, v in item.items() if k not in REQUIRED_FIELDS}, default=json_default)
+            for item in items
+        ]
+        self._writer.write_table(pyarrow.Table.from_pydict(columns, schema=self._schema))
+
+    def size(self):
+        return os.path.getsize(self._path)
+
+    def close(self):
+        self._writer.close()
+
+WRITERS = {
+    'ndjson': NdjsonPartWriter,
+    'parquet': ParquetPartWriter
+}
+
+class Manifest:
+    """
+    Manifeste de l'export, partagé entre les threads de segment
+
+    Il est réécrit de manière atomique à chaque fermeture de fichier.
+    """
+
+    def __init__(self, out_dir, total_segments, fmt, compression):
+        self.path = os.path.join(out_dir, MANIFEST_NAME)
+        self._lock = threading.Lock()
+        self.state = {
+            'table': TABLE_NAME,
+            'format': fmt,
+            'compression': compression,
+            'totalSegments': total_segments,
+            'rows': 0,
+            'segments': {}
+        }
+
+    def load(self):
+        """Recharge un manifeste existant s'il correspond aux mêmes paramètres"""
+        if not os.path.exists(self.path):
+            return
+
+        with open(self.path, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+
+        for key in ('table', 'format', 'compression', 'totalSegments'):
+            if state.get(key) != self.state[key]:
+                raise ValueError(f'Existing manifest has {key}={state.get(key)!r}, expected {self.state[key]!r}')
+
+        self.state = state
+
+    def segment(self, segment):
+        """Retourne (en le créant si besoin) l'état d'un segment"""
+        with self._lock:
+            return self.state['segments'].setdefault(
+                str(segment), {'status': 'running', 'lastKey': None, 'rows': 0, 'parts': []}
+            )
+
+    def add_part(self, segment, part, last_key):
+        """Enregistre un fichier terminé et la clé de reprise du segment"""
+        with self._lock:
+            state = self.state['segments'][str(segment)]
+            state['parts'].append(part)
+            state['rows'] += part['rows']
+            state['lastKey'] = last_key
+            if last_key is None:
+                state['status'] = 'done'
+            self.state['rows'] = sum(s['rows'] for s in self.state['segments'].values())
+            self._save()
+
+    def _save(self):
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.state, f, indent=2, default=json_default)
+        os.replace(tmp_path, self.path)
+
+def _part_name(segment, index, fmt, compression):
+    return f'segment-{segment:04d}-part-{index:05d}{EXTENSIONS[(fmt, compression)]}'
+
+def export_segment(segment, total_segments, out_dir, manifest, fmt, compression, max_bytes, table=None):
+    """
+    Exporte un segment du scan parallèle
+
+    La rotation des fichiers n'a lieu qu'entre deux pages du scan : la clé de
+    reprise enregistrée dans le manifeste correspond ainsi exactement au
+    dernier élément écrit dans le dernier fichier terminé.
+
+    Returns:
+        int: Nombre de lignes exportées par cet appel
+    """
+    state = manifest.segment(segment)
+    if state['status'] == 'done':
+        return 0
+
+    # Supprimer un éventuel fichier partiel laissé par un export interrompu
+    index = len(state['parts'])
+    partial = os.path.join(out_dir, _part_name(segment, index, fmt, compression))
+    if os.path.exists(partial):
+        os.remove(partial)
+
+    if table is None:
+        table = get_dynamodb_resource().Table(TABLE_NAME)
+
+    writer = None
+    rows = 0
+    exported = 0
+    pages = scan_users(table, segment, total_segments, exclusive_start_key=state['lastKey'])
+
+    for items, last_key in pages:
+        if writer is None:
+            name = _part_name(segment, index, fmt, compression)
+            writer = WRITERS[fmt](os.path.join(out_dir, name), compression)
+
+        writer.write(items)
+        rows += len(items)
+        exported += len(items)
+
+        if last_key is None or writer.size() >= max_bytes:
+            writer.close()
+            manifest.add_part(segment, {
+                'file': name,
+                'rows': rows,
+                'bytes': os.path.getsize(os.path.join(out_dir, name))
+            }, last_key)
+            writer = None
+            rows = 0
+            index += 1
+
+    return exported
+
+def export_users(out_dir, total_segments=DEFAULT_SEGMENTS, fmt='ndjson', compression='gzip',
+                 max_bytes=DEFAULT_MAX_BYTES, out=sys.stdout):
+    """
+    Exporte toute la table dans out_dir
+
+    Args:
+        out_dir (str): Répertoire de destination
+        total_segments (int): Nombre de segments (et de threads) du scan parallèle
+        fmt (str): 'ndjson' ou 'parquet'
+        compression (str): 'gzip', 'zstd' ou 'none' (ignoré pour parquet)
+        max_bytes (int): Taille à partir de laquelle un fichier est fermé
+        out: Flux recevant le résumé
+
+    Returns:
+        dict: Résultat avec success (bool), rows, manifest et errors
+    """
+    if fmt == 'parquet':
+        if pyarrow is None:
+            return {'success': False, 'errors': ['Parquet export requires pyarrow']}
+        compression = 'none'
+    elif compression == 'zstd' and zstandard is None:
+        return {'success': False, 'errors': ['zstd compression requires the zstandard package']}
+
+    os.makedirs(out_dir, exist_ok=True)
+    manifest = Manifest(out_dir, total_segments, fmt, compression)
+    try:
+        manifest.load()
+    except ValueError as e:
+        return {'success': False, 'errors': [str(e)]}
+
+    errors = []
+    started_at = time.monotonic()
+
+    def run(segment):
+        try:
+            export_segment(segment, total_segments, out_dir, manifest, fmt, compression, max_bytes)
+        except Exception as e:
+            errors.append(f'Segment {segment}: {str(e)}')
+
+    threads = [threading.Thread(target=run, args=(segment,)) for segment in range(total_segments)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    elapsed = max(time.monotonic() - started_at, 1e-6)
+    rows = manifest.state['rows']
+    print(f'exported rows={rows} segments={total_segments} elapsed={elapsed:.1f}s errors={len(errors)}', file=out)
+
+    return {
+        'success': not errors,
+        'rows': rows,
+        'manifest': manifest.path,
+        'errors': errors
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Export the user table to compressed files')
+    parser.add_argument('out_dir', help='Destination directory')
+    parser.add_argument('--segments', type=int, default=DEFAULT_SEGMENTS)
+    parser.add_argument('--format', choices=sorted(WRITERS), default='ndjson')
+    parser.add_argument('--compression', choices=['gzip', 'zstd', 'none'], default='gzip')
+    parser.add_argument('--max-bytes', type=int, default=DEFAULT_MAX_BYTES)
+    args = parser.parse_args(argv)
+
+    result = export_users(args.out_dir, args.segments, args.format, args.compression, args.max_bytes)
+
+    for error in result['errors']:
+        print(f'Error: {error}', file=sys.stderr)
+    return 0 if result['success'] else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
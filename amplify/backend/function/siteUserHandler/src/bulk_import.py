@@ -0,0 +1,378 @@
+"""
+Import en masse d'utilisateurs depuis un fichier NDJSON ou CSV
+
+Usage:
+    python bulk_import.py users.ndjson --workers 8 --checkpoint users.ckpt
+
+Le fichier est lu en flux par une chaîne de générateurs (lecture -> validation
+-> paquets), puis écrit dans DynamoDB par des threads d'écriture alimentés par
+une file bornée : la mémoire reste constante quelle que soit la taille du
+fichier. Le point de reprise (nombre de lignes entièrement traitées) est
+enregistré régulièrement pour pouvoir relancer un import interrompu.
+"""
+import argparse
+import csv
+import gzip
+import heapq
+import json
+import os
+import queue
+import sys
+import threading
+import time
+
+from user_service import BATCH_WRITE_SIZE, batch_write_users, get_dynamodb_resource, validate_user
+
+DEFAULT_WORKERS = 4
+DEFAULT_PROGRESS_INTERVAL = 5.0
+
+def detect_format(path):
+    """
+    Déduit le format du fichier depuis son extension
+
+    Args:
+        path (str): Chemin du fichier (éventuellement suffixé par .gz)
+
+    Returns:
+        str: 'ndjson' ou 'csv'
+    """
+    name = path[:-3] if path.endswith('.gz') else path
+    if name.endswith('.csv'):
+        return 'csv'
+    return 'ndjson'
+
+def open_source(path):
+    """Ouvre le fichier source en texte, en le décompressant s'il se termine par .gz"""
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8', newline='')
+    return open(path, 'r', encoding='utf-8', newline='')
+
+def read_rows(stream, fmt):
+    """
+    Lit les lignes du fichier une par une
+
+    Args:
+        stream: Flux texte ouvert
+        fmt (str): 'ndjson' ou 'csv'
+
+    Yields:
+        tuple: (données, erreur) - données vaut None si la ligne est illisible
+    """
+    if fmt == 'csv':
+        for row in csv.DictReader(stream):
+            # Les cellules vides sont considérées comme absentes
+            yield {key: value for key, value in row.items() if key and value != ''}, None
+        return
+
+    for line in stream:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line), None
+        except json.JSONDecodeError as e:
+            yield None, f'Invalid JSON: {str(e)}'
+
+def validate_rows(rows, start_offset=0):
+    """
+    Numérote et valide les lignes, en sautant celles déjà importées
+
+    Args:
+        rows: Générateur produit par read_rows
+        start_offset (int): Nombre de lignes déjà traitées lors d'un import précédent
+
+    Yields:
+        tuple: (numéro de ligne, utilisateur, erreur)
+    """
+    for row_number, (data, error) in enumerate(rows):
+        if row_number < start_offset:
+            continue
+        if error is None:
+            error = validate_user(data)
+        yield row_number, data, error
+
+def batch_rows(validated, batch_size, on_reject):
+    """
+    Regroupe les utilisateurs valides en paquets
+
+    Chaque paquet couvre un intervalle contigu de lignes [start, end[ qui
+    inclut les lignes rejetées situées juste avant lui, afin que le point de
+    reprise puisse avancer sans trou.
+
+    DynamoDB refuse un BatchWriteItem contenant deux fois la même clé : si un
+    userId revient dans le même paquet, la dernière ligne l'emporte et la
+    précédente est rejetée.
+
+    Yields:
+        tuple: (start, end, utilisateurs)
+    """
+    batch = []
+    positions = {}
+    start = None
+    end = None
+
+    for row_number, data, error in validated:
+        if start is None:
+            start = row_number
+        end = row_number + 1
+
+        if error:
+            on_reject(row_number, data, error)
+            continue
+
+        previous = positions.get(data['userId'])
+        if previous is not None:
+            position, previous_row = previous
+            on_reject(previous_row, batch[position], f'Duplicate userId {data["userId"]}: superseded by row {row_number}')
+            batch[position] = data
+            positions[data['userId']] = (position, row_number)
+            continue
+
+        positions[data['userId']] = (len(batch), row_number)
+        batch.append(data)
+        if len(batch) >= batch_size:
+            yield start, end, batch
+            batch = []
+            positions = {}
+            start = None
+
+    if start is not None:
+        yield start, end, batch
+
+class Checkpoint:
+    """
+    Point de reprise d'un import
+
+    Les paquets se terminent dans le désordre (écritures parallèles) : seul
+    le préfixe contigu de lignes terminées est enregistré comme offset.
+    """
+
+    def __init__(self, path, source):
+        self.path = path
+        self.source = os.path.abspath(source)
+        self.offset = 0
+        self._completed = []
+        self._dirty = False
+        self._lock = threading.Lock()
+
+    def load(self):
+        """Recharge l'offset enregistré s'il concerne le même fichier source"""
+        if not self.path or not os.path.exists(self.path):
+            return self.offset
+
+        with open(self.path, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+
+        if state.get('source') != self.source:
+            print(f'Checkpoint {self.path} belongs to {state.get("source")}, ignoring it')
+            return self.offset
+
+        self.offset = state.get('offset', 0)
+        return self.offset
+
+    def complete(self, start, end):
+        """Marque les lignes [start, end[ comme traitées"""
+        with self._lock:
+            heapq.heappush(self._completed, (start, end))
+            while self._completed and self._completed[0][0] <= self.offset:
+                _, done_end = heapq.heappop(self._completed)
+                self.offset = max(self.offset, done_end)
+                self._dirty = True
+
+    def save(self):
+        """Enregistre l'offset de manière atomique (fichier temporaire + rename)"""
+        with self._lock:
+            if not self.path or not self._dirty:
+                return
+            state = {'source': self.source, 'offset': self.offset, 'updatedAt': time.time()}
+            self._dirty = False
+
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self.path)
+
+class ImportStats:
+    """Compteurs partagés entre les threads d'écriture"""
+
+    def __init__(self):
+        self.written = 0
+        self.rejected = 0
+        self.failed = 0
+        self.consumed_capacity = 0.0
+        self.errors = []
+        self.started_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def record_batch(self, result, size):
+        with self._lock:
+            self.written += result.get('written', 0)
+            self.consumed_capacity += result.get('consumedCapacity', 0.0)
+            if not result['success']:
+                self.failed += size - result.get('written', 0)
+                self.errors.append(result.get('error', 'Unprocessed items after retries'))
+
+    def record_failure(self, error, size):
+        with self._lock:
+            self.failed += size
+            self.errors.append(error)
+
+    def record_reject(self):
+        with self._lock:
+            self.rejected += 1
+
+    def report(self):
+        """Retourne une ligne de progression (lignes/s et WCU consommées)"""
+        elapsed = max(time.monotonic() - self.started_at, 1e-6)
+        return (
+            f'written={self.written} rejected={self.rejected} failed={self.failed} '
+            f'rows/s={self.written / elapsed:.0f} '
+            f'WCU={self.consumed_capacity:.1f} WCU/s={self.consumed_capacity / elapsed:.1f}'
+        )
+
+def _writer(batches, checkpoint, stats, stop):
+    """
+    Thread d'écriture : consomme les paquets de la file jusqu'au marqueur de fin
+
+    Une erreur inattendue (ressource DynamoDB impossible à créer, identifiants
+    invalides...) arrête l'import, mais le thread continue de vider la file :
+    le lecteur, bloqué sur une file pleine, n'attend jamais indéfiniment.
+    """
+    dynamodb = None
+
+    while True:
+        item = batches.get()
+        try:
+            if item is None:
+                return
+            start, end, users = item
+            if stop.is_set():
+                continue
+
+            if dynamodb is None:
+                dynamodb = get_dynamodb_resource()
+            result = batch_write_users(users, dynamodb) if users else {'success': True}
+            stats.record_batch(result, len(users))
+
+            if result['success']:
+                checkpoint.complete(start, end)
+            else:
+                # On arrête l'import : l'offset reste avant le paquet en échec
+                stop.set()
+        except Exception as e:
+            stats.record_failure(f'Writer error: {str(e)}', len(users))
+            stop.set()
+        finally:
+            batches.task_done()
+
+def import_users(path, fmt=None, workers=DEFAULT_WORKERS, batch_size=BATCH_WRITE_SIZE,
+                 checkpoint_path=None, reject_path=None,
+                 progress_interval=DEFAULT_PROGRESS_INTERVAL, out=sys.stdout):
+    """
+    Importe les utilisateurs d'un fichier NDJSON ou CSV dans DynamoDB
+
+    Les écritures sont des écrasements (BatchWriteItem) : relancer un import
+    depuis son point de reprise est donc sans effet de bord.
+
+    Args:
+        path (str): Fichier source (.ndjson, .jsonl, .csv, éventuellement .gz)
+        fmt (str): Format forcé ('ndjson' ou 'csv'), déduit de l'extension sinon
+        workers (int): Nombre de threads d'écriture
+        batch_size (int): Nombre d'utilisateurs par paquet
+        checkpoint_path (str): Fichier de reprise (optionnel)
+        reject_path (str): Fichier NDJSON recevant les lignes rejetées (optionnel)
+        progress_interval (float): Intervalle d'affichage de la progression en secondes
+        out: Flux recevant les lignes de progression
+
+    Returns:
+        dict: Résultat avec success (bool), offset, written, rejected, failed,
+              consumedCapacity et errors
+    """
+    fmt = fmt or detect_format(path)
+    checkpoint = Checkpoint(checkpoint_path, path)
+    start_offset = checkpoint.load()
+    if start_offset:
+        print(f'Resuming import of {path} at row {start_offset}', file=out)
+
+    stats = ImportStats()
+    stop = threading.Event()
+    # File bornée : le lecteur est freiné quand les écritures prennent du retard
+    batches = queue.Queue(maxsize=workers * 2)
+    threads = [
+        threading.Thread(target=_writer, args=(batches, checkpoint, stats, stop), daemon=True)
+        for _ in range(workers)
+    ]
+    for thread in threads:
+        thread.start()
+
+    reject_file = open(reject_path, 'a', encoding='utf-8') if reject_path else None
+
+    def on_reject(row_number, data, error):
+        stats.record_reject()
+        if reject_file:
+            reject_file.write(json.dumps({'row': row_number, 'error': error, 'data': data}, default=str) + '\n')
+
+    last_progress = time.monotonic()
+    try:
+        with open_source(path) as stream:
+            validated = validate_rows(read_rows(stream, fmt), start_offset)
+            for batch in batch_rows(validated, batch_size, on_reject):
+                if stop.is_set():
+                    break
+                batches.put(batch)
+
+                now = time.monotonic()
+                if now - last_progress >= progress_interval:
+                    checkpoint.save()
+                    print(stats.report(), file=out)
+                    last_progress = now
+    finally:
+        for _ in threads:
+            batches.put(None)
+        for thread in threads:
+            thread.join()
+        if reject_file:
+            reject_file.close()
+        checkpoint.save()
+
+    print(stats.report(), file=out)
+
+    return {
+        'success': not stop.is_set(),
+        'offset': checkpoint.offset,
+        'written': stats.written,
+        'rejected': stats.rejected,
+        'failed': stats.failed,
+        'consumedCapacity': stats.consumed_capacity,
+        'errors': stats.errors
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Bulk import users into DynamoDB')
+    parser.add_argument('path', help='NDJSON or CSV file (optionally gzipped)')
+    parser.add_argument('--format', choices=['ndjson', 'csv'], help='Force the input format')
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS)
+    parser.add_argument('--batch-size', type=int, default=BATCH_WRITE_SIZE)
+    parser.add_argument('--checkpoint', help='Checkpoint file used to resume the import')
+    parser.add_argument('--rejects', help='NDJSON file receiving rejected rows')
+    parser.add_argument('--progress-interval', type=float, default=DEFAULT_PROGRESS_INTERVAL)
+    args = parser.parse_args(argv)
+
+    result = import_users(
+        args.path,
+        fmt=args.format,
+        workers=args.workers,
+        batch_size=args.batch_size,
+        checkpoint_path=args.checkpoint or f'{args.path}.checkpoint',
+        reject_path=args.rejects,
+        progress_interval=args.progress_interval
+    )
+
+    if not result['success']:
+        for error in result['errors']:
+            print(f'Error: {error}', file=sys.stderr)
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
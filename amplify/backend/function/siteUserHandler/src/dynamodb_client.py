@@ -0,0 +1,319 @@
+"""
+Accès DynamoDB par le client bas niveau avec une (dé)sérialisation spécialisée
+
+La couche resource de boto3 convertit chaque valeur avec TypeSerializer /
+TypeDeserializer (une suite de tests de type par valeur, des Decimal en
+sortie). Pour le schéma utilisateur, dont les types d'attributs sont connus,
+UserMarshaller précalcule un encodeur/décodeur par attribut et renvoie des
+types Python simples (int/float au lieu de Decimal). Les attributs hors schéma
+passent par une conversion générique plus légère.
+
+ClientDynamoDB et ClientUserTable reproduisent l'interface de la resource
+utilisée par user_service (Table, get_item, put_item, scan, batch_*) : le
+moteur est choisi avec USER_DB_ENGINE=client.
+
+Banc d'essai (sans réseau) :
+    python dynamodb_client.py --bench
+"""
+import argparse
+import sys
+import threading
+import timeit
+from decimal import Decimal
+
+import boto3
+from boto3.dynamodb.types import Binary
+
+# Types des attributs du schéma utilisateur
+USER_SCHEMA = {
+    'userId': 'S',
+    'name': 'S',
+    'email': 'S',
+    'version': 'N',
+    'updatedAt': 'S'
+}
+
+def _number(text):
+    """Convertit un nombre DynamoDB en int ou float (sans Decimal)"""
+    if '.' in text or 'e' in text or 'E' in text:
+        return float(text)
+    return int(text)
+
+def _number_text(value):
+    if isinstance(value, float) and value == int(value) and abs(value) < 1e15:
+        return str(int(value))
+    return str(value)
+
+def to_attribute(value):
+    """Conversion générique d'une valeur Python en AttributeValue"""
+    value_type = type(value)
+    if value_type is str:
+        return {'S': value}
+    if value_type is bool:
+        return {'BOOL': value}
+    if value_type in (int, float, Decimal):
+        return {'N': _number_text(value)}
+    if value is None:
+        return {'NULL': True}
+    if value_type is dict:
+        return {'M': {k: to_attribute(v) for k, v in value.items()}}
+    if value_type in (list, tuple):
+        return {'L': [to_attribute(v) for v in value]}
+    if value_type in (bytes, bytearray):
+        return {'B': bytes(value)}
+    if value_type is Binary:
+        return {'B': value.value}
+    if value_type in (set, frozenset):
+        if not value:
+            raise TypeError('DynamoDB does not support empty sets')
+        sample = next(iter(value))
+        if isinstance(sample, str):
+            return {'SS': list(value)}
+        if isinstance(sample, (bytes, bytearray)):
+            return {'BS': [bytes(v) for v in value]}
+        return {'NS': [_number_text(v) for v in value]}
+    if isinstance(value, dict):
+        return {'M': {k: to_attribute(v) for k, v in value.items()}}
+    raise TypeError(f'Unsupported type {value_type.__name__} for DynamoDB')
+
+def from_attribute(attribute):
+    """Conversion générique d'un AttributeValue en valeur Python simple"""
+    (kind, value), = attribute.items()
+    if kind == 'S':
+        return value
+    if kind == 'N':
+        return _number(value)
+    if kind == 'BOOL':
+        return value
+    if kind == 'M':
+        return {k: from_attribute(v) for k, v in value.items()}
+    if kind == 'L':
+        return [from_attribute(v) for v in value]
+    if kind == 'NULL':
+        return None
+    if kind == 'SS':
+        return set(value)
+    if kind == 'NS':
+        return {_number(v) for v in value}
+    if kind == 'B':
+        return value
+    if kind == 'BS':
+        return set(value)
+    raise TypeError(f'Unsupported DynamoDB type {kind}')
+
+def _encode_s(value):
+    if type(value) is str:
+        return {'S': value}
+    return to_attribute(value)
+
+def _encode_n(value):
+    if type(value) in (int, float):
+        return {'N': _number_text(value)}
+    return to_attribute(value)
+
+def _decode_s(attribute):
+    value = attribute.get('S')
+    return value if value is not None else from_attribute(attribute)
+
+def _decode_n(attribute):
+    value = attribute.get('N')
+    return _number(value) if value is not None else from_attribute(attribute)
+
+ENCODERS = {'S': _encode_s, 'N': _encode_n}
+DECODERS = {'S': _decode_s, 'N': _decode_n}
+
+class UserMarshaller:
+    """
+    (Dé)sérialiseur précalculé pour un schéma d'attributs connu
+
+    Args:
+        schema (dict): nom d'attribut -> type DynamoDB ('S' ou 'N')
+    """
+
+    def __init__(self, schema=USER_SCHEMA):
+        self.schema = dict(schema)
+        self._encoders = {name: ENCODERS[kind] for name, kind in schema.items()}
+        self._decoders = {name: DECODERS[kind] for name, kind in schema.items()}
+
+    def serialize(self, item):
+        encoders = self._encoders
+        return {
+            name: (encoders[name] if name in encoders else to_attribute)(value)
+            for name, value in item.items()
+        }
+
+    def deserialize(self, item):
+        decoders = self._decoders
+        return {
+            name: (decoders[name] if name in decoders else from_attribute)(value)
+            for name, value in item.items()
+        }
+
+_client = None
+_client_lock = threading.Lock()
+
+def get_client():
+    """Retourne le client DynamoDB bas niveau du conteneur (thread-safe, réutilisé)"""
+    global _client
+
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = boto3.client('dynamodb')
+    return _client
+
+def _serialize_values(kwargs, marshaller):
+    if 'ExpressionAttributeValues' in kwargs:
+        kwargs['ExpressionAttributeValues'] = marshaller.serialize(kwargs['ExpressionAttributeValues'])
+    if kwargs.get('ExclusiveStartKey'):
+        kwargs['ExclusiveStartKey'] = marshaller.serialize(kwargs['ExclusiveStartKey'])
+    return kwargs
+
+class ClientUserTable:
+    """Équivalent de resource.Table(name) sur le client bas niveau"""
+
+    def __init__(self, table_name, client=None, marshaller=None):
+        self.table_name = table_name
+        self.client = client or get_client()
+        self.marshaller = marshaller or UserMarshaller()
+
+    def get_item(self, Key, **kwargs):
+        response = self.client.get_item(TableName=self.table_name, Key=self.marshaller.serialize(Key), **kwargs)
+        if 'Item' in response:
+            response['Item'] = self.marshaller.deserialize(response['Item'])
+        return response
+
+    def put_item(self, Item, **kwargs):
+        kwargs = _serialize_values(kwargs, self.marshaller)
+        response = self.client.put_item(TableName=self.table_name, Item=self.marshaller.serialize(Item), **kwargs)
+        if 'Attributes' in response:
+            response['Attributes'] = self.marshaller.deserialize(response['Attributes'])
+        return response
+
+    def scan(self, **kwargs):
+        kwargs = _serialize_values(kwargs, self.marshaller)
+        response = self.client.scan(TableName=self.table_name, **kwargs)
+        deserialize = self.marshaller.deserialize
+        response['Items'] = [deserialize(item) for item in response.get('Items', [])]
+        if 'LastEvaluatedKey' in response:
+            response['LastEvaluatedKey'] = deserialize(response['LastEvaluatedKey'])
+        return response
+
+class ClientDynamoDB:
+    """Équivalent de boto3.resource('dynamodb') pour les appels utilisés par user_service"""
+
+    def __init__(self, client=None, marshaller=None):
+        self.client = client or get_client()
+        self.marshaller = marshaller or UserMarshaller()
+
+    def Table(self, table_name):
+        return ClientUserTable(table_name, self.client, self.marshaller)
+
+    def batch_write_item(self, RequestItems, **kwargs):
+        serialize = self.marshaller.serialize
+        requests = {}
+        for table_name, table_requests in RequestItems.items():
+            requests[table_name] = [
+                {'PutRequest': {'Item': serialize(r['PutRequest']['Item'])}} if 'PutRequest' in r
+                else {'DeleteRequest': {'Key': serialize(r['DeleteRequest']['Key'])}}
+                for r in table_requests
+            ]
+
+        response = self.client.batch_write_item(RequestItems=requests, **kwargs)
+
+        deserialize = self.marshaller.deserialize
+        unprocessed = {}
+        for table_name, table_requests in response.get('UnprocessedItems', {}).items():
+            unprocessed[table_name] = [
+                {'PutRequest': {'Item': deserialize(r['PutRequest']['Item'])}} if 'PutRequest' in r
+                else {'DeleteRequest': {'Key': deserialize(r['DeleteRequest']['Key'])}}
+                for r in table_requests
+            ]
+        response['UnprocessedItems'] = unprocessed
+        return response
+
+    def batch_get_item(self, RequestItems, **kwargs):
+        serialize = self.marshaller.serialize
+        requests = {
+            table_name: dict(request, Keys=[serialize(key) for key in request['Keys']])
+            for table_name, request in RequestItems.items()
+        }
+
+        response = self.client.batch_get_item(RequestItems=requests, **kwargs)
+
+        deserialize = self.marshaller.deserialize
+        response['Responses'] = {
+            table_name: [deserialize(item) for item in items]
+            for table_name, items in response.get('Responses', {}).items()
+        }
+        response['UnprocessedKeys'] = {
+            table_name: dict(request, Keys=[deserialize(key) for key in request['Keys']])
+            for table_name, request in response.get('UnprocessedKeys', {}).items()
+        }
+        return response
+
+def sample_item(width=40):
+    """Utilisateur réaliste : champs du schéma, profil imbriqué et attributs libres"""
+    item = {
+        'userId': 'user-0001234567',
+        'name': 'Jeanne Dupont-Moreau',
+        'email': 'jeanne.dupont-moreau@example.com',
+        'profile': {
+            'bio': 'Product designer based in Lyon. ' * 4,
+            'company': 'Example SAS',
+            'age': 34,
+            'score': 87.5,
+            'links': ['https://example.com/jeanne', 'https://social.example/@jeanne']
+        },
+        'tags': ['design', 'ux', 'beta', 'newsletter'],
+        'active': True
+    }
+    for index in range(width):
+        item[f'attr{index:02d}'] = f'value-{index}' if index % 2 else index * 10
+    return item
+
+def benchmark(width=40, number=2000, out=sys.stdout):
+    """
+    Compare la couche resource (TypeSerializer/TypeDeserializer) au marshaller
+
+    Returns:
+        dict: Débits (éléments/s) en sérialisation et désérialisation pour chaque chemin
+    """
+    from boto3.dynamodb.types import TypeDeserializer, TypeSerializer
+
+    serializer = TypeSerializer()
+    deserializer = TypeDeserializer()
+    marshaller = UserMarshaller()
+
+    plain = sample_item(width)
+    # La couche resource attend des Decimal pour les nombres
+    resource_item = {k: deserializer.deserialize(v) for k, v in marshaller.serialize(plain).items()}
+    wire_item = {k: serializer.serialize(v) for k, v in resource_item.items()}
+
+    timings = {
+        'resource.serialize': lambda: {k: serializer.serialize(v) for k, v in resource_item.items()},
+        'resource.deserialize': lambda: {k: deserializer.deserialize(v) for k, v in wire_item.items()},
+        'client.serialize': lambda: marshaller.serialize(plain),
+        'client.deserialize': lambda: marshaller.deserialize(wire_item)
+    }
+
+    results = {}
+    for label, function in timings.items():
+        elapsed = min(timeit.repeat(function, number=number, repeat=3))
+        results[label] = number / elapsed
+        print(f'{label:<22} {results[label]:>12,.0f} items/s  ({len(wire_item)} attributes)', file=out)
+    return results
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark DynamoDB item (de)serialisation')
+    parser.add_argument('--bench', action='store_true', help='Run the serialisation benchmark')
+    parser.add_argument('--width', type=int, default=40, help='Number of extra attributes per item')
+    parser.add_argument('--number', type=int, default=2000, help='Iterations per measurement')
+    args = parser.parse_args(argv)
+
+    if args.bench:
+        benchmark(args.width, args.number)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,203 @@
+"""
+Normalisation des événements HTTP (API Gateway REST v1, HTTP API v2, ALB)
+
+parse_request détecte le format une seule fois et retourne une requête dont
+les champs ne sont lus dans l'événement qu'au premier accès : une route qui
+n'utilise ni les headers ni la query string ne les analyse jamais.
+
+    Format        Méthode / chemin                          Query string
+    REST (v1)     httpMethod / path                         queryStringParameters
+    HTTP API (v2) requestContext.http.method / rawPath      rawQueryString
+    ALB           httpMethod / path                         (multiValue)queryStringParameters, encodées
+
+Les corps base64 sont décodés directement en bytes (json.loads les accepte
+tels quels, sans copie intermédiaire en str). respond() adapte la réponse du
+handler au format attendu (statusDescription et multiValueHeaders pour l'ALB).
+"""
+import binascii
+from http import HTTPStatus
+from urllib.parse import parse_qsl, unquote_plus
+
+class InvalidBodyError(ValueError):
+    """Corps annoncé en base64 mais impossible à décoder (erreur du client)"""
+
+class HttpRequest:
+    """Requête API Gateway REST (payload v1)"""
+
+    __slots__ = ('event', '_headers', '_query', '_body')
+
+    format = 'rest'
+
+    def __init__(self, event):
+        self.event = event
+        self._headers = None
+        self._query = None
+        self._body = None
+
+    @property
+    def method(self):
+        return self.event.get('httpMethod')
+
+    @property
+    def path(self):
+        return self.event.get('path') or ''
+
+    def _read_headers(self):
+        return {name.lower(): value for name, value in (self.event.get('headers') or {}).items()}
+
+    def _read_query(self):
+        return self.event.get('queryStringParameters') or {}
+
+    @property
+    def headers(self):
+        """Headers, noms en minuscules"""
+        if self._headers is None:
+            self._headers = self._read_headers()
+        return self._headers
+
+    def header(self, name):
+        """Valeur d'un header, sans tenir compte de la casse"""
+        return self.headers.get(name.lower())
+
+    @property
+    def query(self):
+        """Paramètres de la query string (dernière valeur pour un nom répété)"""
+        if self._query is None:
+            self._query = self._read_query()
+        return self._query
+
+    @property
+    def body(self):
+        """
+        Corps de la requête : str, bytes s'il était encodé en base64, ou None
+
+        Raises:
+            InvalidBodyError: Le corps base64 est mal formé
+        """
+        if self._body is None:
+            body = self.event.get('body')
+            if body and self.event.get('isBase64Encoded'):
+                try:
+                    body = binascii.a2b_base64(body)
+                except ValueError as e:
+                    # binascii.Error, ou caractères non ASCII dans une str
+                    raise InvalidBodyError(f'Invalid base64 request body: {str(e)}') from e
+            self._body = body
+        return self._body or None
+
+    @property
+    def source_ip(self):
+        return ((self.event.get('requestContext') or {}).get('identity') or {}).get('sourceIp')
+
+    @property
+    def api_key(self):
+        """Clé d'API validée par API Gateway (méthodes avec apiKeyRequired), sinon None"""
+        return ((self.event.get('requestContext') or {}).get('identity') or {}).get('apiKey')
+
+    def respond(self, response):
+        """Adapte la réponse du handler au format de l'événement"""
+        return response
+
+class HttpApiRequest(HttpRequest):
+    """Requête API Gateway HTTP API (payload v2)"""
+
+    __slots__ = ()
+
+    format = 'http'
+
+    @property
+    def method(self):
+        return self.event['requestContext']['http']['method']
+
+    @property
+    def path(self):
+        return self.event.get('rawPath') or '/'
+
+    def _read_headers(self):
+        # Les noms de headers v2 sont déjà en minuscules
+        return self.event.get('headers') or {}
+
+    def _read_query(self):
+        raw_query = self.event.get('rawQueryString')
+        return dict(parse_qsl(raw_query, keep_blank_values=True)) if raw_query else {}
+
+    @property
+    def source_ip(self):
+        return self.event['requestContext']['http'].get('sourceIp')
+
+    @property
+    def api_key(self):
+        # HTTP API ne gère pas les clés d'API
+        return None
+
+class AlbRequest(HttpRequest):
+    """Requête transmise par un Application Load Balancer"""
+
+    __slots__ = ()
+
+    format = 'alb'
+
+    def _read_headers(self):
+        multi_headers = self.event.get('multiValueHeaders')
+        if multi_headers is not None:
+            return {name.lower(): values[-1] for name, values in multi_headers.items() if values}
+        return {name.lower(): value for name, value in (self.event.get('headers') or {}).items()}
+
+    def _read_query(self):
+        # L'ALB transmet la query string sans la décoder
+        multi_query = self.event.get('multiValueQueryStringParameters')
+        if multi_query is not None:
+            return {unquote_plus(name): unquote_plus(values[-1]) for name, values in multi_query.items() if values}
+        return {unquote_plus(name): unquote_plus(value) for name, value in (self.event.get('queryStringParameters') or {}).items()}
+
+    @property
+    def source_ip(self):
+        # L'ALB ajoute l'adresse du client à la fin : les entrées précédentes
+        # viennent de la requête et peuvent être falsifiées
+        forwarded = self.header('X-Forwarded-For')
+        if not forwarded:
+            return None
+        return forwarded.rsplit(',', 1)[-1].strip() or None
+
+    @property
+    def api_key(self):
+        # L'ALB ne valide aucune clé d'API
+        return None
+
+    def respond(self, response):
+        status = int(response.get('statusCode', 200))
+        try:
+            description = f'{status} {HTTPStatus(status).phrase}'
+        except ValueError:
+            description = str(status)
+
+        formatted = {
+            'statusCode': status,
+            'statusDescription': description,
+            'isBase64Encoded': bool(response.get('isBase64Encoded', False)),
+            'body': response.get('body') or ''
+        }
+        headers = response.get('headers') or {}
+        # Avec les headers multi-valeurs activés, l'ALB ignore le champ headers
+        if 'multiValueHeaders' in self.event:
+            multi_headers = {name: [str(value)] for name, value in headers.items()}
+            for name, values in (response.get('multiValueHeaders') or {}).items():
+                multi_headers.setdefault(name, []).extend(values)
+            formatted['multiValueHeaders'] = multi_headers
+        else:
+            formatted['headers'] = headers
+        return formatted
+
+def parse_request(event):
+    """
+    Détecte le format d'un événement HTTP
+
+    Returns:
+        HttpRequest: Requête REST (v1), HTTP API (v2) ou ALB
+    """
+    request_context = event.get('requestContext')
+    if request_context and 'elb' in request_context:
+        return AlbRequest(event)
+    if event.get('version') == '2.0':
+        return HttpApiRequest(event)
+    return HttpRequest(event)
@@ -1,6 +1,17 @@
 import json
+import math
 import os
+import profiling
+import rate_limiter
+from http_request import InvalidBodyError, parse_request
 from user_service import add_user, get_user
+from user_events import handle_stream_event, is_stream_event
+from user_queue import enqueue_user, get_queue_url, handle_sqs_event, is_sqs_event
+from user_model import User
+from user_search import DEFAULT_LIMIT, search_users
+
+# Route des requêtes qui ne correspondent à aucune autre (réponse 405)
+ROUTE_UNMATCHED = 'UNMATCHED'
 
 def handler(event, context):
     """
@@ -8,33 +19,99 @@ def handler(event, context):
     
     Supporte:
     - POST /user : Créer un nouvel utilisateur  
-    - GET /user?userId=XXX : Récupérer un utilisateur
+    - GET /user?userId=XXX : Récupérer un utilisateur (ETag, If-None-Match -> 304)
+    - GET /users/search?q=XXX&limit=N : Rechercher par nom ou email
+    - Événements SQS : Créations d'utilisateurs mises en file
+    - Événements DynamoDB Streams : Modifications publiées aux abonnés
+    
+    Les requêtes HTTP peuvent venir d'API Gateway REST (v1), HTTP API (v2)
+    ou d'un ALB (voir http_request.py).
+    
+    Profilage à la demande : voir profiling.py (désactivé par défaut)
+    Limitation de débit : voir rate_limiter.py (désactivée par défaut)
     """
     print('received event:')
     print(json.dumps(event))
     
+    # Lot de messages SQS (création asynchrone)
+    if is_sqs_event(event):
+        return handle_sqs_event(event)
+    
+    # Lot DynamoDB Streams (cache, index, compteurs)
+    if is_stream_event(event):
+        return handle_stream_event(event)
+    
+    request = parse_request(event)
+    if profiling.ENABLED and should_profile_request(request):
+        return request.respond(profiling.profile_request(route_request, request, context))
+    return request.respond(route_request(request, context))
+
+def should_profile_request(request):
+    """Décide du profilage ; une erreur de vérification vaut refus"""
+    try:
+        return profiling.should_profile(request.header(profiling.PROFILE_HEADER), request.method, request.path)
+    except Exception as e:
+        print(f'Error in profiling check: {str(e)}')
+        return False
+
+def resolve_route(http_method, path):
+    """
+    Retourne le nom de la route qui servira la requête
+
+    Plusieurs chemins aboutissent à la même route ('/user', '/user/',
+    '/dev/user') : la limitation de débit s'applique au nom retourné.
+    """
+    if http_method == 'GET' and path.rstrip('/').endswith('/users/search'):
+        return 'GET /users/search'
+    if http_method == 'POST' and '/user' in path:
+        return 'POST /user'
+    if http_method == 'GET' and '/user' in path:
+        return 'GET /user'
+    if http_method == 'OPTIONS':
+        return 'OPTIONS *'
+    return ROUTE_UNMATCHED
+
+def route_request(request, context):
+    """Aiguille une requête HTTP vers la route correspondante"""
     # Headers CORS
     headers = {
         'Access-Control-Allow-Headers': '*',
         'Access-Control-Allow-Origin': '*',
         'Access-Control-Allow-Methods': 'OPTIONS,POST,GET',
+        'Access-Control-Expose-Headers': 'ETag',
         'Content-Type': 'application/json'
     }
     
     try:
-        http_method = event.get('httpMethod')
-        path = event.get('path', '')
+        route = resolve_route(request.method, request.path)
+        
+        # Limitation de débit par client et par route, avant tout appel au service
+        limiter = rate_limiter.limiter
+        if limiter is not None:
+            retry_after = limiter.acquire(request, route)
+            if retry_after is not None:
+                response_headers = dict(headers)
+                response_headers['Retry-After'] = str(max(1, math.ceil(retry_after)))
+                return {
+                    'statusCode': 429,
+                    'headers': response_headers,
+                    'body': json.dumps({'error': 'Too many requests'})
+                }
+        
+        # Route GET /users/search - Rechercher des utilisateurs
+        if route == 'GET /users/search':
+            return handle_search_users(request, headers)
         
         # Route POST /user - Créer un utilisateur
-        if http_method == 'POST' and '/user' in path:
-            return handle_add_user(event, headers)
+        elif route == 'POST /user':
+            return handle_add_user(request, headers)
         
         # Route GET /user - Récupérer un utilisateur
-        elif http_method == 'GET' and '/user' in path:
-            return handle_get_user(event, headers)
+        elif route == 'GET /user':
+            return handle_get_user(request, headers)
         
         # Route OPTIONS - Support CORS
-        elif http_method == 'OPTIONS':
+        elif route == 'OPTIONS *':
             return {
                 'statusCode': 200,
                 'headers': headers,
@@ -57,18 +134,23 @@ def handler(event, context):
             'body': json.dumps({'error': 'Internal server error'})
         }
 
-def handle_add_user(event, headers):
+def handle_add_user(request, headers):
     """Gère la création d'un utilisateur"""
     try:
-        # Parser le body de la requête
-        if not event.get('body'):
+        # Parser le body de la requête (str, ou bytes s'il était en base64)
+        body = request.body
+        if not body:
             return {
                 'statusCode': 400,
                 'headers': headers,
                 'body': json.dumps({'error': 'Request body is required'})
             }
         
-        user_data = json.loads(event['body'])
+        user_data = json.loads(body)
+        
+        # Mode asynchrone : déposer la création dans la file
+        if get_queue_url():
+            return handle_enqueue_user(user_data, headers)
         
         # Appeler le service
         result = add_user(user_data)
@@ -86,7 +168,7 @@ def handle_add_user(event, headers):
             # Déterminer le code d'erreur approprié
             if 'already exists' in result['error']:
                 status_code = 409  # Conflict
-            elif 'required fields' in result['error']:
+            elif 'required fields' in result['error'] or 'JSON object' in result['error']:
                 status_code = 400  # Bad Request
             else:
                 status_code = 500  # Internal Server Error
@@ -97,7 +179,13 @@ def handle_add_user(event, headers):
                 'body': json.dumps({'error': result['error']})
             }
             
-    except json.JSONDecodeError:
+    except InvalidBodyError:
+        return {
+            'statusCode': 400,
+            'headers': headers,
+            'body': json.dumps({'error': 'Invalid base64 in request body'})
+        }
+    except (json.JSONDecodeError, UnicodeDecodeError):
         return {
             'statusCode': 400,
             'headers': headers,
@@ -111,12 +199,41 @@ def handle_add_user(event, headers):
             'body': json.dumps({'error': 'Internal server error'})
         }
 
-def handle_get_user(event, headers):
+def etag_matches(if_none_match, etag):
+    """Compare If-None-Match à l'ETag courant (comparaison faible, RFC 7232)"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    candidates = [candidate.strip() for candidate in if_none_match.split(',')]
+    return any(candidate.replace('W/', '', 1) == etag for candidate in candidates)
+
+def handle_enqueue_user(user_data, headers):
+    """Dépose la création d'un utilisateur dans la file et répond 202"""
+    result = enqueue_user(user_data)
+    
+    if result['success']:
+        return {
+            'statusCode': 202,
+            'headers': headers,
+            'body': json.dumps({
+                'message': result['message'],
+                'userId': result['userId']
+            })
+        }
+    
+    status_code = 400 if 'required fields' in result['error'] or 'JSON object' in result['error'] else 500
+    return {
+        'statusCode': status_code,
+        'headers': headers,
+        'body': json.dumps({'error': result['error']})
+    }
+
+def handle_get_user(request, headers):
     """Gère la récupération d'un utilisateur"""
     try:
         # Récupérer le userId depuis les query parameters
-        query_params = event.get('queryStringParameters') or {}
-        user_id = query_params.get('userId')
+        user_id = request.query.get('userId')
         
         if not user_id:
             return {
@@ -125,14 +242,29 @@ def handle_get_user(event, headers):
                 'body': json.dumps({'error': 'UserId parameter is required'})
             }
         
-        # Appeler le service
+        # Appeler le service (servi par le cache sans lecture DynamoDB s'il est actif)
         result = get_user(user_id)
         
         if result['success']:
+            user = result['user']
+            if not isinstance(user, User):
+                user = User.from_item(user)
+            
+            response_headers = dict(headers, ETag=user.etag)
+            response_headers['Cache-Control'] = 'private, no-cache'
+            
+            # Requête conditionnelle : la version du client est à jour
+            if etag_matches(request.header('If-None-Match'), user.etag):
+                return {
+                    'statusCode': 304,
+                    'headers': response_headers,
+                    'body': ''
+                }
+            
             return {
                 'statusCode': 200,
-                'headers': headers,
-                'body': json.dumps(result['user'])
+                'headers': response_headers,
+                'body': user.to_json()
             }
         else:
             # Déterminer le code d'erreur approprié
@@ -155,4 +287,53 @@ def handle_get_user(event, headers):
             'statusCode': 500,
             'headers': headers,
             'body': json.dumps({'error': 'Internal server error'})
-        }
\ No newline at end of file
+        }
+
+def handle_search_users(request, headers):
+    """Gère la recherche d'utilisateurs par préfixe de nom ou d'email"""
+    try:
+        query_params = request.query
+        query = query_params.get('q')
+        
+        if not query:
+            return {
+                'statusCode': 400,
+                'headers': headers,
+                'body': json.dumps({'error': 'Query parameter q is required'})
+            }
+        
+        try:
+            limit = int(query_params.get('limit', DEFAULT_LIMIT))
+        except ValueError:
+            return {
+                'statusCode': 400,
+                'headers': headers,
+                'body': json.dumps({'error': 'Parameter limit must be an integer'})
+            }
+        
+        # Appeler le service
+        result = search_users(query, limit)
+        
+        if result['success']:
+            return {
+                'statusCode': 200,
+                'headers': headers,
+                'body': json.dumps({
+                    'results': result['results'],
+                    'count': len(result['results'])
+                })
+            }
+        
+        return {
+            'statusCode': 400 if 'required' in result['error'] else 500,
+            'headers': headers,
+            'body': json.dumps({'error': result['error']})
+        }
+        
+    except Exception as e:
+        print(f'Error in handle_search_users: {str(e)}')
+        return {
+            'statusCode': 500,
+            'headers': headers,
+            'body': json.dumps({'error': 'Internal server error'})
+        }
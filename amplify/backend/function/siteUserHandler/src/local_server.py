@@ -0,0 +1,338 @@
+"""
+Serveur HTTP local exécutant index.handler
+
+Usage:
+    USER_DB_ENGINE=local python local_server.py --port 8080 --workers 64 --quiet
+    python local_server.py --port 8080 --workers 64 --processes 4 --quiet
+
+Chaque requête HTTP est traduite en événement API Gateway (proxy REST, v1) et
+passée à index.handler ; la réponse du handler est renvoyée telle quelle.
+C'est le même chemin de code qu'en Lambda, sans API Gateway ni SAM.
+
+- Keep-alive (HTTP/1.1) : une connexion sert plusieurs requêtes et reste
+  ouverte KEEPALIVE_TIMEOUT secondes sans activité.
+- Un pool de threads borné par processus ; --processes N pré-forke N
+  processus qui partagent la socket d'écoute. Le handler est importé avant
+  le fork : chaque processus démarre avec l'état de module déjà chaud.
+  Chaque processus a ensuite ses propres caches et, avec USER_DB_ENGINE=local,
+  sa propre table en mémoire : cette combinaison est refusée.
+- Les ressources boto3 n'étant pas thread-safe, user_service donne à chaque
+  thread du pool sa propre session et sa propre table.
+- SIGTERM / SIGINT : le serveur n'accepte plus de connexions, termine les
+  requêtes en cours, ferme les connexions inactives puis s'arrête.
+
+Un pool de N threads sert au plus N connexions à la fois : les clients de
+test de charge doivent ouvrir au plus --workers connexions par processus.
+"""
+import argparse
+import base64
+import http.server
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qsl, urlsplit
+
+DEFAULT_WORKERS = 64
+KEEPALIVE_TIMEOUT = 5.0
+# Types de contenu transmis en texte au handler ; les autres passent en base64
+TEXT_CONTENT_TYPES = ('text/', 'application/json', 'application/x-www-form-urlencoded', 'application/xml')
+
+class LocalContext:
+    """Contexte Lambda minimal"""
+
+    function_name = 'siteUserHandler-local'
+    memory_limit_in_mb = 128
+
+    def __init__(self, request_id, timeout=30.0):
+        self.aws_request_id = request_id
+        self._deadline = time.monotonic() + timeout
+
+    def get_remaining_time_in_millis(self):
+        return max(0, int((self._deadline - time.monotonic()) * 1000))
+
+def _is_text(content_type):
+    return not content_type or content_type.startswith(TEXT_CONTENT_TYPES)
+
+def build_event(method, target, header_items, body, source_ip, request_id):
+    """
+    Construit un événement API Gateway (proxy REST) depuis une requête HTTP
+
+    Args:
+        method (str): Méthode HTTP
+        target (str): Chemin et query string de la requête
+        header_items (list): Couples (nom, valeur) des headers, dans l'ordre
+        body (bytes): Corps de la requête
+        source_ip (str): Adresse du client
+        request_id (str): Identifiant de la requête
+
+    Returns:
+        dict: Événement au format attendu par index.handler
+    """
+    url = urlsplit(target)
+    path = url.path or '/'
+
+    headers = {}
+    multi_headers = {}
+    for name, value in header_items:
+        headers[name] = value
+        multi_headers.setdefault(name, []).append(value)
+
+    query = {}
+    multi_query = {}
+    for name, value in parse_qsl(url.query, keep_blank_values=True):
+        query[name] = value
+        multi_query.setdefault(name, []).append(value)
+
+    is_base64 = False
+    if not body:
+        body = None
+    elif _is_text(headers.get('Content-Type') or headers.get('content-type')):
+        try:
+            body = body.decode('utf-8')
+        except UnicodeDecodeError:
+            body, is_base64 = base64.b64encode(body).decode('ascii'), True
+    else:
+        body, is_base64 = base64.b64encode(body).decode('ascii'), True
+
+    return {
+        'resource': path,
+        'path': path,
+        'httpMethod': method,
+        'headers': headers or None,
+        'multiValueHeaders': multi_headers or None,
+        'queryStringParameters': query or None,
+        'multiValueQueryStringParameters': multi_query or None,
+        'pathParameters': None,
+        'stageVariables': None,
+        'requestContext': {
+            'requestId': request_id,
+            'httpMethod': method,
+            'path': path,
+            'resourcePath': path,
+            'stage': 'local',
+            'requestTimeEpoch': int(time.time() * 1000),
+            'identity': {
+                'sourceIp': source_ip,
+                'userAgent': headers.get('User-Agent') or headers.get('user-agent')
+            }
+        },
+        'body': body,
+        'isBase64Encoded': is_base64
+    }
+
+class LambdaRequestHandler(http.server.BaseHTTPRequestHandler):
+    """Traduit chaque requête en événement et renvoie la réponse du handler"""
+
+    protocol_version = 'HTTP/1.1'
+    server_version = 'siteUserHandler-local'
+    timeout = KEEPALIVE_TIMEOUT
+    # Headers et corps partent en deux écritures : sans TCP_NODELAY, Nagle et
+    # l'ACK retardé du client ajoutent ~40 ms à chaque requête keep-alive
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        self.timeout = self.server.keepalive_timeout
+        super().setup()
+
+    def _invoke(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+        request_id = str(uuid.uuid4())
+        event = build_event(
+            self.command, self.path, self.headers.items(), body, self.client_address[0], request_id
+        )
+
+        try:
+            response = self.server.app(event, LocalContext(request_id))
+        except Exception as e:
+            # API Gateway répond 502 quand la fonction échoue
+            print(f'Error in handler: {str(e)}', file=sys.stderr)
+            response = {'statusCode': 502, 'body': '{"message": "Internal server error"}'}
+
+        self._respond(response or {})
+
+    def _respond(self, response):
+        body = response.get('body') or ''
+        if response.get('isBase64Encoded'):
+            payload = base64.b64decode(body)
+        else:
+            payload = body.encode('utf-8') if isinstance(body, str) else bytes(body)
+
+        status = int(response.get('statusCode', 200))
+        self.send_response(status)
+        for name, value in (response.get('headers') or {}).items():
+            self.send_header(name, str(value))
+        for name, values in (response.get('multiValueHeaders') or {}).items():
+            for value in values:
+                self.send_header(name, str(value))
+
+        if self.server.draining:
+            self.close_connection = True
+            self.send_header('Connection', 'close')
+        if status not in (204, 304):
+            self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+
+        if status not in (204, 304) and self.command != 'HEAD':
+            self.wfile.write(payload)
+
+    do_GET = do_POST = do_PUT = do_PATCH = do_DELETE = do_OPTIONS = do_HEAD = _invoke
+
+    def log_message(self, format, *args):
+        if self.server.access_log:
+            super().log_message(format, *args)
+
+class LocalServer(http.server.HTTPServer):
+    """
+    Serveur HTTP avec un pool borné de threads de traitement
+
+    Args:
+        address (tuple): (hôte, port) ; port 0 pour un port libre
+        app: Handler Lambda (event, context) -> réponse
+        workers (int): Taille du pool de threads
+        keepalive_timeout (float): Fermeture des connexions inactives (secondes)
+        sock (socket.socket): Socket d'écoute déjà ouverte (processus pré-forkés)
+        access_log (bool): Journaliser chaque requête sur stderr
+    """
+
+    allow_reuse_address = True
+    request_queue_size = 1024
+
+    def __init__(self, address, app, workers=DEFAULT_WORKERS, keepalive_timeout=KEEPALIVE_TIMEOUT,
+                 sock=None, access_log=False):
+        super().__init__(address, LambdaRequestHandler, bind_and_activate=sock is None)
+        if sock is not None:
+            self.socket.close()
+            self.socket = sock
+            self.server_address = sock.getsockname()
+        self.app = app
+        self.keepalive_timeout = keepalive_timeout
+        self.access_log = access_log
+        self.draining = False
+        self._drained = threading.Event()
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='http-worker')
+
+    def process_request(self, request, client_address):
+        self._pool.submit(self._process_request, request, client_address)
+
+    def _process_request(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def drain(self):
+        """
+        Arrêt propre : plus de nouvelles connexions, fin des requêtes en cours
+
+        À appeler depuis un autre thread que serve_forever. Les connexions
+        inactives se ferment au plus tard après keepalive_timeout.
+        """
+        if self.draining:
+            return
+        self.draining = True
+        self.shutdown()
+        self.socket.close()
+        self._pool.shutdown(wait=True)
+        self._drained.set()
+
+    def wait_drained(self, timeout=None):
+        """Attend la fin de drain()"""
+        return self._drained.wait(timeout)
+
+def _install_drain_handlers(server):
+    def on_signal(signum, frame):
+        threading.Thread(target=server.drain, name='http-drain').start()
+
+    signal.signal(signal.SIGTERM, on_signal)
+    signal.signal(signal.SIGINT, on_signal)
+
+def serve(host='127.0.0.1', port=8080, workers=DEFAULT_WORKERS, processes=1, app=None,
+          keepalive_timeout=KEEPALIVE_TIMEOUT, access_log=False):
+    """
+    Sert le handler jusqu'à SIGTERM / SIGINT
+
+    Returns:
+        int: Code de sortie
+    """
+    if app is None:
+        # Importer le handler (et ses modules) avant le fork
+        from index import handler as app
+
+    import user_service
+    if processes > 1 and user_service.DB_ENGINE == 'local':
+        print('Error: USER_DB_ENGINE=local keeps the table in memory per process; use --processes 1', file=sys.stderr)
+        return 2
+
+    if processes <= 1:
+        server = LocalServer((host, port), app, workers, keepalive_timeout, access_log=access_log)
+        _install_drain_handlers(server)
+        print(f'Serving index.handler on http://{host}:{server.server_address[1]} ({workers} workers)', file=sys.stderr)
+        server.serve_forever()
+        server.wait_drained()
+        return 0
+
+    listener = socket.create_server((host, port), backlog=LocalServer.request_queue_size)
+    children = []
+    for _ in range(processes):
+        pid = os.fork()
+        if pid == 0:
+            server = LocalServer((host, port), app, workers, keepalive_timeout, sock=listener, access_log=access_log)
+            _install_drain_handlers(server)
+            try:
+                server.serve_forever()
+                server.wait_drained()
+            finally:
+                os._exit(0)
+        children.append(pid)
+
+    listener.close()
+    print(f'Serving index.handler on http://{host}:{port} ({processes} processes x {workers} workers)', file=sys.stderr)
+
+    def forward(signum, frame):
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, forward)
+    signal.signal(signal.SIGINT, forward)
+
+    status = 0
+    for pid in children:
+        while True:
+            try:
+                _, code = os.waitpid(pid, 0)
+                break
+            except InterruptedError:
+                continue
+        status = status or os.waitstatus_to_exitcode(code)
+    return status
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Serve index.handler over HTTP')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS, help='Threads per process')
+    parser.add_argument('--processes', type=int, default=1, help='Pre-forked processes sharing the socket')
+    parser.add_argument('--keepalive-timeout', type=float, default=KEEPALIVE_TIMEOUT)
+    parser.add_argument('--access-log', action='store_true', help='Log each request to stderr')
+    parser.add_argument('--quiet', action='store_true', help='Discard the handler event log')
+    args = parser.parse_args(argv)
+
+    if args.quiet:
+        sys.stdout = open(os.devnull, 'w')
+
+    return serve(args.host, args.port, args.workers, args.processes,
+                 keepalive_timeout=args.keepalive_timeout, access_log=args.access_log)
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,109 @@
+"""
+Table utilisateurs en mémoire (USER_DB_ENGINE=local)
+
+Remplace DynamoDB pour les essais locaux (test d'endurance, serveur local) :
+LocalDynamoDB et LocalUserTable reproduisent les appels utilisés par
+user_service (Table, get_item, put_item, scan, batch_*). Les éléments sont
+copiés à l'écriture comme à la lecture, comme s'ils traversaient le réseau.
+
+Les tables sont partagées par tout le processus, avec un verrou par table
+(user_service crée un LocalUserTable à chaque appel) ; reset() les vide.
+"""
+import copy
+import threading
+import zlib
+
+_tables = {}
+_tables_lock = threading.Lock()
+
+class LocalStore:
+    """Contenu d'une table : dict userId -> élément et verrou des écritures"""
+
+    __slots__ = ('items', 'lock')
+
+    def __init__(self):
+        self.items = {}
+        self.lock = threading.Lock()
+
+def get_store(table_name):
+    """Retourne le LocalStore d'une table (créé à la demande)"""
+    store = _tables.get(table_name)
+    if store is None:
+        with _tables_lock:
+            store = _tables.setdefault(table_name, LocalStore())
+    return store
+
+def reset():
+    """Vide toutes les tables locales"""
+    with _tables_lock:
+        _tables.clear()
+
+class LocalUserTable:
+    """Équivalent de resource.Table(name) en mémoire, indexé par userId"""
+
+    def __init__(self, table_name):
+        self.table_name = table_name
+        store = get_store(table_name)
+        self._items = store.items
+        self._lock = store.lock
+
+    def get_item(self, Key, **kwargs):
+        item = self._items.get(Key['userId'])
+        return {'Item': copy.deepcopy(item)} if item is not None else {}
+
+    def put_item(self, Item, **kwargs):
+        with self._lock:
+            self._items[Item['userId']] = copy.deepcopy(Item)
+        return {}
+
+    def delete_item(self, Key, **kwargs):
+        with self._lock:
+            self._items.pop(Key['userId'], None)
+        return {}
+
+    def scan(self, Segment=None, TotalSegments=None, Limit=None, ExclusiveStartKey=None, **kwargs):
+        with self._lock:
+            keys = sorted(self._items)
+        if TotalSegments:
+            keys = [key for key in keys if zlib.crc32(key.encode('utf-8')) % TotalSegments == Segment]
+        if ExclusiveStartKey:
+            keys = [key for key in keys if key > ExclusiveStartKey['userId']]
+
+        page = keys[:Limit] if Limit else keys
+        items = [copy.deepcopy(self._items[key]) for key in page if key in self._items]
+        response = {'Items': items, 'Count': len(items)}
+        if Limit and len(keys) > Limit:
+            response['LastEvaluatedKey'] = {'userId': page[-1]}
+        return response
+
+class LocalDynamoDB:
+    """Équivalent de boto3.resource('dynamodb') en mémoire"""
+
+    def Table(self, table_name):
+        return LocalUserTable(table_name)
+
+    def batch_write_item(self, RequestItems, **kwargs):
+        capacity = []
+        for table_name, requests in RequestItems.items():
+            table = self.Table(table_name)
+            for request in requests:
+                if 'PutRequest' in request:
+                    table.put_item(Item=request['PutRequest']['Item'])
+                else:
+                    table.delete_item(Key=request['DeleteRequest']['Key'])
+            capacity.append({'TableName': table_name, 'CapacityUnits': float(len(requests))})
+
+        response = {'UnprocessedItems': {}}
+        if kwargs.get('ReturnConsumedCapacity') in ('TOTAL', 'INDEXES'):
+            response['ConsumedCapacity'] = capacity
+        return response
+
+    def batch_get_item(self, RequestItems, **kwargs):
+        responses = {}
+        for table_name, request in RequestItems.items():
+            table = self.Table(table_name)
+            responses[table_name] = [
+                item for item in (table.get_item(Key=key).get('Item') for key in request['Keys'])
+                if item is not None
+            ]
+        return {'Responses': responses, 'UnprocessedKeys': {}}
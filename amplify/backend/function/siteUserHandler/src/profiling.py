@@ -0,0 +1,242 @@
+"""
+Profilage à la demande d'une requête (cProfile + tracemalloc)
+
+Désactivé par défaut : tant qu'aucune des variables ci-dessous n'est définie,
+handler ne fait qu'un test sur ENABLED.
+
+    PROFILE_REQUESTS=1         profile toutes les requêtes
+    PROFILE_SAMPLE_RATE=0.01   profile une proportion des requêtes
+    PROFILE_SECRET=...         profile les requêtes portant un header
+                               X-Profile-Token signé avec ce secret
+    PROFILE_OUTPUT_DIR=/tmp    répertoire des fichiers produits
+    PROFILE_MAX_FILES=20       nombre de fichiers conservés (les plus
+                               anciens sont supprimés)
+
+Le header vaut "<timestamp>.<signature>", la signature étant le HMAC-SHA256
+(hexadécimal) de "<timestamp>:<méthode>:<chemin>" ; il est accepté pendant
+PROFILE_TOKEN_MAX_AGE secondes :
+
+    python profiling.py sign GET /user
+
+Chaque requête profilée produit un fichier de piles repliées
+(profile-<requestId>.folded, lisible par flamegraph.pl ou speedscope) et une
+ligne de log JSON avec les fonctions les plus coûteuses et les principaux
+sites d'allocation mémoire.
+"""
+import argparse
+import cProfile
+import glob
+import hashlib
+import hmac
+import json
+import os
+import pstats
+import random
+import sys
+import time
+import tracemalloc
+import uuid
+
+PROFILE_HEADER = 'X-Profile-Token'
+PROFILE_TOKEN_MAX_AGE = 300
+
+ALWAYS = os.environ.get('PROFILE_REQUESTS', '') in ('1', 'true', 'yes')
+SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', '0') or 0)
+SECRET = os.environ.get('PROFILE_SECRET', '')
+OUTPUT_DIR = os.environ.get('PROFILE_OUTPUT_DIR', '/tmp')
+MAX_FILES = int(os.environ.get('PROFILE_MAX_FILES', '20') or 20)
+TRACEMALLOC_FRAMES = 8
+TOP_ENTRIES = 10
+MAX_STACK_DEPTH = 64
+# Les portions de pile de moins d'une microseconde sont ignorées
+MIN_STACK_SECONDS = 1e-6
+
+ENABLED = ALWAYS or SAMPLE_RATE > 0 or bool(SECRET)
+
+def sign(timestamp, method, path, secret=None):
+    """Calcule la signature attendue dans le header X-Profile-Token"""
+    message = f'{timestamp}:{method}:{path}'.encode('utf-8')
+    return hmac.new((secret or SECRET).encode('utf-8'), message, hashlib.sha256).hexdigest()
+
+def make_token(method, path, secret=None, now=None):
+    """Construit un header X-Profile-Token valide"""
+    timestamp = int(now if now is not None else time.time())
+    return f'{timestamp}.{sign(timestamp, method, path, secret)}'
+
+def verify_token(token, method, path, now=None):
+    """Vérifie la signature et la fraîcheur d'un header X-Profile-Token"""
+    if not SECRET or not token:
+        return False
+    timestamp, _, signature = token.partition('.')
+    try:
+        age = (now if now is not None else time.time()) - int(timestamp)
+    except ValueError:
+        return False
+    if not 0 <= age <= PROFILE_TOKEN_MAX_AGE:
+        return False
+    # compare_digest refuse les str non ASCII : on compare des bytes
+    return hmac.compare_digest(signature.encode('utf-8', 'replace'), sign(timestamp, method, path).encode('ascii'))
+
+def should_profile(token, method, path):
+    """
+    Indique si la requête doit être profilée
+
+    Args:
+        token (str): Valeur du header X-Profile-Token (ou None)
+        method (str): Méthode HTTP
+        path (str): Chemin de la requête
+    """
+    if ALWAYS:
+        return True
+    if token and verify_token(token, method, path):
+        return True
+    return SAMPLE_RATE > 0 and random.random() < SAMPLE_RATE
+
+def _frame_label(function):
+    filename, line, name = function
+    if filename == '~':
+        return name
+    return f'{os.path.basename(filename)}:{name}:{line}'
+
+def collapsed_stacks(stats):
+    """
+    Reconstruit des piles repliées (format flamegraph) depuis les stats cProfile
+
+    cProfile ne conserve que les arcs appelant -> appelé : le temps propre de
+    chaque fonction est réparti entre ses chemins d'appel au prorata du temps
+    cumulé de chaque arc.
+
+    Args:
+        stats (dict): pstats.Stats(...).stats
+
+    Returns:
+        dict: "a;b;c" -> microsecondes
+    """
+    callees = {}
+    for function, (_, _, _, _, callers) in stats.items():
+        for caller, edge in callers.items():
+            callees.setdefault(caller, []).append((function, edge[3]))
+
+    stacks = {}
+
+    def walk(function, path, fraction):
+        _, _, total_time, cumulative_time, _ = stats[function]
+        label = ';'.join(path)
+        own = total_time * fraction
+        if own >= MIN_STACK_SECONDS:
+            stacks[label] = stacks.get(label, 0) + own
+        if len(path) >= MAX_STACK_DEPTH:
+            return
+        for callee, edge_time in callees.get(function, ()):
+            callee_label = _frame_label(callee)
+            callee_cumulative = stats[callee][3]
+            if callee_label in path or not callee_cumulative:
+                continue
+            callee_fraction = fraction * min(edge_time / callee_cumulative, 1.0)
+            if callee_cumulative * callee_fraction >= MIN_STACK_SECONDS:
+                walk(callee, path + [callee_label], callee_fraction)
+
+    for function, (_, _, _, _, callers) in stats.items():
+        if not callers:
+            walk(function, [_frame_label(function)], 1.0)
+
+    return {stack: int(seconds * 1e6) for stack, seconds in stacks.items() if int(seconds * 1e6)}
+
+def top_functions(stats, limit=TOP_ENTRIES):
+    """Fonctions ayant le plus de temps propre"""
+    ranked = sorted(stats.items(), key=lambda entry: entry[1][2], reverse=True)[:limit]
+    return [
+        {'function': _frame_label(function), 'calls': calls, 'ownMs': round(own * 1000, 3), 'cumulativeMs': round(cumulative * 1000, 3)}
+        for function, (_, calls, own, cumulative, _) in ranked
+    ]
+
+def top_allocations(snapshot, limit=TOP_ENTRIES):
+    """Principaux sites d'allocation (hors tracemalloc et ce module)"""
+    snapshot = snapshot.filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, __file__)
+    ))
+    return [
+        {'site': f'{os.path.basename(stat.traceback[0].filename)}:{stat.traceback[0].lineno}', 'kib': round(stat.size / 1024, 1), 'count': stat.count}
+        for stat in snapshot.statistics('lineno')[:limit]
+    ]
+
+def profile_request(function, request, context):
+    """
+    Exécute function(request, context) sous cProfile et tracemalloc
+
+    Returns:
+        La réponse de function, inchangée
+    """
+    request_id = getattr(context, 'aws_request_id', None) or uuid.uuid4().hex
+    already_tracing = tracemalloc.is_tracing()
+    if not already_tracing:
+        tracemalloc.start(TRACEMALLOC_FRAMES)
+
+    profiler = cProfile.Profile()
+    started = time.perf_counter()
+    profiler.enable()
+    try:
+        return function(request, context)
+    finally:
+        profiler.disable()
+        duration = time.perf_counter() - started
+        snapshot = tracemalloc.take_snapshot()
+        if not already_tracing:
+            tracemalloc.stop()
+
+        try:
+            write_report(request_id, duration, pstats.Stats(profiler).stats, snapshot)
+        except Exception as e:
+            print(f'Error writing profile for {request_id}: {str(e)}')
+
+def write_report(request_id, duration, stats, snapshot):
+    """Écrit le fichier de piles repliées et la ligne de log du profil"""
+    path = os.path.join(OUTPUT_DIR, f'profile-{request_id}.folded')
+    with open(path, 'w', encoding='utf-8') as f:
+        for stack, microseconds in sorted(collapsed_stacks(stats).items()):
+            f.write(f'{stack} {microseconds}\n')
+    prune_reports()
+
+    print(json.dumps({
+        'profile': {
+            'requestId': request_id,
+            'durationMs': round(duration * 1000, 3),
+            'flamegraph': path,
+            'topFunctions': top_functions(stats),
+            'topAllocations': top_allocations(snapshot)
+        }
+    }))
+    return path
+
+def prune_reports(keep=None):
+    """Supprime les fichiers de profil les plus anciens au-delà de keep (MAX_FILES)"""
+    keep = MAX_FILES if keep is None else keep
+    paths = []
+    for path in glob.glob(os.path.join(OUTPUT_DIR, 'profile-*.folded')):
+        try:
+            paths.append((os.path.getmtime(path), path))
+        except OSError:
+            pass
+    for _, path in sorted(paths, reverse=True)[keep:]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Request profiling helpers')
+    commands = parser.add_subparsers(dest='command', required=True)
+    signer = commands.add_parser('sign', help='Print an X-Profile-Token header value (uses PROFILE_SECRET)')
+    signer.add_argument('method')
+    signer.add_argument('path')
+    args = parser.parse_args(argv)
+
+    if not SECRET:
+        print('PROFILE_SECRET is not set', file=sys.stderr)
+        return 1
+    print(f'{PROFILE_HEADER}: {make_token(args.method, args.path)}')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,235 @@
+"""
+Limitation de débit par client et par route (seaux de jetons)
+
+Désactivée tant que RATE_LIMIT_RULES n'est pas défini. Chaque règle donne un
+débit (jetons par seconde) et une capacité (rafale) pour une route résolue par
+index.resolve_route ("GET /user", "POST /user", "GET /users/search",
+"OPTIONS *", "UNMATCHED") ; "*" s'applique aux routes sans règle propre :
+
+    RATE_LIMIT_RULES="GET /user=20:40,POST /user=2:5,*=50:100"
+
+Les limites s'appliquent à la route et non au chemin reçu : "/user/" ou
+"/dev/user" consomment le même seau que "/user". Chaque route a ses seaux,
+y compris quand elle relève de la règle "*".
+
+Un client est identifié par la clé d'API validée par API Gateway
+(requestContext.identity.apiKey, hachée) ou, à défaut, par son adresse IP
+telle que la voit la passerelle (sourceIp, ou la dernière entrée de
+X-Forwarded-For ajoutée par l'ALB). Le header x-api-key n'est jamais lu
+directement : un client pourrait en changer à chaque requête.
+
+Les seaux sont tenus en mémoire dans le conteneur (au plus
+RATE_LIMIT_MAX_KEYS, les moins récents sont oubliés) ; avec
+RATE_LIMIT_STORE_URL (redis:// ou local://, voir shared_cache) ils sont
+partagés entre conteneurs. Une panne du store partagé laisse passer les
+requêtes : ses appels sont bornés par RATE_LIMIT_STORE_TIMEOUT (50 ms par
+défaut) et, après une erreur, le store est ignoré pendant
+RATE_LIMIT_STORE_COOLDOWN secondes (disjoncteur) pour qu'une panne de Redis
+n'ajoute pas ce délai à chaque requête.
+
+Les refus sont comptés par route (counters.snapshot()) et publiés au plus
+toutes les RATE_LIMIT_METRICS_INTERVAL secondes dans une ligne de log au
+format CloudWatch Embedded Metric Format (métrique RateLimitRejected).
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from shared_cache import RedisError, create_backend
+
+KEY_PREFIX = 'ratelimit:'
+DEFAULT_MAX_KEYS = 10000
+METRICS_NAMESPACE = 'SiteUserHandler'
+METRICS_INTERVAL = float(os.environ.get('RATE_LIMIT_METRICS_INTERVAL', '60'))
+STORE_TIMEOUT = float(os.environ.get('RATE_LIMIT_STORE_TIMEOUT', '0.05'))
+STORE_COOLDOWN = float(os.environ.get('RATE_LIMIT_STORE_COOLDOWN', '5'))
+
+def parse_rules(text):
+    """
+    Lit RATE_LIMIT_RULES
+
+    Returns:
+        dict: route -> (débit par seconde, capacité)
+    """
+    rules = {}
+    for entry in (text or '').split(','):
+        if not entry.strip():
+            continue
+        route, _, limits = entry.rpartition('=')
+        rate, _, capacity = limits.partition(':')
+        rate = float(rate)
+        capacity = float(capacity or rate)
+        if not route.strip() or rate <= 0 or capacity < 1:
+            raise ValueError(f'Invalid rate limit rule: {entry.strip()!r}')
+        rules[' '.join(route.split())] = (rate, capacity)
+    return rules
+
+def client_key(request):
+    """Identité du client : clé d'API validée (hachée), sinon adresse IP"""
+    api_key = request.api_key
+    if api_key:
+        return 'key:' + hashlib.blake2b(api_key.encode('utf-8'), digest_size=8).hexdigest()
+    return 'ip:' + (request.source_ip or 'unknown')
+
+class LocalBuckets:
+    """Seaux de jetons en mémoire, en nombre borné (LRU)"""
+
+    def __init__(self, max_keys=DEFAULT_MAX_KEYS, clock=time.monotonic):
+        self.max_keys = max_keys
+        self.clock = clock
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take_token(self, key, rate, capacity):
+        """Prend un jeton ; retourne 0 ou l'attente avant le prochain jeton"""
+        now = self.clock()
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * rate)
+            wait = 0.0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                wait = (1 - tokens) / rate
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+            return wait
+
+    def __len__(self):
+        return len(self._buckets)
+
+class RateLimitCounters:
+    """Requêtes acceptées et refusées par route"""
+
+    def __init__(self, interval=METRICS_INTERVAL, clock=time.monotonic):
+        self.interval = interval
+        self.clock = clock
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.allowed = {}
+            self.rejected = {}
+            self._pending = {}
+            self._last_flush = self.clock()
+
+    def record(self, route, allowed):
+        with self._lock:
+            counts = self.allowed if allowed else self.rejected
+            counts[route] = counts.get(route, 0) + 1
+            if not allowed:
+                self._pending[route] = self._pending.get(route, 0) + 1
+
+    def snapshot(self):
+        """Retourne une copie des compteurs"""
+        with self._lock:
+            return {'allowed': dict(self.allowed), 'rejected': dict(self.rejected)}
+
+    def flush(self, force=False):
+        """
+        Publie les refus accumulés depuis la dernière publication (format EMF)
+
+        Returns:
+            int: Nombre de lignes de log écrites
+        """
+        now = self.clock()
+        with self._lock:
+            if not self._pending or (not force and now - self._last_flush < self.interval):
+                return 0
+            pending, self._pending = self._pending, {}
+            self._last_flush = now
+
+        timestamp = int(time.time() * 1000)
+        for route, count in pending.items():
+            print(json.dumps({
+                '_aws': {
+                    'Timestamp': timestamp,
+                    'CloudWatchMetrics': [{
+                        'Namespace': METRICS_NAMESPACE,
+                        'Dimensions': [['Route']],
+                        'Metrics': [{'Name': 'RateLimitRejected', 'Unit': 'Count'}]
+                    }]
+                },
+                'Route': route,
+                'RateLimitRejected': count
+            }))
+        return len(pending)
+
+class RateLimiter:
+    """
+    Limiteur par client et par route
+
+    Args:
+        rules (dict): route -> (débit par seconde, capacité), voir parse_rules
+        store: Backend partagé exposant take_token (None : seaux locaux)
+        max_keys (int): Nombre maximal de seaux locaux
+        store_cooldown (float): Secondes pendant lesquelles le store est ignoré après une erreur
+    """
+
+    def __init__(self, rules, store=None, max_keys=DEFAULT_MAX_KEYS,
+                 store_cooldown=STORE_COOLDOWN, clock=time.monotonic):
+        self.rules = rules
+        self.store = store
+        self.buckets = LocalBuckets(max_keys)
+        self.counters = RateLimitCounters()
+        self.store_cooldown = store_cooldown
+        self.clock = clock
+        self._store_open_until = None
+
+    @classmethod
+    def from_environment(cls):
+        """Limiteur configuré par l'environnement, ou None s'il n'y a pas de règle"""
+        rules = parse_rules(os.environ.get('RATE_LIMIT_RULES'))
+        if not rules:
+            return None
+        store_url = os.environ.get('RATE_LIMIT_STORE_URL')
+        store = create_backend(store_url, timeout=STORE_TIMEOUT) if store_url else None
+        return cls(rules, store, int(os.environ.get('RATE_LIMIT_MAX_KEYS', DEFAULT_MAX_KEYS)))
+
+    def acquire(self, request, route):
+        """
+        Consomme un jeton pour la requête
+
+        Args:
+            request (HttpRequest): Requête (pour identifier le client)
+            route (str): Route résolue ("MÉTHODE /chemin")
+
+        Returns:
+            float: None si la requête est acceptée, sinon l'attente en secondes
+        """
+        rule_route = route if route in self.rules else '*'
+        rule = self.rules.get(rule_route)
+        if rule is None:
+            return None
+
+        key = f'{route}|{client_key(request)}'
+        wait = 0.0
+        if self.store is not None:
+            wait = self._take_shared_token(KEY_PREFIX + key, rule)
+        else:
+            wait = self.buckets.take_token(key, *rule)
+
+        self.counters.record(route, not wait)
+        self.counters.flush()
+        return wait or None
+
+    def _take_shared_token(self, key, rule):
+        """Jeton du store partagé ; 0 (requête acceptée) si le store est en panne"""
+        open_until = self._store_open_until
+        if open_until is not None and self.clock() < open_until:
+            return 0.0
+        try:
+            wait = self.store.take_token(key, *rule)
+        except (OSError, ConnectionError, RedisError) as e:
+            print(f'Rate limit store unavailable for {self.store_cooldown}s: {str(e)}')
+            self._store_open_until = self.clock() + self.store_cooldown
+            return 0.0
+        self._store_open_until = None
+        return wait
+
+limiter = RateLimiter.from_environment()
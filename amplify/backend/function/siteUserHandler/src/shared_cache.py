@@ -0,0 +1,523 @@
+"""
+Cache partagé entre les conteneurs Lambda (second niveau, devant DynamoDB)
+
+Le cache local de user_cache est propre à chaque conteneur : lors d'une montée
+en charge, chaque nouveau conteneur démarre à froid et interroge DynamoDB. Ce
+module ajoute un cache partagé, configuré par USER_SHARED_CACHE_URL :
+
+    redis://host:6379/0   serveur Redis (protocole RESP, sans dépendance)
+    local://nom           remplaçant en mémoire dans le processus (tests, local)
+
+Le client Redis utilise un pool de connexions, regroupe les lectures par lots
+en un seul MGET et les écritures en pipeline. Les utilisateurs sont stockés
+dans un encodage binaire compact. Un verrou (SET NX PX) évite qu'un même
+utilisateur absent du cache soit lu en parallèle par tous les conteneurs.
+
+Le cache est invalidé par les événements de user_events, auxquels le module
+s'abonne dès son import : une écriture ou un lot du flux traité par un
+conteneur qui n'a encore rien lu invalide aussi les entrées (y compris les
+absences mises en cache). Une panne du cache n'empêche pas de servir les
+requêtes : on retombe sur DynamoDB.
+
+Les backends portent aussi les seaux de jetons partagés de rate_limiter
+(take_token).
+"""
+import json
+import os
+import queue
+import socket
+import threading
+import time
+import uuid
+from urllib.parse import urlparse
+
+from user_events import subscribe
+from user_model import User, json_default
+
+KEY_PREFIX = 'user:'
+LOCK_PREFIX = 'lock:user:'
+DEFAULT_TTL = 300
+MISSING_TTL = 30
+LOCK_TTL = 5
+LOCK_WAIT = 0.5
+LOCK_POLL_INTERVAL = 0.02
+DEFAULT_POOL_SIZE = 8
+# Après une erreur du backend, le cache est ignoré pendant BREAKER_COOLDOWN secondes
+BREAKER_COOLDOWN = 5
+
+# Marqueur d'un utilisateur absent de la table (cache négatif)
+MISSING = object()
+# Résultat d'une opération non effectuée (backend en erreur ou disjoncté)
+UNAVAILABLE = object()
+
+FORMAT_MISSING = 0
+FORMAT_USER = 1
+FLAG_NAME = 1
+FLAG_EMAIL = 2
+FLAG_VERSION = 4
+FLAG_UPDATED_AT = 8
+FLAG_ATTRIBUTES = 16
+
+def _pack_varint(value, out):
+    while value >= 0x80:
+        out.append((value & 0x7f) | 0x80)
+        value >>= 7
+    out.append(value)
+
+def _unpack_varint(data, position):
+    result = 0
+    shift = 0
+    while True:
+        byte = data[position]
+        position += 1
+        result |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return result, position
+        shift += 7
+
+def _pack_bytes(value, out):
+    _pack_varint(len(value), out)
+    out += value
+
+def _unpack_bytes(data, position):
+    length, position = _unpack_varint(data, position)
+    return data[position:position + length], position + length
+
+def encode_user(user):
+    """
+    Encode un User (ou MISSING) en binaire compact
+
+    Format : type (1 octet), champs présents (1 octet), puis userId et chaque
+    champ présent en longueur (varint) + UTF-8 ; version en varint ; les
+    attributs hors schéma en JSON.
+    """
+    if user is MISSING:
+        return bytes([FORMAT_MISSING])
+
+    flags = 0
+    body = bytearray()
+    _pack_bytes(str(user.user_id).encode('utf-8'), body)
+    if user.name is not None:
+        flags |= FLAG_NAME
+        _pack_bytes(str(user.name).encode('utf-8'), body)
+    if user.email is not None:
+        flags |= FLAG_EMAIL
+        _pack_bytes(str(user.email).encode('utf-8'), body)
+    if user.version is not None:
+        flags |= FLAG_VERSION
+        _pack_varint(user.version, body)
+    if user.updated_at is not None:
+        flags |= FLAG_UPDATED_AT
+        _pack_bytes(user.updated_at.encode('utf-8'), body)
+    if user.attributes:
+        flags |= FLAG_ATTRIBUTES
+        _pack_bytes(json.dumps(user.attributes, default=json_default, separators=(',', ':')).encode('utf-8'), body)
+
+    return bytes([FORMAT_USER, flags]) + bytes(body)
+
+def decode_user(data):
+    """Décode une valeur produite par encode_user"""
+    if data[0] == FORMAT_MISSING:
+        return MISSING
+
+    flags = data[1]
+    user_id, position = _unpack_bytes(data, 2)
+    fields = {}
+    for flag, name in ((FLAG_NAME, 'name'), (FLAG_EMAIL, 'email')):
+        if flags & flag:
+            value, position = _unpack_bytes(data, position)
+            fields[name] = value.decode('utf-8')
+    version = None
+    if flags & FLAG_VERSION:
+        version, position = _unpack_varint(data, position)
+    updated_at = None
+    if flags & FLAG_UPDATED_AT:
+        value, position = _unpack_bytes(data, position)
+        updated_at = value.decode('utf-8')
+    attributes = None
+    if flags & FLAG_ATTRIBUTES:
+        value, position = _unpack_bytes(data, position)
+        attributes = json.loads(value)
+
+    return User(user_id.decode('utf-8'), fields.get('name'), fields.get('email'), attributes, version, updated_at)
+
+class RedisError(Exception):
+    """Erreur renvoyée par le serveur Redis"""
+
+def encode_command(*args):
+    """Encode une commande au format RESP"""
+    out = bytearray(b'*%d\r\n' % len(args))
+    for arg in args:
+        if not isinstance(arg, (bytes, bytearray)):
+            arg = str(arg).encode('utf-8')
+        out += b'$%d\r\n' % len(arg)
+        out += arg
+        out += b'\r\n'
+    return bytes(out)
+
+def read_reply(reader):
+    """Lit une réponse RESP depuis un flux binaire"""
+    line = reader.readline()
+    if not line:
+        raise ConnectionError('Connection closed by Redis')
+
+    prefix, payload = line[:1], line[1:-2]
+    if prefix == b'+':
+        return payload.decode('utf-8')
+    if prefix == b'-':
+        raise RedisError(payload.decode('utf-8'))
+    if prefix == b':':
+        return int(payload)
+    if prefix == b'$':
+        length = int(payload)
+        if length < 0:
+            return None
+        return reader.read(length + 2)[:-2]
+    if prefix == b'*':
+        length = int(payload)
+        if length < 0:
+            return None
+        return [read_reply(reader) for _ in range(length)]
+    raise RedisError(f'Unexpected reply {line!r}')
+
+class RedisConnection:
+    """Connexion TCP à Redis ; execute() envoie plusieurs commandes d'un coup (pipeline)"""
+
+    def __init__(self, host, port, db=0, timeout=1.0):
+        self.sock = socket.create_connection((host, port), timeout=timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.reader = self.sock.makefile('rb')
+        if db:
+            self.execute([('SELECT', db)])
+
+    def execute(self, commands):
+        self.sock.sendall(b''.join(encode_command(*command) for command in commands))
+        replies = []
+        error = None
+        for _ in commands:
+            try:
+                replies.append(read_reply(self.reader))
+            except RedisError as e:
+                # Lire toutes les réponses pour laisser la connexion réutilisable
+                error = error or e
+                replies.append(None)
+        if error:
+            raise error
+        return replies
+
+    def close(self):
+        try:
+            self.reader.close()
+            self.sock.close()
+        except OSError:
+            pass
+
+class RedisCache:
+    """Client Redis minimal avec pool de connexions"""
+
+    RELEASE_SCRIPT = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) else return 0 end"
+
+    # Seau de jetons atomique, à l'heure du serveur ; renvoie l'attente en secondes
+    TOKEN_SCRIPT = """
+local rate, capacity = tonumber(ARGV[1]), tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local elapsed = math.max(0, now - (tonumber(state[2]) or now))
+tokens = math.min(capacity, tokens + elapsed * rate)
+local wait = 0
+if tokens >= 1 then tokens = tokens - 1 else wait = (1 - tokens) / rate end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / rate * 1000) + 1000)
+return tostring(wait)
+"""
+
+    def __init__(self, url, pool_size=DEFAULT_POOL_SIZE, timeout=1.0):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or 'localhost'
+        self.port = parsed.port or 6379
+        self.db = int(parsed.path.lstrip('/') or 0)
+        self.timeout = timeout
+        self._pool = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(pool_size)
+
+    def _execute(self, commands):
+        self._slots.acquire()
+        try:
+            try:
+                connection = self._pool.get_nowait()
+            except queue.Empty:
+                connection = RedisConnection(self.host, self.port, self.db, self.timeout)
+            try:
+                replies = connection.execute(commands)
+            except Exception:
+                # Après une réponse inattendue, le flux peut être désynchronisé :
+                # la connexion n'est jamais remise dans le pool
+                connection.close()
+                raise
+            self._pool.put(connection)
+            return replies
+        finally:
+            self._slots.release()
+
+    def get_many(self, keys):
+        if not keys:
+            return {}
+        values = self._execute([('MGET', *keys)])[0]
+        return {key: value for key, value in zip(keys, values) if value is not None}
+
+    def set_many(self, mapping, ttl):
+        if mapping:
+            self._execute([('SET', key, value, 'PX', int(ttl * 1000)) for key, value in mapping.items()])
+
+    def delete(self, keys):
+        if keys:
+            self._execute([('DEL', *keys)])
+
+    def acquire_lock(self, key, ttl):
+        token = uuid.uuid4().hex
+        reply = self._execute([('SET', key, token, 'NX', 'PX', int(ttl * 1000))])[0]
+        return token if reply == 'OK' else None
+
+    def release_lock(self, key, token):
+        self._execute([('EVAL', self.RELEASE_SCRIPT, 1, key, token)])
+
+    def take_token(self, key, rate, capacity):
+        """Prend un jeton du seau key ; retourne 0 ou l'attente avant le prochain jeton"""
+        return float(self._execute([('EVAL', self.TOKEN_SCRIPT, 1, key, rate, capacity)])[0])
+
+class LocalSharedCache:
+    """Remplaçant en mémoire de RedisCache (même interface)"""
+
+    def __init__(self):
+        self._entries = {}
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self.calls = 0
+
+    def _get(self, key, now):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] < now:
+            del self._entries[key]
+            return None
+        return entry[1]
+
+    def clear(self):
+        """Vide les entrées, verrous et seaux"""
+        with self._lock:
+            self._entries.clear()
+            self._buckets.clear()
+            self.calls = 0
+
+    def get_many(self, keys):
+        now = time.monotonic()
+        with self._lock:
+            self.calls += 1
+            values = {key: self._get(key, now) for key in keys}
+        return {key: value for key, value in values.items() if value is not None}
+
+    def set_many(self, mapping, ttl):
+        expires = time.monotonic() + ttl
+        with self._lock:
+            self.calls += 1
+            for key, value in mapping.items():
+                self._entries[key] = (expires, bytes(value))
+
+    def delete(self, keys):
+        with self._lock:
+            self.calls += 1
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def acquire_lock(self, key, ttl):
+        now = time.monotonic()
+        with self._lock:
+            self.calls += 1
+            if self._get(key, now) is not None:
+                return None
+            token = uuid.uuid4().hex
+            self._entries[key] = (now + ttl, token.encode('utf-8'))
+            return token
+
+    def release_lock(self, key, token):
+        with self._lock:
+            self.calls += 1
+            entry = self._entries.get(key)
+            if entry and entry[1] == token.encode('utf-8'):
+                del self._entries[key]
+
+    def take_token(self, key, rate, capacity):
+        now = time.monotonic()
+        with self._lock:
+            self.calls += 1
+            tokens, updated = self._buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * rate)
+            wait = 0.0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                wait = (1 - tokens) / rate
+            self._buckets[key] = (tokens, now)
+            return wait
+
+class SharedUserCache:
+    """
+    Cache partagé des utilisateurs au-dessus d'un backend (RedisCache ou LocalSharedCache)
+
+    Les erreurs du backend sont journalisées et traitées comme des absences.
+    Une erreur ouvre un disjoncteur : pendant breaker_cooldown secondes, le
+    backend n'est plus sollicité et les lectures vont directement à DynamoDB.
+    """
+
+    def __init__(self, backend, ttl=DEFAULT_TTL, missing_ttl=MISSING_TTL,
+                 breaker_cooldown=BREAKER_COOLDOWN, clock=time.monotonic):
+        self.backend = backend
+        self.ttl = ttl
+        self.missing_ttl = missing_ttl
+        self.breaker_cooldown = breaker_cooldown
+        self.clock = clock
+        self._open_until = None
+
+    def is_available(self):
+        """Indique si le disjoncteur laisse passer les appels au backend"""
+        open_until = self._open_until
+        return open_until is None or self.clock() >= open_until
+
+    def _safe(self, operation, default, *args):
+        if not self.is_available():
+            return default
+        try:
+            result = operation(*args)
+        except (OSError, ConnectionError, RedisError) as e:
+            print(f'Shared cache unavailable for {self.breaker_cooldown}s: {str(e)}')
+            self._open_until = self.clock() + self.breaker_cooldown
+            return default
+        self._open_until = None
+        return result
+
+    def get_many(self, user_ids):
+        """
+        Lit plusieurs utilisateurs en un seul aller-retour
+
+        Returns:
+            dict: userId -> User ou MISSING (les absents du cache n'y figurent pas)
+        """
+        keys = [KEY_PREFIX + user_id for user_id in user_ids]
+        values = self._safe(self.backend.get_many, {}, keys)
+        users = {}
+        corrupt = []
+        for key, value in values.items():
+            try:
+                users[key[len(KEY_PREFIX):]] = decode_user(value)
+            except (ValueError, IndexError) as e:
+                # Valeur illisible : traitée comme absente et supprimée
+                print(f'Corrupt shared cache entry {key}: {str(e)}')
+                corrupt.append(key)
+        if corrupt:
+            self._safe(self.backend.delete, None, corrupt)
+        return users
+
+    def set_many(self, users):
+        """Enregistre des User (ou MISSING) : dict userId -> valeur"""
+        found = {KEY_PREFIX + uid: encode_user(u) for uid, u in users.items() if u is not MISSING}
+        missing = {KEY_PREFIX + uid: encode_user(MISSING) for uid, u in users.items() if u is MISSING}
+        if found:
+            self._safe(self.backend.set_many, None, found, self.ttl)
+        if missing:
+            self._safe(self.backend.set_many, None, missing, self.missing_ttl)
+
+    def invalidate(self, user_ids):
+        self._safe(self.backend.delete, None, [KEY_PREFIX + user_id for user_id in user_ids])
+
+    def load(self, user_id, loader):
+        """
+        Retourne un utilisateur depuis le cache, ou le charge avec loader
+
+        Un seul appelant à la fois charge un utilisateur absent du cache : les
+        autres attendent brièvement que la valeur apparaisse avant de lire
+        eux-mêmes la table. Si le backend est en erreur, personne n'attend.
+
+        Args:
+            user_id (str): ID de l'utilisateur
+            loader: Fonction user_id -> User ou None (lecture DynamoDB)
+
+        Returns:
+            User ou None si l'utilisateur n'existe pas
+        """
+        cached = self.get_many([user_id]).get(user_id)
+        if cached is not None:
+            return None if cached is MISSING else cached
+
+        lock_key = LOCK_PREFIX + user_id
+        token = self._safe(self.backend.acquire_lock, UNAVAILABLE, lock_key, LOCK_TTL)
+
+        if token is None:
+            # Verrou tenu par un autre appelant
+            deadline = time.monotonic() + LOCK_WAIT
+            while time.monotonic() < deadline and self.is_available():
+                time.sleep(LOCK_POLL_INTERVAL)
+                cached = self.get_many([user_id]).get(user_id)
+                if cached is not None:
+                    return None if cached is MISSING else cached
+
+        try:
+            user = loader(user_id)
+            self.set_many({user_id: MISSING if user is None else user})
+            return user
+        finally:
+            if token is not None and token is not UNAVAILABLE:
+                self._safe(self.backend.release_lock, None, lock_key, token)
+
+    def on_user_changes(self, changes):
+        """Abonné user_events : supprime les utilisateurs modifiés du cache partagé"""
+        self.invalidate([change['userId'] for change in changes])
+
+_local_backends = {}
+_shared_cache = None
+_shared_cache_url = None
+_shared_cache_lock = threading.Lock()
+
+def create_backend(url, timeout=None):
+    """
+    Crée le backend correspondant à l'URL (redis:// ou local://)
+
+    Args:
+        url (str): URL du backend
+        timeout (float): Délai de connexion et de lecture Redis (None : celui de RedisCache)
+    """
+    if url.startswith('local://'):
+        return _local_backends.setdefault(url, LocalSharedCache())
+    if url.startswith('redis://'):
+        options = {} if timeout is None else {'timeout': timeout}
+        return RedisCache(url, pool_size=int(os.environ.get('USER_SHARED_CACHE_POOL_SIZE', DEFAULT_POOL_SIZE)), **options)
+    raise ValueError(f'Unsupported shared cache URL: {url}')
+
+def get_shared_cache():
+    """
+    Retourne le cache partagé configuré par USER_SHARED_CACHE_URL, ou None
+
+    Le cache est créé une fois par conteneur (et recréé si l'URL change).
+    """
+    global _shared_cache, _shared_cache_url
+
+    url = os.environ.get('USER_SHARED_CACHE_URL')
+    if not url:
+        return None
+
+    if _shared_cache is None or _shared_cache_url != url:
+        with _shared_cache_lock:
+            if _shared_cache is None or _shared_cache_url != url:
+                shared = SharedUserCache(create_backend(url), ttl=float(os.environ.get('USER_SHARED_CACHE_TTL', DEFAULT_TTL)))
+                _shared_cache, _shared_cache_url = shared, url
+    return _shared_cache
+
+def on_user_changes(changes):
+    """Abonné user_events : invalide le cache partagé configuré, même s'il n'a pas encore servi"""
+    shared = get_shared_cache()
+    if shared is not None:
+        shared.on_user_changes(changes)
+
+subscribe(on_user_changes)
@@ -0,0 +1,340 @@
+"""
+Test d'endurance : un conteneur chaud qui traite un grand nombre d'invocations
+
+Usage:
+    USER_DB_ENGINE=local python soak.py --events 2000000 --max-rss-growth-mb 32 --max-p99-drift 1.5
+
+Un mélange d'événements (lectures, lectures conditionnelles, créations,
+doublons, utilisateurs absents, recherches, préflights CORS) est rejoué dans
+un seul processus contre la table en mémoire (local_table). La population
+d'utilisateurs est bornée (les créations s'arrêtent quand elle a doublé) :
+une fois la chauffe passée, la taille des données ne change plus et toute
+croissance mémoire vient du code.
+
+Le cache local (USER_CACHE_TTL) et un cache partagé local:// sont activés
+pendant le test, comme en production : leur croissance est mesurée avec le
+reste.
+
+Par fenêtre d'événements sont relevés la RSS, la mémoire suivie par
+tracemalloc et les percentiles de latence. Le test échoue si la croissance de
+la RSS ou du tas depuis la fin de la chauffe, ou la dérive du p99 (fin par
+rapport au début), dépasse les seuils donnés, ou si une réponse 5xx apparaît.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import user_service
+from local_table import reset
+from shared_cache import create_backend
+from user_cache import cache
+
+DEFAULT_EVENTS = 200000
+DEFAULT_WINDOW = 10000
+DEFAULT_USERS = 1000
+DEFAULT_CACHE_TTL = 60
+DEFAULT_SHARED_CACHE_URL = 'local://soak'
+
+# Proportions du mélange d'événements
+EVENT_MIX = (
+    ('get', 55),
+    ('conditional_get', 15),
+    ('create', 10),
+    ('duplicate', 5),
+    ('missing', 5),
+    ('search', 5),
+    ('options', 5)
+)
+
+# Syllabes des noms générés : des noms variés gardent l'index de recherche réaliste
+SYLLABLES = ('ka', 'lo', 'mi', 'ra', 'ne', 'to', 'su', 'vi', 'da', 'ber', 'tin', 'sol', 'mar', 'el', 'jo', 'an')
+
+def soak_user(index):
+    """Utilisateur déterministe numéro index"""
+    rng = random.Random(index)
+    first = ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 3))).capitalize()
+    last = ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))).capitalize()
+    return {
+        'userId': f'soak-{index:07d}',
+        'name': f'{first} {last}',
+        'email': f'{first.lower()}.{last.lower()}@example.com'
+    }
+
+def current_rss():
+    """RSS courante du processus en octets (pic de RSS à défaut de /proc)"""
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024
+
+def percentile(sorted_values, fraction):
+    """Percentile d'une liste déjà triée (rang le plus proche)"""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+def _median(values):
+    values = sorted(values)
+    return values[len(values) // 2] if values else 0.0
+
+class EventMix:
+    """Génère un flux d'événements API Gateway reproductible"""
+
+    def __init__(self, users=DEFAULT_USERS, seed=0):
+        self.users = users
+        self.random = random.Random(seed)
+        self.kinds = [kind for kind, _ in EVENT_MIX]
+        self.weights = [weight for _, weight in EVENT_MIX]
+        self.etags = {}
+        self.created = 0
+
+    def user_id(self):
+        return f'soak-{self.random.randrange(self.users):07d}'
+
+    def next_event(self):
+        kind = self.random.choices(self.kinds, self.weights)[0]
+        if kind == 'create':
+            # Nouveaux utilisateurs jusqu'à doubler la population, puis des doublons
+            body = soak_user(self.users + self.created)
+            self.created = min(self.created + 1, self.users - 1)
+            return {'httpMethod': 'POST', 'path': '/user', 'body': json.dumps(body)}
+        if kind == 'duplicate':
+            body = soak_user(self.random.randrange(self.users))
+            return {'httpMethod': 'POST', 'path': '/user', 'body': json.dumps(body)}
+        if kind == 'missing':
+            return {'httpMethod': 'GET', 'path': '/user', 'queryStringParameters': {'userId': 'missing-user'}}
+        if kind == 'search':
+            # Début du prénom d'un utilisateur, comme une saisie réelle
+            query = soak_user(self.random.randrange(self.users))['name'][:4]
+            return {'httpMethod': 'GET', 'path': '/users/search', 'queryStringParameters': {'q': query}}
+        if kind == 'options':
+            return {'httpMethod': 'OPTIONS', 'path': '/user'}
+
+        user_id = self.user_id()
+        event = {'httpMethod': 'GET', 'path': '/user', 'queryStringParameters': {'userId': user_id}}
+        if kind == 'conditional_get' and user_id in self.etags:
+            event['headers'] = {'If-None-Match': self.etags[user_id]}
+        return event
+
+    def observe(self, event, response):
+        """Mémorise l'ETag renvoyé pour les lectures conditionnelles suivantes"""
+        etag = (response.get('headers') or {}).get('ETag')
+        if etag:
+            self.etags[event['queryStringParameters']['userId']] = etag
+
+def seed_users(users):
+    """Crée la population d'utilisateurs dans la table locale"""
+    user_service.batch_write_users([soak_user(index) for index in range(users)])
+
+def run_soak(events=DEFAULT_EVENTS, window=DEFAULT_WINDOW, users=DEFAULT_USERS, warmup=None,
+             max_rss_growth_mb=None, max_heap_growth_mb=None, max_p99_drift=None,
+             trace=True, seed=0, handler=None, out=sys.stdout,
+             cache_ttl=DEFAULT_CACHE_TTL, shared_cache_url=DEFAULT_SHARED_CACHE_URL):
+    """
+    Rejoue events invocations dans le processus courant
+
+    Args:
+        events (int): Nombre total d'invocations
+        window (int): Nombre d'invocations par mesure
+        users (int): Taille de la population d'utilisateurs
+        warmup (int): Invocations de chauffe exclues de la référence (par défaut
+                      une fenêtre ; les créations durent environ 10 * users invocations)
+        max_rss_growth_mb (float): Croissance de RSS tolérée (None : pas de seuil)
+        max_heap_growth_mb (float): Croissance du tas suivi par tracemalloc tolérée
+        max_p99_drift (float): Rapport p99 final / p99 initial toléré
+        trace (bool): Activer tracemalloc (ralentit chaque invocation)
+        seed (int): Graine du générateur d'événements
+        handler: Handler à exercer (par défaut index.handler)
+        out: Flux recevant une ligne par fenêtre et le résumé
+        cache_ttl (float): TTL du cache local pendant le test (0 : désactivé)
+        shared_cache_url (str): Cache partagé pendant le test (None : aucun)
+
+    Returns:
+        dict: Résultat avec success (bool), windows, rssGrowthMb, heapGrowthMb,
+              p99Drift, topGrowth, cacheHits, sharedCacheCalls et errors
+    """
+    if user_service.DB_ENGINE != 'local':
+        return {'success': False, 'errors': ['Soak test requires USER_DB_ENGINE=local']}
+
+    if handler is None:
+        from index import handler
+    import user_search
+
+    warmup = window if warmup is None else warmup
+    mix = EventMix(users, seed)
+    reset()
+    seed_users(users)
+    # Snapshot de recherche construit comme hors ligne, avant la première requête
+    user_search.build_snapshot(user_search.SNAPSHOT_PATH)
+
+    started_tracing = trace and not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+
+    windows = []
+    errors = []
+    baseline = None
+    latencies = []
+    server_errors = 0
+    sink = io.StringIO()
+    clock = time.perf_counter_ns
+
+    # Caches actifs pendant le test, rétablis ensuite
+    previous_ttl = cache.ttl
+    previous_url = os.environ.get('USER_SHARED_CACHE_URL')
+    shared_backend = create_backend(shared_cache_url) if shared_cache_url else None
+
+    try:
+        cache.clear()
+        cache.ttl = cache_ttl
+        if shared_backend is not None:
+            shared_backend.clear()
+            os.environ['USER_SHARED_CACHE_URL'] = shared_cache_url
+        else:
+            os.environ.pop('USER_SHARED_CACHE_URL', None)
+
+        for count in range(1, events + 1):
+            event = mix.next_event()
+            # Le handler journalise chaque événement : ces lignes sont écartées
+            with contextlib.redirect_stdout(sink):
+                begin = clock()
+                response = handler(event, None)
+                latencies.append(clock() - begin)
+            sink.seek(0)
+            sink.truncate()
+
+            status = response.get('statusCode', 500)
+            if status >= 500:
+                server_errors += 1
+            elif status == 200 and event['httpMethod'] == 'GET' and event['path'] == '/user':
+                mix.observe(event, response)
+
+            if count == warmup:
+                baseline = {
+                    'rss': current_rss(),
+                    'heap': tracemalloc.get_traced_memory()[0] if trace else 0,
+                    'snapshot': tracemalloc.take_snapshot() if trace else None
+                }
+
+            if count % window == 0 or count == events:
+                latencies.sort()
+                stats = {
+                    'events': count,
+                    'p50Ms': percentile(latencies, 0.50) / 1e6,
+                    'p99Ms': percentile(latencies, 0.99) / 1e6,
+                    'rssMb': current_rss() / 2 ** 20,
+                    'heapMb': (tracemalloc.get_traced_memory()[0] / 2 ** 20) if trace else 0.0,
+                    'warm': baseline is not None
+                }
+                windows.append(stats)
+                latencies = []
+                print(
+                    f"events={count} p50={stats['p50Ms']:.3f}ms p99={stats['p99Ms']:.3f}ms "
+                    f"rss={stats['rssMb']:.1f}MiB heap={stats['heapMb']:.1f}MiB", file=out
+                )
+
+        final_snapshot = tracemalloc.take_snapshot() if trace and baseline else None
+        cache_hits = cache.hits
+        shared_calls = shared_backend.calls if shared_backend is not None else 0
+    finally:
+        if started_tracing:
+            tracemalloc.stop()
+        cache.ttl = previous_ttl
+        cache.clear()
+        if previous_url is None:
+            os.environ.pop('USER_SHARED_CACHE_URL', None)
+        else:
+            os.environ['USER_SHARED_CACHE_URL'] = previous_url
+
+    if server_errors:
+        errors.append(f'{server_errors} responses with status >= 500')
+
+    warm_windows = [stats for stats in windows if stats['warm']]
+    if baseline is None or len(warm_windows) < 2:
+        errors.append('Not enough events after warmup to measure drift')
+        return {'success': False, 'windows': windows, 'errors': errors}
+
+    rss_growth = (current_rss() - baseline['rss']) / 2 ** 20
+    heap_growth = (warm_windows[-1]['heapMb'] - baseline['heap'] / 2 ** 20) if trace else 0.0
+
+    # p99 de référence et final : médiane sur un quart des fenêtres chaudes
+    span = max(1, len(warm_windows) // 4)
+    first_p99 = _median(stats['p99Ms'] for stats in warm_windows[:span])
+    last_p99 = _median(stats['p99Ms'] for stats in warm_windows[-span:])
+    p99_drift = last_p99 / first_p99 if first_p99 else 1.0
+
+    top_growth = []
+    if final_snapshot is not None:
+        top_growth = [
+            {'site': f'{os.path.basename(stat.traceback[0].filename)}:{stat.traceback[0].lineno}', 'kib': round(stat.size_diff / 1024, 1)}
+            for stat in final_snapshot.compare_to(baseline['snapshot'], 'lineno')[:5]
+            if stat.size_diff > 0
+        ]
+
+    if max_rss_growth_mb is not None and rss_growth > max_rss_growth_mb:
+        errors.append(f'RSS grew by {rss_growth:.1f} MiB (limit {max_rss_growth_mb} MiB)')
+    if max_heap_growth_mb is not None and heap_growth > max_heap_growth_mb:
+        errors.append(f'Traced heap grew by {heap_growth:.1f} MiB (limit {max_heap_growth_mb} MiB)')
+    if max_p99_drift is not None and p99_drift > max_p99_drift:
+        errors.append(f'p99 drifted from {first_p99:.3f}ms to {last_p99:.3f}ms (x{p99_drift:.2f}, limit x{max_p99_drift})')
+
+    print(
+        f'soak events={events} rssGrowth={rss_growth:.1f}MiB heapGrowth={heap_growth:.1f}MiB '
+        f'p99Drift=x{p99_drift:.2f} cacheHits={cache_hits} sharedCacheCalls={shared_calls} '
+        f'errors={len(errors)}', file=out
+    )
+    for site in top_growth:
+        print(f"  +{site['kib']}KiB {site['site']}", file=out)
+
+    return {
+        'success': not errors,
+        'windows': windows,
+        'rssGrowthMb': rss_growth,
+        'heapGrowthMb': heap_growth,
+        'p99Drift': p99_drift,
+        'topGrowth': top_growth,
+        'cacheHits': cache_hits,
+        'sharedCacheCalls': shared_calls,
+        'errors': errors
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Replay mixed events through one warm handler')
+    parser.add_argument('--events', type=int, default=DEFAULT_EVENTS)
+    parser.add_argument('--window', type=int, default=DEFAULT_WINDOW)
+    parser.add_argument('--users', type=int, default=DEFAULT_USERS)
+    parser.add_argument('--warmup', type=int, help='Events excluded from the baseline (default: one window)')
+    parser.add_argument('--max-rss-growth-mb', type=float)
+    parser.add_argument('--max-heap-growth-mb', type=float)
+    parser.add_argument('--max-p99-drift', type=float)
+    parser.add_argument('--no-tracemalloc', action='store_true', help='Skip allocation tracing (faster)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--cache-ttl', type=float, default=DEFAULT_CACHE_TTL, help='Local cache TTL (0 disables it)')
+    parser.add_argument('--shared-cache-url', default=DEFAULT_SHARED_CACHE_URL, help="Shared cache URL ('' disables it)")
+    args = parser.parse_args(argv)
+    os.environ.setdefault('USER_SEARCH_SNAPSHOT', os.path.join(tempfile.gettempdir(), 'soak-search.idx'))
+
+    result = run_soak(
+        args.events, args.window, args.users, args.warmup,
+        args.max_rss_growth_mb, args.max_heap_growth_mb, args.max_p99_drift,
+        trace=not args.no_tracemalloc, seed=args.seed,
+        cache_ttl=args.cache_ttl, shared_cache_url=args.shared_cache_url or None
+    )
+
+    for error in result['errors']:
+        print(f'Error: {error}', file=sys.stderr)
+    return 0 if result['success'] else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
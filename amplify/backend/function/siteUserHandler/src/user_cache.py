@@ -0,0 +1,78 @@
+"""
+Cache local des utilisateurs, propre à chaque conteneur Lambda
+
+Désactivé par défaut ; USER_CACHE_TTL (secondes) l'active et USER_CACHE_SIZE
+borne le nombre d'entrées (éviction LRU). Le cache est invalidé par les
+événements de user_events à chaque modification d'un utilisateur.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from user_events import subscribe
+
+class LocalUserCache:
+    """Cache LRU avec expiration"""
+
+    def __init__(self, ttl=0, max_size=10000):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.ttl > 0 and self.max_size > 0
+
+    def get(self, user_id):
+        """Retourne l'utilisateur en cache, ou None s'il est absent ou expiré"""
+        if not self.enabled:
+            return None
+
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[user_id]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, user_id, user):
+        if not self.enabled:
+            return
+
+        with self._lock:
+            self._entries[user_id] = (time.monotonic() + self.ttl, user)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def on_user_changes(self, changes):
+        """Abonné user_events : invalide les utilisateurs modifiés"""
+        for change in changes:
+            self.invalidate(change['userId'])
+
+cache = LocalUserCache(
+    ttl=float(os.environ.get('USER_CACHE_TTL', '0')),
+    max_size=int(os.environ.get('USER_CACHE_SIZE', '10000'))
+)
+subscribe(cache.on_user_changes)
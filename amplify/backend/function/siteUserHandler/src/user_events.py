@@ -0,0 +1,180 @@
+"""
+Événements de modification des utilisateurs
+
+Les écritures de user_service publient directement leurs modifications dans le
+conteneur, et handler accepte aussi les événements DynamoDB Streams. Les deux
+sources alimentent par lots les abonnés enregistrés avec subscribe() (cache,
+index de recherche, compteurs), qui sont ainsi tenus à jour incrémentalement.
+
+Une modification est un dict :
+    {'type': 'INSERT' | 'MODIFY' | 'REMOVE', 'userId': str,
+     'newImage': dict ou None, 'oldImage': dict ou None, 'source': 'local' | 'stream',
+     'sequence': SequenceNumber du flux ou None}
+
+Une même écriture peut être vue deux fois (publication locale puis flux), et un
+lot du flux peut être rejoué : les abonnés doivent donc être idempotents. Les
+compteurs ne retiennent qu'une source (USER_COUNTERS_SOURCE, 'local' par
+défaut, 'stream' quand le flux est branché) et ignorent les enregistrements
+déjà comptés.
+"""
+import os
+import threading
+from collections import OrderedDict
+
+from boto3.dynamodb.types import TypeDeserializer
+
+_subscribers = []
+_lock = threading.Lock()
+_deserializer = TypeDeserializer()
+
+COUNTERS_SOURCE = os.environ.get('USER_COUNTERS_SOURCE', 'local')
+MAX_SEEN_SEQUENCES = 10000
+
+def subscribe(callback):
+    """
+    Enregistre un abonné
+
+    Args:
+        callback: Fonction appelée avec une liste de modifications
+    """
+    with _lock:
+        if callback not in _subscribers:
+            _subscribers.append(callback)
+    return callback
+
+def unsubscribe(callback):
+    """Retire un abonné précédemment enregistré"""
+    with _lock:
+        if callback in _subscribers:
+            _subscribers.remove(callback)
+
+def publish(changes):
+    """
+    Transmet un lot de modifications à tous les abonnés
+
+    Une erreur dans un abonné est journalisée sans interrompre les autres ni
+    l'écriture qui a déclenché la publication.
+
+    Returns:
+        list: Erreurs rencontrées par les abonnés
+    """
+    if not changes:
+        return []
+
+    with _lock:
+        subscribers = list(_subscribers)
+
+    errors = []
+    for callback in subscribers:
+        try:
+            callback(changes)
+        except Exception as e:
+            name = getattr(callback, '__qualname__', repr(callback))
+            print(f'Error in user event subscriber {name}: {str(e)}')
+            errors.append(f'{name}: {str(e)}')
+    return errors
+
+def user_change(change_type, user_id, new_image=None, old_image=None, source='local', sequence=None):
+    """Construit une modification au format attendu par les abonnés"""
+    return {
+        'type': change_type,
+        'userId': user_id,
+        'newImage': new_image,
+        'oldImage': old_image,
+        'source': source,
+        'sequence': sequence
+    }
+
+def is_stream_event(event):
+    """Indique si l'événement Lambda provient d'un flux DynamoDB"""
+    records = event.get('Records')
+    return bool(records) and records[0].get('eventSource') == 'aws:dynamodb'
+
+def _deserialize(image):
+    if not image:
+        return None
+    return {key: _deserializer.deserialize(value) for key, value in image.items()}
+
+def handle_stream_event(event):
+    """
+    Publie les enregistrements d'un lot DynamoDB Streams
+
+    Si un abonné échoue, le lot est signalé à partir de son premier
+    enregistrement pour être rejoué (le mapping doit activer
+    ReportBatchItemFailures).
+
+    Returns:
+        dict: Réponse partielle {'batchItemFailures': [{'itemIdentifier': SequenceNumber}]}
+    """
+    records = event['Records']
+    changes = []
+
+    for record in records:
+        stream = record.get('dynamodb', {})
+        keys = _deserialize(stream.get('Keys')) or {}
+        changes.append(user_change(
+            record['eventName'],
+            keys.get('userId'),
+            _deserialize(stream.get('NewImage')),
+            _deserialize(stream.get('OldImage')),
+            source='stream',
+            sequence=stream.get('SequenceNumber')
+        ))
+
+    errors = publish(changes)
+    print(f'Published {len(changes)} stream records, {len(errors)} subscriber errors')
+
+    if errors:
+        return {'batchItemFailures': [{'itemIdentifier': records[0]['dynamodb']['SequenceNumber']}]}
+    return {'batchItemFailures': []}
+
+class UserCounters:
+    """
+    Compteurs de modifications tenus à jour par les événements
+
+    Args:
+        source (str): Seule source comptée ('local' ou 'stream'), pour ne pas
+                      compter deux fois une écriture publiée puis lue dans le flux
+        max_seen (int): Nombre de SequenceNumber retenus pour ignorer les lots rejoués
+    """
+
+    def __init__(self, source=COUNTERS_SOURCE, max_seen=MAX_SEEN_SEQUENCES):
+        self.source = source
+        self.max_seen = max_seen
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.counts = {'INSERT': 0, 'MODIFY': 0, 'REMOVE': 0}
+            self.users_delta = 0
+            self._seen = OrderedDict()
+
+    def _is_new(self, change):
+        sequence = change.get('sequence')
+        if sequence is None:
+            return True
+        if sequence in self._seen:
+            return False
+        self._seen[sequence] = True
+        if len(self._seen) > self.max_seen:
+            self._seen.popitem(last=False)
+        return True
+
+    def __call__(self, changes):
+        with self._lock:
+            for change in changes:
+                if change.get('source') != self.source or not self._is_new(change):
+                    continue
+                self.counts[change['type']] = self.counts.get(change['type'], 0) + 1
+                if change['type'] == 'INSERT':
+                    self.users_delta += 1
+                elif change['type'] == 'REMOVE':
+                    self.users_delta -= 1
+
+    def snapshot(self):
+        """Retourne une copie des compteurs"""
+        with self._lock:
+            return dict(self.counts, usersDelta=self.users_delta)
+
+counters = subscribe(UserCounters())
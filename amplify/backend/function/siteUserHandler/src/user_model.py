@@ -0,0 +1,140 @@
+"""
+Modèle User compact
+
+Un User est construit une seule fois depuis un élément DynamoDB (ou une
+requête validée) et n'est plus modifié ensuite : il peut être partagé sans
+copie entre le cache, les traitements par lots et les réponses HTTP. Ses
+attributs sont stockés dans des __slots__ (pas de __dict__ par objet) et son
+corps JSON est calculé au plus une fois.
+
+Pour la compatibilité avec le code qui manipulait des dicts, un User se lit
+aussi comme un mapping : user['userId'], user.get('name').
+
+Une création (add_user, add_users) porte version 1 et la date updatedAt ;
+l'import en masse (batch_write_users) écrit tels quels les éléments restaurés
+(avec updatedAt), donne aux autres leur version (1 par défaut) et une date, et
+écrase l'élément existant sans incrémenter sa version : aucune écriture ne lit
+la version précédente. L'ETag (fort) est l'empreinte du corps JSON, calculée
+au plus une fois par objet : il change dès que le contenu change, même à
+version égale.
+"""
+import hashlib
+import json
+from decimal import Decimal
+
+# Champs portés par des slots ; les autres attributs vont dans attributes
+CORE_FIELDS = ('userId', 'name', 'email', 'version', 'updatedAt')
+
+def json_default(value):
+    """
+    Sérialiseur JSON pour les types renvoyés par boto3 (Decimal, set, bytes)
+
+    Usage: json.dumps(item, default=json_default)
+    """
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    if isinstance(value, (set, frozenset)):
+        return sorted(value, key=str)
+    if isinstance(value, (bytes, bytearray)):
+        return bytes(value).decode('utf-8', 'replace')
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+class User:
+    """Utilisateur immuable"""
+
+    __slots__ = ('user_id', 'name', 'email', 'version', 'updated_at', 'attributes', '_json', '_etag')
+
+    def __init__(self, user_id, name, email, attributes=None, version=None, updated_at=None):
+        set_slot = object.__setattr__
+        set_slot(self, 'user_id', user_id)
+        set_slot(self, 'name', name)
+        set_slot(self, 'email', email)
+        set_slot(self, 'version', version)
+        set_slot(self, 'updated_at', updated_at)
+        set_slot(self, 'attributes', attributes or None)
+        set_slot(self, '_json', None)
+        set_slot(self, '_etag', None)
+
+    def __setattr__(self, name, value):
+        raise AttributeError('User objects are immutable')
+
+    @classmethod
+    def from_item(cls, item):
+        """Construit un User depuis un élément DynamoDB ou un dict de requête"""
+        attributes = {key: value for key, value in item.items() if key not in CORE_FIELDS}
+        version = item.get('version')
+        return cls(
+            item.get('userId'), item.get('name'), item.get('email'), attributes,
+            int(version) if version is not None else None, item.get('updatedAt')
+        )
+
+    def to_item(self):
+        """Retourne l'élément DynamoDB (nouveau dict)"""
+        item = {}
+        for key, value in self._core_fields():
+            if value is not None:
+                item[key] = value
+        if self.attributes:
+            item.update(self.attributes)
+        return item
+
+    to_dict = to_item
+
+    def _core_fields(self):
+        return (
+            ('userId', self.user_id), ('name', self.name), ('email', self.email),
+            ('version', self.version), ('updatedAt', self.updated_at)
+        )
+
+    def to_json(self):
+        """Corps JSON de la réponse, calculé au premier appel puis réutilisé"""
+        if self._json is None:
+            object.__setattr__(self, '_json', json.dumps(self.to_item(), default=json_default))
+        return self._json
+
+    @property
+    def etag(self):
+        """ETag fort : empreinte du corps JSON"""
+        if self._etag is None:
+            digest = hashlib.blake2b(self.to_json().encode('utf-8'), digest_size=12).hexdigest()
+            object.__setattr__(self, '_etag', f'"{digest}"')
+        return self._etag
+
+    # Accès en lecture façon dict
+    def __getitem__(self, key):
+        for field, value in self._core_fields():
+            if field == key:
+                if value is None:
+                    raise KeyError(key)
+                return value
+        return (self.attributes or {})[key]
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def keys(self):
+        return self.to_item().keys()
+
+    def __eq__(self, other):
+        if isinstance(other, User):
+            return self.to_item() == other.to_item()
+        if isinstance(other, dict):
+            return self.to_item() == other
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f'User(userId={self.user_id!r}, name={self.name!r}, email={self.email!r})'
+
+def serialize_user(user):
+    """Corps JSON d'un utilisateur, qu'il s'agisse d'un User ou d'un dict"""
+    if isinstance(user, User):
+        return user.to_json()
+    return json.dumps(user, default=json_default)
@@ -0,0 +1,171 @@
+"""
+Création asynchrone d'utilisateurs via une file SQS
+
+Quand USER_QUEUE_URL est défini, POST /user valide la requête, la dépose dans
+la file et répond 202 immédiatement. La même fonction Lambda consomme ensuite
+la file par lots (événements SQS) : les créations sont regroupées en appels
+BatchGetItem/BatchWriteItem et seuls les messages en échec transitoire sont
+renvoyés dans batchItemFailures (le mapping SQS doit activer
+ReportBatchItemFailures).
+
+USER_QUEUE_URL=local:// utilise une file en mémoire (LocalQueue) pour les tests.
+"""
+import json
+import os
+import threading
+import uuid
+from collections import deque
+
+import boto3
+
+from user_service import add_users, validate_user
+
+LOCAL_QUEUE_PREFIX = 'local://'
+
+class LocalQueue:
+    """
+    File en mémoire remplaçant SQS en local
+
+    Expose send_message comme le client boto3 et fabrique des événements SQS
+    identiques à ceux reçus par la Lambda.
+    """
+
+    def __init__(self, queue_url='local://siteUserQueue'):
+        self.queue_url = queue_url
+        self._messages = deque()
+        self._in_flight = {}
+        self._lock = threading.Lock()
+
+    def send_message(self, QueueUrl, MessageBody, **kwargs):
+        message_id = str(uuid.uuid4())
+        with self._lock:
+            self._messages.append({'messageId': message_id, 'body': MessageBody, 'receiveCount': 0})
+        return {'MessageId': message_id}
+
+    def __len__(self):
+        return len(self._messages)
+
+    def receive_event(self, max_records=10):
+        """
+        Retire jusqu'à max_records messages et les renvoie sous forme d'événement SQS
+
+        Returns:
+            dict: Événement {'Records': [...]} (liste vide si la file est vide)
+        """
+        records = []
+        with self._lock:
+            while self._messages and len(records) < max_records:
+                message = self._messages.popleft()
+                message['receiveCount'] += 1
+                self._in_flight[message['messageId']] = message
+                records.append({
+                    'messageId': message['messageId'],
+                    'receiptHandle': message['messageId'],
+                    'body': message['body'],
+                    'attributes': {'ApproximateReceiveCount': str(message['receiveCount'])},
+                    'eventSource': 'aws:sqs',
+                    'eventSourceARN': f'arn:aws:sqs:local:000000000000:{self.queue_url[len(LOCAL_QUEUE_PREFIX):]}'
+                })
+        return {'Records': records}
+
+    def acknowledge(self, event, response):
+        """Supprime les messages traités et remet dans la file ceux signalés dans batchItemFailures"""
+        failed = {failure['itemIdentifier'] for failure in response.get('batchItemFailures', [])}
+        with self._lock:
+            for record in event['Records']:
+                message = self._in_flight.pop(record['messageId'], None)
+                if message and record['messageId'] in failed:
+                    self._messages.append(message)
+
+_local_queues = {}
+
+def get_queue_url():
+    """Retourne l'URL de la file de création, ou None si le mode asynchrone est désactivé"""
+    return os.environ.get('USER_QUEUE_URL') or None
+
+def get_queue_client(queue_url):
+    """
+    Retourne le client de file correspondant à l'URL
+
+    Les URL local:// partagent une LocalQueue par URL dans le conteneur.
+    """
+    if queue_url.startswith(LOCAL_QUEUE_PREFIX):
+        return _local_queues.setdefault(queue_url, LocalQueue(queue_url))
+    return boto3.client('sqs')
+
+def enqueue_user(user_data, queue_url=None):
+    """
+    Valide un utilisateur et dépose sa création dans la file
+
+    Args:
+        user_data (dict): Données de l'utilisateur avec userId, name, email
+        queue_url (str): URL de la file (par défaut USER_QUEUE_URL)
+
+    Returns:
+        dict: Résultat de l'opération avec success (bool) et message/error
+    """
+    error = validate_user(user_data)
+    if error:
+        return {
+            'success': False,
+            'error': error
+        }
+
+    queue_url = queue_url or get_queue_url()
+    try:
+        response = get_queue_client(queue_url).send_message(
+            QueueUrl=queue_url,
+            MessageBody=json.dumps(user_data)
+        )
+        return {
+            'success': True,
+            'message': 'User creation queued',
+            'userId': user_data['userId'],
+            'messageId': response['MessageId']
+        }
+    except Exception as e:
+        return {
+            'success': False,
+            'error': f'Queue error: {str(e)}'
+        }
+
+def is_sqs_event(event):
+    """Indique si l'événement Lambda provient d'un mapping SQS"""
+    records = event.get('Records')
+    return bool(records) and records[0].get('eventSource') == 'aws:sqs'
+
+def handle_sqs_event(event):
+    """
+    Traite un lot de messages de création d'utilisateurs
+
+    Les erreurs définitives (JSON invalide, champs manquants, utilisateur
+    existant) sont journalisées puis abandonnées : les rejouer ne servirait à
+    rien. Seules les erreurs transitoires (base de données) sont signalées
+    pour être rejouées par SQS.
+
+    Returns:
+        dict: Réponse partielle {'batchItemFailures': [{'itemIdentifier': messageId}]}
+    """
+    records = event['Records']
+    users_data = []
+    positions = []
+
+    for position, record in enumerate(records):
+        try:
+            users_data.append(json.loads(record['body']))
+            positions.append(position)
+        except (json.JSONDecodeError, TypeError):
+            print(f'Dropping message {record["messageId"]}: invalid JSON body')
+
+    failures = []
+    for position, result in zip(positions, add_users(users_data)):
+        if result['success']:
+            continue
+        message_id = records[position]['messageId']
+        if result['retryable']:
+            failures.append({'itemIdentifier': message_id})
+        else:
+            print(f'Dropping message {message_id}: {result["error"]}')
+
+    print(f'Processed {len(records)} SQS messages, {len(failures)} to retry')
+    return {'batchItemFailures': failures}
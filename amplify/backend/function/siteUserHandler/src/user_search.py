@@ -0,0 +1,650 @@
+"""
+Recherche par préfixe et approximative sur le nom et l'email des utilisateurs
+
+L'index associe chaque terme normalisé (mots du nom, email complet, partie
+locale et domaine de l'email) aux utilisateurs qui le contiennent. La
+recherche par préfixe se fait par dichotomie sur les termes triés ; la
+recherche approximative (fautes de frappe) passe par un index de trigrammes.
+
+L'index est construit hors ligne par un scan en flux de la table (tâche
+planifiée), puis enregistré dans un fichier binaire (snapshot) livré par une
+couche Lambda ou un volume EFS (USER_SEARCH_SNAPSHOT), ou déposé sur S3
+(USER_SEARCH_SNAPSHOT_URL, téléchargé dans /tmp). Le conteneur le charge par
+mmap : seules les pages effectivement lues sont chargées en mémoire. Aucune
+requête ne déclenche de scan ; sans snapshot, seules les modifications vues
+par le conteneur sont cherchables.
+
+Les modifications reçues via user_events sont appliquées dans un petit index
+en mémoire superposé au snapshot. Les écritures des autres conteneurs n'y
+arrivent pas : elles sont rattrapées quand le snapshot est reconstruit. Toutes
+les USER_SEARCH_REFRESH_INTERVAL secondes, le conteneur vérifie si une
+nouvelle version est disponible et la recharge.
+
+Usage:
+    python user_search.py build /mnt/search/users.idx
+    python user_search.py build s3://bucket/user-search.idx
+    python user_search.py query /mnt/search/users.idx "ali"
+"""
+import argparse
+import bisect
+import heapq
+import mmap
+import os
+import re
+import struct
+import sys
+import tempfile
+import threading
+import time
+import unicodedata
+import zlib
+from array import array
+
+import boto3
+from botocore.exceptions import BotoCoreError, ClientError
+
+from user_events import subscribe
+from user_service import scan_users
+
+SNAPSHOT_PATH = os.environ.get('USER_SEARCH_SNAPSHOT', '/opt/user-search/users.idx')
+SNAPSHOT_URL = os.environ.get('USER_SEARCH_SNAPSHOT_URL')
+DOWNLOAD_PATH = os.path.join(tempfile.gettempdir(), 'user-search.idx')
+REFRESH_INTERVAL = float(os.environ.get('USER_SEARCH_REFRESH_INTERVAL', '300'))
+# Métadonnée S3 portant le début du scan qui a produit le snapshot
+BUILT_AT_METADATA = 'built-at'
+
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 50
+# Nombre maximal d'entrées examinées par mot de la requête (préfixes très courts)
+MAX_CANDIDATES = 10000
+MIN_FUZZY_LENGTH = 3
+MIN_SIMILARITY = 0.4
+
+FIELD_NAME = 0
+FIELD_EMAIL = 1
+FIELD_WEIGHTS = (1.0, 0.9)
+
+MAGIC = b'USRIDX01'
+# magic, n_docs, n_terms, n_grams, n_postings, puis les offsets des sections
+HEADER = struct.Struct('<8sIIII6Q')
+DOC_ENTRY = struct.Struct('<QI')
+TERM_ENTRY = struct.Struct('<IHxxII')
+GRAM_ENTRY = struct.Struct('<II')
+DOC_SEPARATOR = '\x1f'
+
+_WORD_RE = re.compile(r'[^\W_]+')
+
+def normalize(text):
+    """Met en minuscules et retire les accents"""
+    decomposed = unicodedata.normalize('NFKD', str(text))
+    return ''.join(c for c in decomposed if not unicodedata.combining(c)).lower()
+
+def tokenize(text):
+    """Découpe un texte normalisé en mots"""
+    return _WORD_RE.findall(normalize(text))
+
+def user_terms(name, email):
+    """
+    Calcule les termes indexés pour un utilisateur
+
+    Returns:
+        set: Couples (terme, champ)
+    """
+    terms = {(word, FIELD_NAME) for word in tokenize(name or '')}
+
+    email = normalize(email or '').strip()
+    if email:
+        terms.add((email, FIELD_EMAIL))
+        local, _, domain = email.partition('@')
+        for part in [local, domain] + _WORD_RE.findall(email):
+            if part:
+                terms.add((part, FIELD_EMAIL))
+    return terms
+
+def gram_hashes(term):
+    """Empreintes (crc32) des trigrammes distincts d'un terme"""
+    return {zlib.crc32(term[i:i + 3].encode('utf-8')) for i in range(len(term) - 2)}
+
+def _similarity(query_grams, term):
+    term_grams = gram_hashes(term)
+    overlap = len(query_grams & term_grams)
+    return overlap / (len(query_grams) + len(term_grams) - overlap) if overlap else 0.0
+
+class MemoryIndex:
+    """Index modifiable en mémoire (construction et modifications récentes)"""
+
+    def __init__(self):
+        self.docs = {}
+        self.postings = {}
+        self.sorted_terms = []
+        self.grams = {}
+
+    def __len__(self):
+        return len(self.docs)
+
+    def add(self, user_id, name, email):
+        self.remove(user_id)
+        self.docs[user_id] = (user_id, name or '', email or '')
+
+        for term, field in user_terms(name, email):
+            postings = self.postings.get(term)
+            if postings is None:
+                postings = self.postings[term] = set()
+                bisect.insort(self.sorted_terms, term)
+                for gram in gram_hashes(term):
+                    self.grams.setdefault(gram, set()).add(term)
+            postings.add((user_id, field))
+
+    def remove(self, user_id):
+        doc = self.docs.pop(user_id, None)
+        if doc is None:
+            return
+
+        for term, field in user_terms(doc[1], doc[2]):
+            postings = self.postings.get(term)
+            if postings is None:
+                continue
+            postings.discard((user_id, field))
+            if not postings:
+                del self.postings[term]
+                del self.sorted_terms[bisect.bisect_left(self.sorted_terms, term)]
+                for gram in gram_hashes(term):
+                    terms = self.grams.get(gram)
+                    terms.discard(term)
+                    if not terms:
+                        del self.grams[gram]
+
+    def get_doc(self, key):
+        return self.docs[key]
+
+    def iter_prefix(self, token):
+        """Termes commençant par token, avec leurs (clé document, champ)"""
+        position = bisect.bisect_left(self.sorted_terms, token)
+        while position < len(self.sorted_terms) and self.sorted_terms[position].startswith(token):
+            term = self.sorted_terms[position]
+            yield term, self.postings[term]
+            position += 1
+
+    def iter_fuzzy(self, token):
+        """Termes proches de token (trigrammes communs), avec leur similarité"""
+        query_grams = gram_hashes(token)
+        candidates = set()
+        for gram in query_grams:
+            candidates.update(self.grams.get(gram, ()))
+        for term in candidates:
+            similarity = _similarity(query_grams, term)
+            if similarity >= MIN_SIMILARITY:
+                yield term, similarity, self.postings[term]
+
+def write_snapshot(path, docs, postings):
+    """
+    Écrit un snapshot binaire de l'index
+
+    Args:
+        path (str): Fichier de destination (remplacé de manière atomique)
+        docs (list): Documents (userId, name, email), indexés par leur position
+        postings (dict): terme -> array('I') de (position du document << 1 | champ)
+    """
+    terms = sorted(postings)
+    grams = sorted(
+        (gram, term_index)
+        for term_index, term in enumerate(terms)
+        for gram in gram_hashes(term)
+    )
+
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(b'\0' * HEADER.size)
+
+        docs_blob = bytearray()
+        docs_index = bytearray()
+        for doc in docs:
+            encoded = DOC_SEPARATOR.join(field.replace(DOC_SEPARATOR, ' ') for field in doc).encode('utf-8')
+            docs_index += DOC_ENTRY.pack(len(docs_blob), len(encoded))
+            docs_blob += encoded
+
+        terms_blob = bytearray()
+        terms_index = bytearray()
+        postings_count = 0
+        for term in terms:
+            encoded = term.encode('utf-8')
+            entries = postings[term]
+            terms_index += TERM_ENTRY.pack(len(terms_blob), len(encoded), postings_count, len(entries))
+            terms_blob += encoded
+            postings_count += len(entries)
+
+        offsets = []
+        for section in (docs_index, docs_blob, terms_index, terms_blob):
+            offsets.append(f.tell())
+            f.write(section)
+
+        offsets.append(f.tell())
+        for term in terms:
+            postings[term].tofile(f)
+
+        offsets.append(f.tell())
+        for gram, term_index in grams:
+            f.write(GRAM_ENTRY.pack(gram, term_index))
+
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, len(docs), len(terms), len(grams), postings_count, *offsets))
+
+    os.replace(tmp_path, path)
+
+class SnapshotIndex:
+    """Index en lecture seule projeté en mémoire (mmap) depuis un snapshot"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        (magic, self.n_docs, self.n_terms, self.n_grams, _,
+         self._docs_index, self._docs_blob, self._terms_index,
+         self._terms_blob, self._postings, self._grams) = HEADER.unpack_from(self._mm, 0)
+
+        if magic != MAGIC:
+            self._mm.close()
+            raise ValueError(f'{path} is not a user search snapshot')
+
+    def __len__(self):
+        return self.n_docs
+
+    def close(self):
+        self._mm.close()
+
+    def get_doc(self, key):
+        offset, length = DOC_ENTRY.unpack_from(self._mm, self._docs_index + key * DOC_ENTRY.size)
+        start = self._docs_blob + offset
+        return tuple(self._mm[start:start + length].decode('utf-8').split(DOC_SEPARATOR))
+
+    def _term_entry(self, index):
+        return TERM_ENTRY.unpack_from(self._mm, self._terms_index + index * TERM_ENTRY.size)
+
+    def _term_bytes(self, index):
+        offset, length, _, _ = self._term_entry(index)
+        start = self._terms_blob + offset
+        return self._mm[start:start + length]
+
+    def _term_postings(self, index):
+        _, _, offset, count = self._term_entry(index)
+        postings = array('I')
+        start = self._postings + offset * postings.itemsize
+        postings.frombytes(self._mm[start:start + count * postings.itemsize])
+        return [(entry >> 1, entry & 1) for entry in postings]
+
+    def iter_prefix(self, token):
+        prefix = token.encode('utf-8')
+        low, high = 0, self.n_terms
+        while low < high:
+            middle = (low + high) // 2
+            if self._term_bytes(middle) < prefix:
+                low = middle + 1
+            else:
+                high = middle
+
+        while low < self.n_terms:
+            term = self._term_bytes(low)
+            if not term.startswith(prefix):
+                return
+            yield term.decode('utf-8'), self._term_postings(low)
+            low += 1
+
+    def _gram_terms(self, gram):
+        low, high = 0, self.n_grams
+        while low < high:
+            middle = (low + high) // 2
+            if GRAM_ENTRY.unpack_from(self._mm, self._grams + middle * GRAM_ENTRY.size)[0] < gram:
+                low = middle + 1
+            else:
+                high = middle
+
+        while low < self.n_grams:
+            found, term_index = GRAM_ENTRY.unpack_from(self._mm, self._grams + low * GRAM_ENTRY.size)
+            if found != gram:
+                return
+            yield term_index
+            low += 1
+
+    def iter_fuzzy(self, token):
+        query_grams = gram_hashes(token)
+        candidates = set()
+        for gram in query_grams:
+            candidates.update(self._gram_terms(gram))
+        for term_index in candidates:
+            term = self._term_bytes(term_index).decode('utf-8')
+            similarity = _similarity(query_grams, term)
+            if similarity >= MIN_SIMILARITY:
+                yield term, similarity, self._term_postings(term_index)
+
+def build_snapshot(path, pages=None):
+    """
+    Construit un snapshot à partir d'un scan en flux de la table
+
+    Les postings sont stockés dans des array('I') compacts pendant la construction.
+
+    Args:
+        path (str): Fichier de destination
+        pages: Pages (éléments, clé) à indexer (par défaut scan_users())
+
+    La date de modification du fichier est fixée au début du scan : les
+    modifications postérieures ne sont pas garanties d'y figurer.
+
+    Returns:
+        int: Nombre d'utilisateurs indexés
+    """
+    started = time.time()
+    docs = []
+    postings = {}
+
+    for items, _ in (pages if pages is not None else scan_users()):
+        for item in items:
+            user_id = item.get('userId')
+            if not user_id:
+                continue
+            name = str(item.get('name') or '')
+            email = str(item.get('email') or '')
+            position = len(docs)
+            docs.append((str(user_id), name, email))
+            for term, field in user_terms(name, email):
+                postings.setdefault(term, array('I')).append(position << 1 | field)
+
+    write_snapshot(path, docs, postings)
+    os.utime(path, (started, started))
+    return len(docs)
+
+def parse_s3_url(url):
+    """Découpe s3://bucket/clé en (bucket, clé)"""
+    bucket, _, key = url[len('s3://'):].partition('/')
+    if not url.startswith('s3://') or not bucket or not key:
+        raise ValueError(f'Invalid S3 URL: {url!r}')
+    return bucket, key
+
+def upload_snapshot(path, url):
+    """Dépose un snapshot sur S3 avec sa date de construction"""
+    bucket, key = parse_s3_url(url)
+    boto3.client('s3').upload_file(path, bucket, key, ExtraArgs={
+        'Metadata': {BUILT_AT_METADATA: repr(os.stat(path).st_mtime)}
+    })
+
+class SnapshotLoader:
+    """
+    Charge le snapshot construit hors ligne, puis le recharge quand il change
+
+    Args:
+        path (str): Fichier du snapshot (couche Lambda, EFS), ou destination
+                    du téléchargement si url est donnée
+        url (str): s3://bucket/clé du snapshot (optionnel)
+        refresh_interval (float): Secondes entre deux vérifications
+    """
+
+    def __init__(self, path, url=None, refresh_interval=REFRESH_INTERVAL, clock=time.monotonic):
+        self.path = path
+        self.url = url
+        self.refresh_interval = refresh_interval
+        self.clock = clock
+        self.version = None
+        self._checked = None
+
+    def due(self):
+        """Indique si une vérification est à faire"""
+        return self._checked is None or self.clock() - self._checked >= self.refresh_interval
+
+    def _fetch(self):
+        """Télécharge l'objet S3 s'il a changé ; retourne (version, construit le)"""
+        bucket, key = parse_s3_url(self.url)
+        s3 = boto3.client('s3')
+        head = s3.head_object(Bucket=bucket, Key=key)
+        version = head['ETag']
+        built_at = float(head.get('Metadata', {}).get(BUILT_AT_METADATA) or head['LastModified'].timestamp())
+        if version != self.version:
+            partial = self.path + '.part'
+            s3.download_file(bucket, key, partial)
+            os.replace(partial, self.path)
+        return version, built_at
+
+    def load(self):
+        """
+        Charge le snapshot s'il est nouveau
+
+        Returns:
+            tuple: (SnapshotIndex, date de construction), ou None s'il est
+                   inchangé ou indisponible
+        """
+        self._checked = self.clock()
+        try:
+            if self.url:
+                version, built_at = self._fetch()
+            else:
+                version = built_at = os.stat(self.path).st_mtime
+            if version == self.version:
+                return None
+            snapshot = SnapshotIndex(self.path)
+        except (OSError, ValueError, ClientError, BotoCoreError) as e:
+            print(f'User search snapshot unavailable: {str(e)}')
+            return None
+
+        self.version = version
+        print(f'Loaded user search snapshot {self.url or self.path} with {len(snapshot)} users')
+        return snapshot, built_at
+
+class UserSearchIndex:
+    """
+    Index de recherche complet : snapshot (mmap) + modifications en mémoire
+
+    Un utilisateur modifié ou supprimé après le snapshot y est masqué, sa
+    nouvelle version étant portée par l'index en mémoire.
+    """
+
+    def __init__(self, snapshot=None, clock=time.time):
+        self.snapshot = snapshot
+        self.delta = MemoryIndex()
+        self.hidden = set()
+        self.clock = clock
+        self._changed_at = {}
+        self._lock = threading.Lock()
+
+    def on_user_changes(self, changes):
+        """Abonné user_events : applique les modifications à l'index en mémoire"""
+        now = self.clock()
+        with self._lock:
+            for change in changes:
+                user_id = change['userId']
+                self.hidden.add(user_id)
+                self._changed_at[user_id] = now
+                image = change.get('newImage')
+                if image:
+                    self.delta.add(user_id, str(image.get('name') or ''), str(image.get('email') or ''))
+                else:
+                    self.delta.remove(user_id)
+
+    def replace_snapshot(self, snapshot, built_at):
+        """
+        Remplace le snapshot par une version plus récente
+
+        Les modifications antérieures au début de sa construction y figurent
+        déjà : elles sont retirées de l'index en mémoire.
+        """
+        with self._lock:
+            previous, self.snapshot = self.snapshot, snapshot
+            for user_id, changed_at in list(self._changed_at.items()):
+                if changed_at < built_at:
+                    del self._changed_at[user_id]
+                    self.hidden.discard(user_id)
+                    self.delta.remove(user_id)
+        if previous is not None:
+            previous.close()
+
+    def _collect(self, index, token, skip_hidden):
+        """Meilleur score de chaque document pour un mot de la requête"""
+        scores = {}
+        examined = 0
+
+        for term, postings in index.iter_prefix(token):
+            base = 1.0 if term == token else 0.6 + 0.4 * len(token) / len(term)
+            for key, field in postings:
+                score = base * FIELD_WEIGHTS[field]
+                if score > scores.get(key, 0.0):
+                    scores[key] = score
+            examined += len(postings)
+            if examined >= MAX_CANDIDATES:
+                break
+
+        if len(token) >= MIN_FUZZY_LENGTH:
+            for term, similarity, postings in index.iter_fuzzy(token):
+                if term.startswith(token):
+                    continue
+                for key, field in postings:
+                    score = 0.5 * similarity * FIELD_WEIGHTS[field]
+                    if score > scores.get(key, 0.0):
+                        scores[key] = score
+
+        docs = {}
+        for key, score in scores.items():
+            doc = index.get_doc(key)
+            if skip_hidden and doc[0] in self.hidden:
+                continue
+            docs[doc[0]] = (score, doc)
+        return docs
+
+    def search(self, query, limit=DEFAULT_LIMIT):
+        """
+        Recherche les utilisateurs correspondant à tous les mots de la requête
+
+        Args:
+            query (str): Texte recherché (préfixe, mots du nom ou de l'email)
+            limit (int): Nombre maximal de résultats
+
+        Returns:
+            list: Résultats triés par score décroissant (userId, name, email, score)
+        """
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+
+        with self._lock:
+            totals = None
+            for token in tokens:
+                matches = self._collect(self.delta, token, skip_hidden=False)
+                if self.snapshot is not None:
+                    for user_id, match in self._collect(self.snapshot, token, skip_hidden=True).items():
+                        matches.setdefault(user_id, match)
+
+                if totals is None:
+                    totals = matches
+                else:
+                    totals = {
+                        user_id: (score + matches[user_id][0], doc)
+                        for user_id, (score, doc) in totals.items()
+                        if user_id in matches
+                    }
+                if not totals:
+                    return []
+
+        best = heapq.nsmallest(limit, totals.values(), key=lambda match: (-match[0], match[1][1], match[1][0]))
+        return [
+            {'userId': doc[0], 'name': doc[1], 'email': doc[2], 'score': round(score, 4)}
+            for score, doc in best
+        ]
+
+_index = None
+_loader = None
+_index_lock = threading.Lock()
+_refresh_lock = threading.Lock()
+
+def refresh_search_index(index, loader):
+    """
+    Recharge le snapshot s'il a changé (un seul rechargement à la fois)
+
+    Returns:
+        bool: True si un nouveau snapshot a été chargé
+    """
+    if not _refresh_lock.acquire(blocking=False):
+        return False
+    try:
+        loaded = loader.load()
+        if loaded is None:
+            return False
+        index.replace_snapshot(*loaded)
+        return True
+    finally:
+        _refresh_lock.release()
+
+def get_search_index():
+    """
+    Retourne l'index du conteneur, chargé au premier appel
+
+    Le snapshot (SNAPSHOT_URL, sinon SNAPSHOT_PATH) est projeté en mémoire
+    s'il existe, puis revérifié toutes les REFRESH_INTERVAL secondes. S'il
+    n'existe pas, l'index ne contient que les modifications reçues.
+    """
+    global _index, _loader
+
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                loader = SnapshotLoader(DOWNLOAD_PATH if SNAPSHOT_URL else SNAPSHOT_PATH, SNAPSHOT_URL)
+                index = UserSearchIndex()
+                subscribe(index.on_user_changes)
+                refresh_search_index(index, loader)
+                _loader = loader
+                _index = index
+    elif _loader.due():
+        refresh_search_index(_index, _loader)
+    return _index
+
+def search_users(query, limit=DEFAULT_LIMIT):
+    """
+    Recherche des utilisateurs par nom ou email
+
+    Args:
+        query (str): Texte recherché
+        limit (int): Nombre maximal de résultats (plafonné à MAX_LIMIT)
+
+    Returns:
+        dict: Résultat avec success (bool) et results/error
+    """
+    if not query or not query.strip():
+        return {
+            'success': False,
+            'error': 'Query parameter q is required'
+        }
+
+    try:
+        results = get_search_index().search(query, max(1, min(limit, MAX_LIMIT)))
+        return {
+            'success': True,
+            'results': results
+        }
+    except Exception as e:
+        return {
+            'success': False,
+            'error': f'Unexpected error: {str(e)}'
+        }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Build or query the user search snapshot')
+    commands = parser.add_subparsers(dest='command', required=True)
+    build = commands.add_parser('build', help='Scan the table and write a snapshot (file or s3:// URL)')
+    build.add_argument('path')
+    query = commands.add_parser('query', help='Query an existing snapshot')
+    query.add_argument('path')
+    query.add_argument('q')
+    query.add_argument('--limit', type=int, default=DEFAULT_LIMIT)
+    args = parser.parse_args(argv)
+
+    if args.command == 'build' and args.path.startswith('s3://'):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'user-search.idx')
+            count = build_snapshot(path)
+            upload_snapshot(path, args.path)
+        print(f'Indexed {count} users into {args.path}')
+    elif args.command == 'build':
+        print(f'Indexed {build_snapshot(args.path)} users into {args.path}')
+    else:
+        for result in UserSearchIndex(SnapshotIndex(args.path)).search(args.q, args.limit):
+            print(f'{result["score"]:.3f}  {result["userId"]}  {result["name"]} <{result["email"]}>')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,16 +1,109 @@
 import boto3
 import os
+import threading
+import time
+from datetime import datetime, timezone
 from botocore.exceptions import ClientError
+from dynamodb_client import ClientDynamoDB, ClientUserTable
+from local_table import LocalDynamoDB, LocalUserTable
+from shared_cache import MISSING, get_shared_cache
+from user_cache import cache
+from user_events import publish, user_change
+from user_model import User
 
 # Configuration de DynamoDB
 TABLE_NAME = os.environ.get('STORAGE_SITEUSERTABLE_NAME', 'siteUserTable')
 
+# Moteur d'accès : 'resource' (boto3 resource) ou 'client' (client bas niveau,
+# sérialisation spécialisée, types Python simples au lieu de Decimal) ou
+# 'local' (table en mémoire pour les essais locaux)
+DB_ENGINE = os.environ.get('USER_DB_ENGINE', 'resource')
+
+# Champs obligatoires d'un utilisateur
+REQUIRED_FIELDS = ['userId', 'name', 'email']
+
+# Limite imposée par DynamoDB pour BatchWriteItem
+BATCH_WRITE_SIZE = 25
+BATCH_WRITE_MAX_RETRIES = 5
+
+# Limite imposée par DynamoDB pour BatchGetItem
+BATCH_GET_SIZE = 100
+
+# Session et table boto3 propres à chaque thread (serveur local multi-thread)
+_thread_state = threading.local()
+
 def get_dynamodb_table():
     """
     Retourne la table DynamoDB. Crée la connexion à la demande.
+
+    Les ressources boto3 ne sont pas thread-safe : chaque thread reçoit sa
+    table, issue de sa propre session, créée à son premier appel puis
+    réutilisée (invocations suivantes d'un conteneur chaud comprises).
+    """
+    if DB_ENGINE == 'client':
+        return ClientUserTable(TABLE_NAME)
+    if DB_ENGINE == 'local':
+        return LocalUserTable(TABLE_NAME)
+    table = getattr(_thread_state, 'table', None)
+    if table is None or table.name != TABLE_NAME:
+        table = _thread_state.table = boto3.session.Session().resource('dynamodb').Table(TABLE_NAME)
+    return table
+
+def get_dynamodb_resource():
+    """
+    Retourne une ressource DynamoDB issue d'une session dédiée.
+
+    Les ressources boto3 ne sont pas thread-safe : chaque thread d'écriture
+    doit appeler cette fonction pour obtenir sa propre ressource. Le client
+    bas niveau, lui, est thread-safe et partagé.
+    """
+    if DB_ENGINE == 'client':
+        return ClientDynamoDB()
+    if DB_ENGINE == 'local':
+        return LocalDynamoDB()
+    return boto3.session.Session().resource('dynamodb')
+
+def stamp_user(user_data, version=1):
+    """
+    Retourne une copie de l'utilisateur avec sa version et sa date de mise à jour
+
+    Args:
+        user_data (dict): Données de l'utilisateur
+        version (int): Version de l'écriture (1 pour une création)
+
+    Returns:
+        dict: Données avec version et updatedAt (ISO 8601 UTC)
     """
-    dynamodb = boto3.resource('dynamodb')
-    return dynamodb.Table(TABLE_NAME)
+    stamped = dict(user_data)
+    stamped['version'] = version
+    stamped['updatedAt'] = datetime.now(timezone.utc).isoformat(timespec='milliseconds')
+    return stamped
+
+def validate_user(user_data):
+    """
+    Vérifie qu'un utilisateur contient les champs requis, en chaînes
+
+    Args:
+        user_data (dict): Données de l'utilisateur
+
+    Returns:
+        str: Message d'erreur, ou None si les données sont valides
+    """
+    if not isinstance(user_data, dict):
+        return 'User data must be a JSON object'
+
+    missing_fields = [field for field in REQUIRED_FIELDS if not user_data.get(field)]
+
+    if missing_fields:
+        return f'Missing required fields: {", ".join(missing_fields)}'
+
+    # Un userId liste ou objet ne peut servir de clé (ni en base, ni dans un dict)
+    invalid_fields = [field for field in REQUIRED_FIELDS if not isinstance(user_data[field], str)]
+
+    if invalid_fields:
+        return f'Invalid required fields (strings expected): {", ".join(invalid_fields)}'
+
+    return None
 
 def add_user(user_data):
     """
@@ -23,34 +116,39 @@ def add_user(user_data):
         dict: Résultat de l'opération avec success (bool) et message/error
     """
     # Vérifier les champs requis
-    required_fields = ['userId', 'name', 'email']
-    missing_fields = [field for field in required_fields if not user_data.get(field)]
+    error = validate_user(user_data)
     
-    if missing_fields:
+    if error:
         return {
             'success': False,
-            'error': f'Missing required fields: {", ".join(missing_fields)}'
+            'error': error
         }
     
     try:
         table = get_dynamodb_table()
         
+        user = User.from_item(stamp_user(user_data))
+        
         # Vérifier si l'utilisateur existe déjà
-        response = table.get_item(Key={'userId': user_data['userId']})
+        response = table.get_item(Key={'userId': user.user_id})
         
         if 'Item' in response:
             return {
                 'success': False,
-                'error': f'User with ID {user_data["userId"]} already exists'
+                'error': f'User with ID {user.user_id} already exists'
             }
         
         # Ajouter l'utilisateur
-        table.put_item(Item=user_data)
+        item = user.to_item()
+        table.put_item(Item=item)
+        
+        # Prévenir les abonnés (cache, index, compteurs)
+        publish([user_change('INSERT', user.user_id, item)])
         
         return {
             'success': True,
             'message': 'User created successfully',
-            'userId': user_data['userId']
+            'userId': user.user_id
         }
         
     except ClientError as e:
@@ -64,6 +162,20 @@ def add_user(user_data):
             'error': f'Unexpected error: {str(e)}'
         }
 
+def read_user(user_id):
+    """
+    Lit un utilisateur directement dans DynamoDB (sans cache)
+
+    Returns:
+        User: L'utilisateur, ou None s'il n'existe pas
+    """
+    table = get_dynamodb_table()
+    response = table.get_item(Key={'userId': user_id})
+    
+    if 'Item' not in response:
+        return None
+    return User.from_item(response['Item'])
+
 def get_user(user_id):
     """
     Récupère un utilisateur depuis DynamoDB
@@ -72,7 +184,7 @@ def get_user(user_id):
         user_id (str): ID de l'utilisateur à récupérer
         
     Returns:
-        dict: Résultat de l'opération avec success (bool) et user/error
+        dict: Résultat de l'opération avec success (bool) et user (User)/error
     """
     if not user_id:
         return {
@@ -80,19 +192,33 @@ def get_user(user_id):
             'error': 'UserId is required'
         }
     
+    # Cache local du conteneur (si activé)
+    cached = cache.get(user_id)
+    if cached is not None:
+        return {
+            'success': True,
+            'user': cached
+        }
+    
     try:
-        table = get_dynamodb_table()
-        response = table.get_item(Key={'userId': user_id})
+        # Cache partagé entre conteneurs (si configuré), puis DynamoDB
+        shared = get_shared_cache()
+        if shared is not None:
+            user = shared.load(user_id, read_user)
+        else:
+            user = read_user(user_id)
         
-        if 'Item' not in response:
+        if user is None:
             return {
                 'success': False,
                 'error': f'User with ID {user_id} not found'
             }
         
+        cache.set(user_id, user)
+        
         return {
             'success': True,
-            'user': response['Item']
+            'user': user
         }
         
     except ClientError as e:
@@ -104,4 +230,254 @@ def get_user(user_id):
         return {
             'success': False,
             'error': f'Unexpected error: {str(e)}'
-        } 
\ No newline at end of file
+        }
+
+def batch_write_users(users, dynamodb=None, change_type='MODIFY'):
+    """
+    Écrit un lot d'utilisateurs avec BatchWriteItem (écrasement sans vérification d'existence)
+
+    Les utilisateurs sont envoyés par paquets de 25 ; les éléments non traités
+    (throttling) sont renvoyés avec un backoff exponentiel. Un userId répété
+    dans un même paquet n'y est écrit qu'une fois (le dernier l'emporte),
+    DynamoDB refusant les clés en double dans un BatchWriteItem. Les éléments sans
+    updatedAt reçoivent une version (1 par défaut) et une date de mise à jour ;
+    ceux qui en ont une (restauration d'un export) sont écrits tels quels.
+
+    Les éléments écrits sont publiés à user_events après chaque paquet (caches
+    et index de recherche). Sans lecture préalable, un écrasement ne distingue
+    pas création et modification : il est publié comme change_type.
+
+    Args:
+        users (list): Utilisateurs déjà validés
+        dynamodb: Ressource DynamoDB à utiliser (par défaut get_dynamodb_resource())
+        change_type (str): Type des modifications publiées ('MODIFY' par défaut)
+
+    Returns:
+        dict: Résultat avec success (bool), written (int), consumedCapacity (float)
+              et unprocessed (list) ou error
+    """
+    written = 0
+    consumed_capacity = 0.0
+    unprocessed = []
+
+    try:
+        if dynamodb is None:
+            dynamodb = get_dynamodb_resource()
+
+        for start in range(0, len(users), BATCH_WRITE_SIZE):
+            chunk = {user['userId']: user for user in users[start:start + BATCH_WRITE_SIZE]}
+            items = [user if 'updatedAt' in user else stamp_user(user, user.get('version', 1)) for user in chunk.values()]
+            requests = [{'PutRequest': {'Item': item}} for item in items]
+            attempt = 0
+
+            while requests:
+                response = dynamodb.batch_write_item(
+                    RequestItems={TABLE_NAME: requests},
+                    ReturnConsumedCapacity='TOTAL'
+                )
+                for capacity in response.get('ConsumedCapacity', []):
+                    consumed_capacity += capacity.get('CapacityUnits', 0)
+
+                remaining = response.get('UnprocessedItems', {}).get(TABLE_NAME, [])
+                written += len(requests) - len(remaining)
+                requests = remaining
+
+                if requests:
+                    attempt += 1
+                    if attempt > BATCH_WRITE_MAX_RETRIES:
+                        unprocessed.extend(r['PutRequest']['Item'] for r in requests)
+                        break
+                    time.sleep(min(0.05 * (2 ** attempt), 2.0))
+
+            failed_ids = {r['PutRequest']['Item']['userId'] for r in requests}
+            publish([user_change(change_type, item['userId'], item) for item in items if item['userId'] not in failed_ids])
+
+        return {
+            'success': not unprocessed,
+            'written': written,
+            'consumedCapacity': consumed_capacity,
+            'unprocessed': unprocessed
+        }
+
+    except ClientError as e:
+        return {
+            'success': False,
+            'written': written,
+            'consumedCapacity': consumed_capacity,
+            'error': f'Database error: {str(e)}'
+        }
+    except Exception as e:
+        return {
+            'success': False,
+            'written': written,
+            'consumedCapacity': consumed_capacity,
+            'error': f'Unexpected error: {str(e)}'
+        }
+
+def get_users(user_ids, dynamodb=None):
+    """
+    Récupère plusieurs utilisateurs avec BatchGetItem
+
+    Args:
+        user_ids (list): IDs des utilisateurs à récupérer
+        dynamodb: Ressource DynamoDB à utiliser (par défaut get_dynamodb_resource())
+
+    Returns:
+        dict: Résultat avec success (bool) et users (dict userId -> User,
+              les utilisateurs absents n'y figurent pas) ou error
+    """
+    users = {}
+    user_ids = [user_id for user_id in dict.fromkeys(user_ids) if user_id]
+
+    try:
+        # Lecture groupée dans le cache partagé (un seul aller-retour)
+        shared = get_shared_cache()
+        if shared is not None:
+            cached = shared.get_many(user_ids)
+            users = {user_id: user for user_id, user in cached.items() if user is not MISSING}
+            user_ids = [user_id for user_id in user_ids if user_id not in cached]
+
+        keys = [{'userId': user_id} for user_id in user_ids]
+
+        if keys and dynamodb is None:
+            dynamodb = get_dynamodb_resource()
+
+        for start in range(0, len(keys), BATCH_GET_SIZE):
+            request = {TABLE_NAME: {'Keys': keys[start:start + BATCH_GET_SIZE]}}
+            attempt = 0
+
+            while request:
+                response = dynamodb.batch_get_item(RequestItems=request)
+                for item in response.get('Responses', {}).get(TABLE_NAME, []):
+                    users[item['userId']] = User.from_item(item)
+
+                request = response.get('UnprocessedKeys') or None
+                if request:
+                    attempt += 1
+                    if attempt > BATCH_WRITE_MAX_RETRIES:
+                        return {
+                            'success': False,
+                            'error': 'Database error: unprocessed keys after retries'
+                        }
+                    time.sleep(min(0.05 * (2 ** attempt), 2.0))
+
+        if shared is not None and user_ids:
+            shared.set_many({user_id: users.get(user_id, MISSING) for user_id in user_ids})
+
+        return {
+            'success': True,
+            'users': users
+        }
+
+    except ClientError as e:
+        return {
+            'success': False,
+            'error': f'Database error: {str(e)}'
+        }
+    except Exception as e:
+        return {
+            'success': False,
+            'error': f'Unexpected error: {str(e)}'
+        }
+
+def add_users(users_data, dynamodb=None):
+    """
+    Ajoute plusieurs utilisateurs avec la même logique que add_user,
+    mais en regroupant les lectures et les écritures par paquets
+
+    Args:
+        users_data (list): Données des utilisateurs
+        dynamodb: Ressource DynamoDB à utiliser (par défaut get_dynamodb_resource())
+
+    Returns:
+        list: Un résultat par utilisateur, dans l'ordre d'entrée, avec success (bool),
+              message/error et retryable (bool) pour les erreurs transitoires
+    """
+    results = [None] * len(users_data)
+    pending = {}
+
+    # Validation et dédoublonnage à l'intérieur du lot
+    for position, user_data in enumerate(users_data):
+        error = validate_user(user_data)
+        if not error and user_data['userId'] in pending:
+            error = f'User with ID {user_data["userId"]} already exists'
+        if error:
+            results[position] = {'success': False, 'error': error, 'retryable': False}
+        else:
+            pending[user_data['userId']] = position
+
+    if not pending:
+        return results
+
+    if dynamodb is None:
+        dynamodb = get_dynamodb_resource()
+
+    existing = get_users(list(pending), dynamodb)
+    if not existing['success']:
+        for position in pending.values():
+            results[position] = {'success': False, 'error': existing['error'], 'retryable': True}
+        return results
+
+    for user_id in existing['users']:
+        position = pending.pop(user_id)
+        results[position] = {
+            'success': False,
+            'error': f'User with ID {user_id} already exists',
+            'retryable': False
+        }
+
+    stamped = {user_id: stamp_user(users_data[position]) for user_id, position in pending.items()}
+    # batch_write_users publie les créations écrites
+    written = batch_write_users(list(stamped.values()), dynamodb, change_type='INSERT')
+    failed_ids = {user['userId'] for user in written.get('unprocessed', [])}
+
+    for user_id, position in pending.items():
+        if written['success'] or (user_id not in failed_ids and 'error' not in written):
+            results[position] = {
+                'success': True,
+                'message': 'User created successfully',
+                'userId': user_id
+            }
+        else:
+            results[position] = {
+                'success': False,
+                'error': written.get('error', 'Database error: unprocessed item after retries'),
+                'retryable': True
+            }
+
+    return results
+
+def scan_users(table=None, segment=None, total_segments=None, exclusive_start_key=None, page_size=None):
+    """
+    Parcourt la table page par page (Scan), éventuellement sur un seul segment
+
+    Args:
+        table: Table DynamoDB à utiliser (par défaut get_dynamodb_table())
+        segment (int): Numéro du segment pour un scan parallèle
+        total_segments (int): Nombre total de segments
+        exclusive_start_key (dict): Clé de reprise (LastEvaluatedKey d'une page précédente)
+        page_size (int): Nombre maximal d'éléments lus par page
+
+    Yields:
+        tuple: (éléments de la page, LastEvaluatedKey ou None pour la dernière page)
+    """
+    if table is None:
+        table = get_dynamodb_table()
+
+    kwargs = {}
+    if total_segments:
+        kwargs['Segment'] = segment
+        kwargs['TotalSegments'] = total_segments
+    if page_size:
+        kwargs['Limit'] = page_size
+    if exclusive_start_key:
+        kwargs['ExclusiveStartKey'] = exclusive_start_key
+
+    while True:
+        response = table.scan(**kwargs)
+        last_key = response.get('LastEvaluatedKey')
+        yield response.get('Items', []), last_key
+
+        if not last_key:
+            return
+        kwargs['ExclusiveStartKey'] = last_key
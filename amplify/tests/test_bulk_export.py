@@ -0,0 +1,83 @@
+import gzip
+import json
+import os
+import sys
+from decimal import Decimal
+from unittest.mock import Mock, patch
+
+# Ajouter le répertoire src au PYTHONPATH
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../backend/function/siteUserHandler/src'))
+
+from bulk_export import Manifest, export_users
+
+def make_table(pages_by_segment):
+    """Crée une table mockée dont le scan renvoie des pages par segment"""
+    def scan(**kwargs):
+        pages = pages_by_segment[kwargs['Segment']]
+        index = kwargs.get('ExclusiveStartKey', {}).get('page', 0)
+        response = {'Items': pages[index]}
+        if index + 1 < len(pages):
+            response['LastEvaluatedKey'] = {'page': index + 1}
+        return response
+
+    table = Mock()
+    table.scan.side_effect = scan
+    return table
+
+def read_ndjson_gz(path):
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        return [json.loads(line) for line in f]
+
+class TestBulkExport:
+    """Tests pour l'export en masse"""
+
+    def test_export_writes_parts_and_manifest(self, tmp_path):
+        """Chaque segment est écrit en NDJSON gzip et compté dans le manifeste"""
+        table = make_table({
+            0: [[{'userId': 'u1', 'name': 'A', 'email': 'a@x.com', 'age': Decimal('42')}]],
+            1: [[{'userId': 'u2', 'name': 'B', 'email': 'b@x.com'}], [{'userId': 'u3', 'name': 'C', 'email': 'c@x.com'}]]
+        })
+
+        with patch('bulk_export.get_dynamodb_resource') as mock_resource:
+            mock_resource.return_value.Table.return_value = table
+            result = export_users(str(tmp_path), total_segments=2, max_bytes=1)
+
+        assert result['success'] is True
+        assert result['rows'] == 3
+
+        manifest = json.loads((tmp_path / 'manifest.json').read_text())
+        assert manifest['segments']['0']['status'] == 'done'
+        # max_bytes=1 : rotation après chaque page
+        assert [p['rows'] for p in manifest['segments']['1']['parts']] == [1, 1]
+
+        rows = read_ndjson_gz(tmp_path / manifest['segments']['0']['parts'][0]['file'])
+        assert rows == [{'userId': 'u1', 'name': 'A', 'email': 'a@x.com', 'age': 42}]
+
+    def test_export_resumes_unfinished_segments(self, tmp_path):
+        """Un segment terminé n'est pas relu, un segment inachevé reprend à sa clé"""
+        manifest = Manifest(str(tmp_path), 2, 'ndjson', 'gzip')
+        manifest.segment(0)
+        manifest.add_part(0, {'file': 'segment-0000-part-00000.ndjson.gz', 'rows': 5, 'bytes': 10}, None)
+        manifest.segment(1)
+        manifest.add_part(1, {'file': 'segment-0001-part-00000.ndjson.gz', 'rows': 1, 'bytes': 10}, {'page': 1})
+        (tmp_path / 'segment-0001-part-00001.ndjson.gz').write_bytes(b'partial')
+
+        table = make_table({1: [[{'userId': 'u2'}], [{'userId': 'u3'}]]})
+        with patch('bulk_export.get_dynamodb_resource') as mock_resource:
+            mock_resource.return_value.Table.return_value = table
+            result = export_users(str(tmp_path), total_segments=2)
+
+        assert result['rows'] == 7
+        table.scan.assert_called_once_with(Segment=1, TotalSegments=2, ExclusiveStartKey={'page': 1})
+        assert read_ndjson_gz(tmp_path / 'segment-0001-part-00001.ndjson.gz') == [{'userId': 'u3'}]
+
+    def test_export_rejects_mismatched_manifest(self, tmp_path):
+        """Un manifeste existant avec d'autres paramètres n'est pas écrasé"""
+        manifest = Manifest(str(tmp_path), 4, 'ndjson', 'gzip')
+        manifest.segment(0)
+        manifest.add_part(0, {'file': 'f', 'rows': 0, 'bytes': 0}, None)
+
+        result = export_users(str(tmp_path), total_segments=2)
+
+        assert result['success'] is False
+        assert 'totalSegments' in result['errors'][0]
@@ -0,0 +1,196 @@
+import io
+import json
+import os
+import sys
+import threading
+from unittest.mock import Mock, patch
+
+from botocore.exceptions import NoRegionError
+
+# Ajouter le répertoire src au PYTHONPATH
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../backend/function/siteUserHandler/src'))
+
+from bulk_import import Checkpoint, import_users
+from user_cache import cache
+from user_events import subscribe, unsubscribe
+from user_service import TABLE_NAME, batch_write_users
+
+def write_lines(path, lines):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('\n'.join(lines) + '\n')
+
+def fake_batch_write(users, dynamodb=None):
+    return {'success': True, 'written': len(users), 'consumedCapacity': float(len(users)), 'unprocessed': []}
+
+class TestBatchWriteUsers:
+    """Tests pour l'écriture par paquets"""
+
+    @patch('user_service.time.sleep')
+    def test_batch_write_retries_unprocessed_items(self, mock_sleep):
+        """Les éléments non traités sont renvoyés jusqu'à acceptation"""
+        users = [{'userId': f'u{i}', 'name': 'N', 'email': 'e@x.com'} for i in range(30)]
+        leftover = [{'PutRequest': {'Item': users[0]}}]
+        dynamodb = Mock()
+        dynamodb.batch_write_item.side_effect = [
+            {'UnprocessedItems': {TABLE_NAME: leftover}, 'ConsumedCapacity': [{'CapacityUnits': 24.0}]},
+            {'UnprocessedItems': {}, 'ConsumedCapacity': [{'CapacityUnits': 1.0}]},
+            {'UnprocessedItems': {}, 'ConsumedCapacity': [{'CapacityUnits': 5.0}]}
+        ]
+
+        result = batch_write_users(users, dynamodb)
+
+        assert result['success'] is True
+        assert result['written'] == 30
+        assert result['consumedCapacity'] == 30.0
+        assert dynamodb.batch_write_item.call_count == 3
+        assert len(dynamodb.batch_write_item.call_args_list[0].kwargs['RequestItems'][TABLE_NAME]) == 25
+
+    def test_batch_write_invalidates_cached_users(self):
+        """Un écrasement en masse invalide les caches et publie les éléments écrits"""
+        received = []
+        subscribe(received.extend)
+        cache.ttl = 60
+        cache.set('u1', {'userId': 'u1', 'name': 'Stale'})
+        dynamodb = Mock()
+        dynamodb.batch_write_item.side_effect = [
+            {'UnprocessedItems': {TABLE_NAME: [{'PutRequest': {'Item': {'userId': 'u2'}}}]}},
+            {'UnprocessedItems': {}}
+        ]
+        try:
+            with patch('user_service.time.sleep'):
+                result = batch_write_users([{'userId': 'u1', 'name': 'Alice'}, {'userId': 'u2', 'name': 'Bob'}], dynamodb)
+        finally:
+            unsubscribe(received.extend)
+            cache.ttl = 0
+            cache.clear()
+
+        assert result['success'] is True
+        assert cache.get('u1') is None
+        assert [(change['type'], change['userId']) for change in received] == [('MODIFY', 'u1'), ('MODIFY', 'u2')]
+        assert received[0]['newImage']['name'] == 'Alice'
+
+    def test_batch_write_sends_each_user_id_once(self):
+        """Un userId répété dans un paquet n'est écrit qu'une fois (le dernier)"""
+        users = [
+            {'userId': 'u1', 'name': 'Old', 'email': 'a@x.com'},
+            {'userId': 'u2', 'name': 'B', 'email': 'b@x.com'},
+            {'userId': 'u1', 'name': 'New', 'email': 'a@x.com'}
+        ]
+        dynamodb = Mock()
+        dynamodb.batch_write_item.return_value = {'UnprocessedItems': {}}
+
+        result = batch_write_users(users, dynamodb)
+
+        requests = dynamodb.batch_write_item.call_args.kwargs['RequestItems'][TABLE_NAME]
+        items = [request['PutRequest']['Item'] for request in requests]
+        assert [item['userId'] for item in items] == ['u1', 'u2']
+        assert items[0]['name'] == 'New'
+        assert result['written'] == 2
+
+class TestBulkImport:
+    """Tests pour l'import en masse"""
+
+    @patch('bulk_import.get_dynamodb_resource', Mock())
+    @patch('bulk_import.batch_write_users', side_effect=fake_batch_write)
+    def test_import_ndjson_with_rejects(self, mock_write, tmp_path):
+        """Les lignes invalides sont rejetées, les autres écrites"""
+        source = tmp_path / 'users.ndjson'
+        write_lines(source, [
+            json.dumps({'userId': 'u1', 'name': 'A', 'email': 'a@x.com'}),
+            '{not json',
+            json.dumps({'userId': 'u2', 'name': 'B'}),
+            json.dumps({'userId': 'u3', 'name': 'C', 'email': 'c@x.com'})
+        ])
+        rejects = tmp_path / 'rejects.ndjson'
+
+        result = import_users(str(source), workers=2, batch_size=1,
+                              checkpoint_path=str(tmp_path / 'ckpt'), reject_path=str(rejects))
+
+        assert result['success'] is True
+        assert result['written'] == 2
+        assert result['rejected'] == 2
+        assert result['offset'] == 4
+        assert len(rejects.read_text().splitlines()) == 2
+
+    @patch('bulk_import.get_dynamodb_resource', Mock())
+    @patch('bulk_import.batch_write_users', side_effect=fake_batch_write)
+    def test_import_csv_resumes_from_checkpoint(self, mock_write, tmp_path):
+        """Un import relancé reprend après les lignes déjà traitées"""
+        source = tmp_path / 'users.csv'
+        write_lines(source, ['userId,name,email', 'u1,A,a@x.com', 'u2,B,b@x.com', 'u3,C,c@x.com'])
+        checkpoint = Checkpoint(str(tmp_path / 'ckpt'), str(source))
+        checkpoint.complete(0, 2)
+        checkpoint.save()
+
+        result = import_users(str(source), workers=1, checkpoint_path=str(tmp_path / 'ckpt'))
+
+        assert result['written'] == 1
+        assert result['offset'] == 3
+        assert mock_write.call_args.args[0] == [{'userId': 'u3', 'name': 'C', 'email': 'c@x.com'}]
+
+    @patch('bulk_import.get_dynamodb_resource', Mock())
+    @patch('bulk_import.batch_write_users')
+    def test_import_stops_on_failed_batch(self, mock_write, tmp_path):
+        """Un paquet en échec arrête l'import sans avancer le point de reprise"""
+        mock_write.return_value = {'success': False, 'written': 0, 'consumedCapacity': 0.0, 'error': 'Database error: boom'}
+        source = tmp_path / 'users.ndjson'
+        write_lines(source, [json.dumps({'userId': 'u1', 'name': 'A', 'email': 'a@x.com'})])
+
+        result = import_users(str(source), workers=1, checkpoint_path=str(tmp_path / 'ckpt'))
+
+        assert result['success'] is False
+        assert result['offset'] == 0
+        assert result['failed'] == 1
+
+    @patch('bulk_import.get_dynamodb_resource', side_effect=NoRegionError())
+    def test_writer_setup_failure_stops_without_deadlock(self, mock_resource, tmp_path):
+        """Une ressource impossible à créer arrête l'import au lieu de bloquer le lecteur"""
+        source = tmp_path / 'users.ndjson'
+        write_lines(source, [json.dumps({'userId': f'u{n}', 'name': 'A', 'email': 'a@x.com'}) for n in range(50)])
+        results = []
+
+        thread = threading.Thread(target=lambda: results.append(
+            import_users(str(source), workers=2, batch_size=1, checkpoint_path=str(tmp_path / 'ckpt'), out=io.StringIO())
+        ), daemon=True)
+        thread.start()
+        thread.join(5)
+
+        assert not thread.is_alive()
+        [result] = results
+        assert result['success'] is False
+        assert result['offset'] == 0
+        assert 'Writer error' in result['errors'][0]
+
+    @patch('bulk_import.get_dynamodb_resource', Mock())
+    @patch('bulk_import.batch_write_users', side_effect=fake_batch_write)
+    def test_duplicate_ids_in_a_batch_keep_the_last_row(self, mock_write, tmp_path):
+        """Une ligne remplacée par une ligne suivante du même paquet est rejetée"""
+        source = tmp_path / 'users.ndjson'
+        write_lines(source, [
+            json.dumps({'userId': 'u1', 'name': 'Old', 'email': 'a@x.com'}),
+            json.dumps({'userId': 'u2', 'name': 'B', 'email': 'b@x.com'}),
+            json.dumps({'userId': 'u1', 'name': 'New', 'email': 'a@x.com'})
+        ])
+        rejects = tmp_path / 'rejects.ndjson'
+
+        result = import_users(str(source), workers=1, checkpoint_path=str(tmp_path / 'ckpt'), reject_path=str(rejects))
+
+        assert result['success'] is True
+        assert result['written'] == 2
+        assert result['rejected'] == 1
+        assert result['offset'] == 3
+        assert mock_write.call_args.args[0] == [
+            {'userId': 'u1', 'name': 'New', 'email': 'a@x.com'},
+            {'userId': 'u2', 'name': 'B', 'email': 'b@x.com'}
+        ]
+        assert 'superseded by row 2' in rejects.read_text()
+
+    def test_checkpoint_advances_only_on_contiguous_ranges(self, tmp_path):
+        """L'offset n'avance que sur le préfixe contigu de lignes terminées"""
+        checkpoint = Checkpoint(None, 'users.ndjson')
+
+        checkpoint.complete(25, 50)
+        assert checkpoint.offset == 0
+
+        checkpoint.complete(0, 25)
+        assert checkpoint.offset == 50
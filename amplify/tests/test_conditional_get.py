@@ -0,0 +1,83 @@
+import json
+import os
+import sys
+from unittest.mock import Mock, patch
+
+# Ajouter le répertoire src au PYTHONPATH
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../backend/function/siteUserHandler/src'))
+
+from index import handler
+from user_cache import cache
+from user_service import add_users
+
+ITEM = {'userId': 'u1', 'name': 'Alice', 'email': 'alice@example.com', 'version': 3, 'updatedAt': '2026-01-01T00:00:00.000+00:00'}
+
+def get_event(etag=None):
+    event = {'httpMethod': 'GET', 'path': '/user', 'queryStringParameters': {'userId': 'u1'}}
+    if etag:
+        event['headers'] = {'if-none-match': etag}
+    return event
+
+class TestConditionalGet:
+    """Tests pour GET /user conditionnel (ETag / 304)"""
+
+    def teardown_method(self):
+        cache.ttl = 0
+        cache.clear()
+
+    @patch('user_service.get_dynamodb_table')
+    def test_get_returns_etag_then_304(self, mock_get_table):
+        """Le client renvoie l'ETag reçu et obtient 304 sans corps"""
+        mock_table = Mock()
+        mock_table.get_item.return_value = {'Item': dict(ITEM)}
+        mock_get_table.return_value = mock_table
+
+        first = handler(get_event(), {})
+        etag = first['headers']['ETag']
+        second = handler(get_event(etag), {})
+
+        assert first['statusCode'] == 200
+        assert json.loads(first['body'])['version'] == 3
+        assert second['statusCode'] == 304
+        assert second['body'] == ''
+        assert second['headers']['ETag'] == etag
+
+    @patch('user_service.get_dynamodb_table')
+    def test_modified_user_returns_new_body(self, mock_get_table):
+        """Une nouvelle version de l'utilisateur change l'ETag"""
+        mock_table = Mock()
+        mock_table.get_item.return_value = {'Item': dict(ITEM)}
+        mock_get_table.return_value = mock_table
+        etag = handler(get_event(), {})['headers']['ETag']
+
+        mock_table.get_item.return_value = {'Item': dict(ITEM, version=4, name='Alicia')}
+        response = handler(get_event(etag), {})
+
+        assert response['statusCode'] == 200
+        assert response['headers']['ETag'] != etag
+
+    @patch('user_service.get_dynamodb_table')
+    def test_cached_user_answers_304_without_reading_dynamodb(self, mock_get_table):
+        """Avec le cache actif, la revalidation ne lit pas DynamoDB"""
+        cache.ttl = 60
+        mock_table = Mock()
+        mock_table.get_item.return_value = {'Item': dict(ITEM)}
+        mock_get_table.return_value = mock_table
+        etag = handler(get_event(), {})['headers']['ETag']
+
+        response = handler(get_event(f'"other", {etag}'), {})
+
+        assert response['statusCode'] == 304
+        mock_table.get_item.assert_called_once()
+
+    def test_batch_creation_stamps_version(self):
+        """Les créations par lots reçoivent version=1 et updatedAt"""
+        dynamodb = Mock()
+        dynamodb.batch_get_item.return_value = {'Responses': {}}
+        dynamodb.batch_write_item.return_value = {'UnprocessedItems': {}}
+
+        add_users([{'userId': 'u2', 'name': 'Bob', 'email': 'bob@example.com'}], dynamodb)
+
+        written = list(dynamodb.batch_write_item.call_args.kwargs['RequestItems'].values())[0][0]['PutRequest']['Item']
+        assert written['version'] == 1
+        assert written['updatedAt'].endswith('+00:00')
@@ -0,0 +1,87 @@
+import io
+import os
+import sys
+from decimal import Decimal
+from unittest.mock import Mock, patch
+
+from boto3.dynamodb.types import TypeDeserializer, TypeSerializer
+
+# Ajouter le répertoire src au PYTHONPATH
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../backend/function/siteUserHandler/src'))
+
+from dynamodb_client import ClientDynamoDB, ClientUserTable, UserMarshaller, benchmark, sample_item
+from user_service import TABLE_NAME, get_user
+
+class TestUserMarshaller:
+    """Tests pour la sérialisation spécialisée"""
+
+    def test_serialize_matches_type_serializer(self):
+        """Le format produit est celui de TypeSerializer"""
+        marshaller = UserMarshaller()
+        deserializer = TypeDeserializer()
+        serializer = TypeSerializer()
+        item = sample_item(width=6)
+        as_decimals = {k: deserializer.deserialize(v) for k, v in marshaller.serialize(item).items()}
+
+        assert marshaller.serialize(item) == {k: serializer.serialize(v) for k, v in as_decimals.items()}
+
+    def test_deserialize_returns_plain_types(self):
+        """Les nombres sont rendus en int/float, jamais en Decimal"""
+        marshaller = UserMarshaller()
+        item = sample_item(width=4)
+
+        result = marshaller.deserialize(marshaller.serialize(item))
+
+        assert result == item
+        assert type(result['profile']['age']) is int
+        assert type(result['profile']['score']) is float
+
+    def test_unexpected_type_falls_back_to_generic_path(self):
+        """Un attribut du schéma d'un type inattendu reste sérialisable"""
+        marshaller = UserMarshaller()
+
+        assert marshaller.serialize({'name': 42, 'email': Decimal('1.5')}) == {'name': {'N': '42'}, 'email': {'N': '1.5'}}
+
+    def test_benchmark_reports_both_paths(self):
+        """Le banc d'essai mesure les deux chemins"""
+        results = benchmark(width=4, number=10, out=io.StringIO())
+
+        assert set(results) == {'resource.serialize', 'resource.deserialize', 'client.serialize', 'client.deserialize'}
+
+class TestClientEngine:
+    """Tests pour le moteur client bas niveau"""
+
+    def test_table_get_item_marshals_key_and_item(self):
+        client = Mock()
+        client.get_item.return_value = {'Item': {'userId': {'S': 'u1'}, 'age': {'N': '42'}}}
+
+        response = ClientUserTable(TABLE_NAME, client).get_item(Key={'userId': 'u1'})
+
+        client.get_item.assert_called_once_with(TableName=TABLE_NAME, Key={'userId': {'S': 'u1'}})
+        assert response['Item'] == {'userId': 'u1', 'age': 42}
+
+    def test_batch_write_item_unmarshals_unprocessed_items(self):
+        client = Mock()
+        client.batch_write_item.return_value = {
+            'UnprocessedItems': {TABLE_NAME: [{'PutRequest': {'Item': {'userId': {'S': 'u2'}}}}]}
+        }
+
+        response = ClientDynamoDB(client).batch_write_item(
+            RequestItems={TABLE_NAME: [{'PutRequest': {'Item': {'userId': 'u1'}}}, {'PutRequest': {'Item': {'userId': 'u2'}}}]}
+        )
+
+        sent = client.batch_write_item.call_args.kwargs['RequestItems'][TABLE_NAME]
+        assert sent[0] == {'PutRequest': {'Item': {'userId': {'S': 'u1'}}}}
+        assert response['UnprocessedItems'] == {TABLE_NAME: [{'PutRequest': {'Item': {'userId': 'u2'}}}]}
+
+    @patch('user_service.DB_ENGINE', 'client')
+    @patch('dynamodb_client.get_client')
+    def test_user_service_uses_client_engine(self, mock_get_client):
+        """USER_DB_ENGINE=client fait passer get_user par le client bas niveau"""
+        mock_get_client.return_value.get_item.return_value = {
+            'Item': {'userId': {'S': 'u1'}, 'name': {'S': 'Alice'}, 'email': {'S': 'a@x.com'}}
+        }
+
+        result = get_user('u1')
+
+        assert result['user'] == {'userId': 'u1', 'name': 'Alice', 'email': 'a@x.com'}
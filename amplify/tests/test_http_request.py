@@ -0,0 +1,179 @@
+import base64
+import json
+import os
+import sys
+from unittest.mock import Mock, patch
+
+# Ajouter le répertoire src au PYTHONPATH
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../backend/function/siteUserHandler/src'))
+
+from http_request import AlbRequest, HttpApiRequest, HttpRequest, parse_request
+from index import handler
+
+ITEM = {'userId': 'u1', 'name': 'Alice', 'email': 'alice@example.com'}
+
+def http_api_event(method, path, query='', body=None, base64_body=False, headers=None):
+    return {
+        'version': '2.0',
+        'routeKey': '$default',
+        'rawPath': path,
+        'rawQueryString': query,
+        'headers': headers or {'content-type': 'application/json'},
+        'requestContext': {'http': {'method': method, 'path': path, 'sourceIp': '203.0.113.7'}},
+        'body': body,
+        'isBase64Encoded': base64_body
+    }
+
+def alb_event(method, path, query=None, body='', multi_value=False, headers=None):
+    event = {
+        'requestContext': {'elb': {'targetGroupArn': 'arn:aws:elasticloadbalancing:eu-west-1:123:targetgroup/users/abc'}},
+        'httpMethod': method,
+        'path': path,
+        'body': body,
+        'isBase64Encoded': False
+    }
+    headers = headers or {'x-forwarded-for': '198.51.100.4, 10.0.0.1'}
+    if multi_value:
+        event['multiValueHeaders'] = {name: [value] for name, value in headers.items()}
+        event['multiValueQueryStringParameters'] = {name: [value] for name, value in (query or {}).items()}
+    else:
+        event['headers'] = headers
+        event['queryStringParameters'] = query or {}
+    return event
+
+class TestParseRequest:
+    """Tests pour la détection et la lecture paresseuse des événements"""
+
+    def test_detects_each_format(self):
+        """Le format est détecté d'après la forme de l'événement"""
+        assert type(parse_request({'httpMethod': 'GET', 'path': '/user'})) is HttpRequest
+        assert type(parse_request(http_api_event('GET', '/user'))) is HttpApiRequest
+        assert type(parse_request(alb_event('GET', '/user'))) is AlbRequest
+
+    def test_rest_fields(self):
+        """REST v1 : headers sans casse, query string, source"""
+        request = parse_request({
+            'httpMethod': 'GET', 'path': '/user', 'queryStringParameters': {'userId': 'u1'},
+            'headers': {'If-None-Match': '"abc"'}, 'requestContext': {'identity': {'sourceIp': '192.0.2.1'}}
+        })
+
+        assert request.method == 'GET'
+        assert request.query == {'userId': 'u1'}
+        assert request.header('if-none-match') == '"abc"'
+        assert request.source_ip == '192.0.2.1'
+        assert request.body is None
+
+    def test_http_api_fields_are_parsed_lazily(self):
+        """HTTP API v2 : rawQueryString n'est analysé qu'au premier accès"""
+        request = parse_request(http_api_event('GET', '/users/search', query='q=al%20ice&limit=5&q=bob'))
+
+        assert request.method == 'GET'
+        assert request.path == '/users/search'
+        assert request._query is None
+        assert request.query == {'q': 'bob', 'limit': '5'}
+        assert request.source_ip == '203.0.113.7'
+
+    def test_base64_body_is_bytes(self):
+        """Un corps base64 est décodé en bytes, sans passer par str"""
+        payload = json.dumps(ITEM).encode('utf-8')
+        request = parse_request(http_api_event('POST', '/user', body=base64.b64encode(payload).decode('ascii'), base64_body=True))
+
+        assert request.body == payload
+
+    def test_alb_query_is_url_decoded(self):
+        """L'ALB transmet la query string encodée"""
+        single = parse_request(alb_event('GET', '/users/search', query={'q': 'jean%20dupont', 'limit': '3'}))
+        multi = parse_request(alb_event('GET', '/users/search', query={'q': 'a%2Bb'}, multi_value=True))
+
+        assert single.query == {'q': 'jean dupont', 'limit': '3'}
+        assert multi.query == {'q': 'a+b'}
+        assert single.source_ip == '10.0.0.1'
+
+    def test_alb_source_ip_is_the_hop_appended_by_the_alb(self):
+        """Les entrées X-Forwarded-For fournies par le client sont ignorées"""
+        spoofed = {'x-forwarded-for': '1.2.3.4, 203.0.113.9,198.51.100.4'}
+
+        assert parse_request(alb_event('GET', '/user', headers=spoofed)).source_ip == '198.51.100.4'
+        assert parse_request(alb_event('GET', '/user', headers=spoofed, multi_value=True)).source_ip == '198.51.100.4'
+        assert parse_request(alb_event('GET', '/user', headers={'x-forwarded-for': '198.51.100.4'})).source_ip == '198.51.100.4'
+        assert parse_request(alb_event('GET', '/user', headers={'host': 'example.com'})).source_ip is None
+
+    def test_alb_response_format(self):
+        """Réponse ALB : statusDescription, et multiValueHeaders si activés"""
+        response = {'statusCode': 404, 'headers': {'Content-Type': 'application/json'}, 'body': '{}'}
+
+        single = parse_request(alb_event('GET', '/user')).respond(dict(response))
+        multi = parse_request(alb_event('GET', '/user', multi_value=True)).respond(dict(response))
+
+        assert single['statusDescription'] == '404 Not Found'
+        assert single['headers'] == {'Content-Type': 'application/json'}
+        assert single['isBase64Encoded'] is False
+        assert multi['multiValueHeaders'] == {'Content-Type': ['application/json']}
+        assert 'headers' not in multi
+
+class TestHandlerFormats:
+    """Tests du handler avec les événements HTTP API v2 et ALB"""
+
+    @patch('user_service.get_dynamodb_table')
+    def test_http_api_get_user(self, mock_get_table):
+        """GET /user en payload v2 n'aboutit plus à 405"""
+        mock_table = Mock()
+        mock_table.get_item.return_value = {'Item': dict(ITEM)}
+        mock_get_table.return_value = mock_table
+
+        response = handler(http_api_event('GET', '/user', query='userId=u1'), {})
+
+        assert response['statusCode'] == 200
+        assert json.loads(response['body'])['userId'] == 'u1'
+        mock_table.get_item.assert_called_once_with(Key={'userId': 'u1'})
+
+    @patch('user_service.get_dynamodb_table')
+    def test_http_api_conditional_get(self, mock_get_table):
+        """If-None-Match est lu dans les headers v2 (en minuscules)"""
+        mock_get_table.return_value.get_item.return_value = {'Item': dict(ITEM)}
+        etag = handler(http_api_event('GET', '/user', query='userId=u1'), {})['headers']['ETag']
+
+        response = handler(http_api_event('GET', '/user', query='userId=u1', headers={'if-none-match': etag}), {})
+
+        assert response['statusCode'] == 304
+
+    @patch('index.add_user')
+    def test_http_api_post_with_base64_body(self, mock_add_user):
+        """POST /user avec un corps base64"""
+        mock_add_user.return_value = {'success': True, 'message': 'User created successfully', 'userId': 'u1'}
+        body = base64.b64encode(json.dumps(ITEM).encode('utf-8')).decode('ascii')
+
+        response = handler(http_api_event('POST', '/user', body=body, base64_body=True), {})
+
+        assert response['statusCode'] == 201
+        mock_add_user.assert_called_once_with(ITEM)
+
+    def test_http_api_invalid_base64_json(self):
+        """Un corps base64 qui n'est pas du JSON UTF-8 donne 400"""
+        body = base64.b64encode(b'\xff\xfe{').decode('ascii')
+
+        response = handler(http_api_event('POST', '/user', body=body, base64_body=True), {})
+
+        assert response['statusCode'] == 400
+
+    @patch('index.add_user')
+    def test_malformed_base64_body_is_a_client_error(self, mock_add_user):
+        """Un corps base64 mal formé donne 400, pas 500"""
+        for body in ('abc', 'é===='):
+            response = handler(http_api_event('POST', '/user', body=body, base64_body=True), {})
+
+            assert response['statusCode'] == 400
+            assert json.loads(response['body']) == {'error': 'Invalid base64 in request body'}
+        mock_add_user.assert_not_called()
+
+    @patch('user_service.get_dynamodb_table')
+    def test_alb_get_user(self, mock_get_table):
+        """GET /user derrière un ALB (headers multi-valeurs)"""
+        mock_get_table.return_value.get_item.return_value = {'Item': dict(ITEM)}
+
+        response = handler(alb_event('GET', '/user', query={'userId': 'u1'}, multi_value=True), {})
+
+        assert response['statusCode'] == 200
+        assert response['statusDescription'] == '200 OK'
+        assert response['multiValueHeaders']['Access-Control-Allow-Origin'] == ['*']
+        assert json.loads(response['body'])['name'] == 'Alice'
@@ -0,0 +1,196 @@
+import base64
+import http.client
+import json
+import os
+import sys
+import threading
+import time
+from unittest.mock import Mock, patch
+
+import pytest
+
+# Ajouter le répertoire src au PYTHONPATH
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../backend/function/siteUserHandler/src'))
+
+import local_table
+import user_service
+from index import handler
+from local_server import LocalServer, build_event, serve
+
+@pytest.fixture
+def start_server():
+    servers = []
+
+    def start(app=handler, workers=4, keepalive_timeout=1.0):
+        server = LocalServer(('127.0.0.1', 0), app, workers, keepalive_timeout)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.drain()
+
+def connect(server):
+    return http.client.HTTPConnection('127.0.0.1', server.server_address[1], timeout=5)
+
+class TestBuildEvent:
+    """Tests pour la traduction HTTP -> événement API Gateway"""
+
+    def test_query_headers_and_text_body(self):
+        """Query string, headers (dernière valeur et multi-valeurs) et corps JSON"""
+        event = build_event(
+            'POST', '/user?userId=u1&tag=a&tag=b',
+            [('Content-Type', 'application/json'), ('X-Tag', '1'), ('X-Tag', '2')],
+            b'{"name": "Alice"}', '10.0.0.1', 'req-1'
+        )
+
+        assert event['httpMethod'] == 'POST'
+        assert event['path'] == '/user'
+        assert event['queryStringParameters'] == {'userId': 'u1', 'tag': 'b'}
+        assert event['multiValueQueryStringParameters']['tag'] == ['a', 'b']
+        assert event['headers']['X-Tag'] == '2'
+        assert event['multiValueHeaders']['X-Tag'] == ['1', '2']
+        assert event['body'] == '{"name": "Alice"}'
+        assert event['isBase64Encoded'] is False
+        assert event['requestContext']['identity']['sourceIp'] == '10.0.0.1'
+        assert event['requestContext']['requestId'] == 'req-1'
+
+    def test_binary_body_is_base64(self):
+        """Un corps binaire est transmis en base64"""
+        event = build_event('POST', '/upload', [('Content-Type', 'application/octet-stream')], b'\x00\xff', '::1', 'r')
+
+        assert event['isBase64Encoded'] is True
+        assert base64.b64decode(event['body']) == b'\x00\xff'
+        assert event['queryStringParameters'] is None
+
+class TestLocalServer:
+    """Tests pour le serveur HTTP local"""
+
+    def test_create_then_get_on_one_keepalive_connection(self, start_server):
+        """Le vrai handler est servi, plusieurs requêtes sur la même connexion"""
+        server = start_server()
+        connection = connect(server)
+
+        with patch('user_service.DB_ENGINE', 'local'), patch('sys.stdout'):
+            body = json.dumps({'userId': 'u1', 'name': 'Alice', 'email': 'alice@example.com'})
+            connection.request('POST', '/user', body, {'Content-Type': 'application/json'})
+            created = connection.getresponse()
+            created_body = json.loads(created.read())
+            first_socket = connection.sock
+
+            connection.request('GET', '/user?userId=u1')
+            fetched = connection.getresponse()
+            user = json.loads(fetched.read())
+            etag = fetched.getheader('ETag')
+
+            connection.request('GET', '/user?userId=u1', headers={'If-None-Match': etag})
+            not_modified = connection.getresponse()
+            not_modified.read()
+        local_table.reset()
+
+        assert created.status == 201
+        assert created_body['userId'] == 'u1'
+        assert fetched.status == 200
+        assert user['name'] == 'Alice'
+        assert fetched.getheader('Access-Control-Allow-Origin') == '*'
+        assert not_modified.status == 304
+        assert connection.sock is first_socket
+
+    def test_handler_exception_returns_502(self, start_server):
+        """Une exception du handler donne 502, comme API Gateway"""
+        def failing(event, context):
+            raise RuntimeError('boom')
+
+        connection = connect(start_server(failing))
+        with patch('sys.stderr'):
+            connection.request('GET', '/user')
+            response = connection.getresponse()
+
+        assert response.status == 502
+        assert json.loads(response.read()) == {'message': 'Internal server error'}
+
+    def test_context_carries_request_id(self, start_server):
+        """Le handler reçoit un contexte Lambda avec aws_request_id"""
+        def echo(event, context):
+            return {'statusCode': 200, 'body': json.dumps({
+                'requestId': context.aws_request_id,
+                'eventRequestId': event['requestContext']['requestId'],
+                'remaining': context.get_remaining_time_in_millis()
+            })}
+
+        connection = connect(start_server(echo))
+        connection.request('GET', '/')
+        body = json.loads(connection.getresponse().read())
+
+        assert body['requestId'] == body['eventRequestId']
+        assert body['remaining'] > 0
+
+    def test_drain_finishes_in_flight_requests(self, start_server):
+        """L'arrêt propre laisse se terminer la requête en cours puis refuse les nouvelles"""
+        started = threading.Event()
+
+        def slow(event, context):
+            started.set()
+            time.sleep(0.3)
+            return {'statusCode': 200, 'body': 'done'}
+
+        server = start_server(slow, keepalive_timeout=0.2)
+        port = server.server_address[1]
+        result = {}
+
+        def call():
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+            connection.request('GET', '/slow')
+            response = connection.getresponse()
+            result['status'] = response.status
+            result['body'] = response.read()
+            result['connection'] = response.getheader('Connection')
+
+        client = threading.Thread(target=call)
+        client.start()
+        assert started.wait(2)
+
+        server.drain()
+        client.join(2)
+
+        assert result == {'status': 200, 'body': b'done', 'connection': 'close'}
+        with pytest.raises(OSError):
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=1)
+            connection.request('GET', '/slow')
+            connection.getresponse()
+
+    @patch('local_server.os.fork')
+    def test_local_engine_refuses_several_processes(self, mock_fork, capsys):
+        """Avec la table en mémoire, plusieurs processus ne partageraient pas les données"""
+        with patch('user_service.DB_ENGINE', 'local'):
+            status = serve(port=0, processes=4, app=handler)
+
+        assert status == 2
+        assert 'USER_DB_ENGINE=local' in capsys.readouterr().err
+        mock_fork.assert_not_called()
+
+    @patch('user_service.boto3.session.Session')
+    def test_each_worker_thread_gets_its_own_table(self, mock_session):
+        """Chaque thread du pool reçoit sa table boto3, réutilisée ensuite"""
+        def new_session():
+            session = Mock()
+            session.resource.return_value.Table.return_value.name = user_service.TABLE_NAME
+            return session
+
+        mock_session.side_effect = new_session
+        tables = []
+
+        def worker():
+            tables.append((user_service.get_dynamodb_table(), user_service.get_dynamodb_table()))
+
+        with patch('user_service.DB_ENGINE', 'resource'), patch.object(user_service, '_thread_state', threading.local()):
+            threads = [threading.Thread(target=worker) for _ in range(3)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        assert all(first is second for first, second in tables)
+        assert len({id(first) for first, _ in tables}) == 3
+        assert mock_session.call_count == 3
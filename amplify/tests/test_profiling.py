@@ -0,0 +1,144 @@
+import json
+import os
+import sys
+import time
+from unittest.mock import Mock, patch
+
+# Ajouter le répertoire src au PYTHONPATH
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../backend/function/siteUserHandler/src'))
+
+import profiling
+from index import handler
+
+ITEM = {'userId': 'u1', 'name': 'Alice', 'email': 'alice@example.com'}
+
+def get_event(token=None):
+    event = {'httpMethod': 'GET', 'path': '/user', 'queryStringParameters': {'userId': 'u1'}}
+    if token:
+        event['headers'] = {'x-profile-token': token}
+    return event
+
+def profile_lines(output):
+    return [json.loads(line)['profile'] for line in output.splitlines() if line.startswith('{"profile"')]
+
+class TestProfiling:
+    """Tests pour le profilage à la demande"""
+
+    def test_disabled_by_default(self):
+        """Sans configuration, handler ne profile rien"""
+        assert profiling.ENABLED is False
+        with patch('profiling.profile_request') as mock_profile, patch('user_service.get_dynamodb_table') as mock_get_table:
+            mock_get_table.return_value.get_item.return_value = {'Item': dict(ITEM)}
+            response = handler(get_event(), {})
+
+        assert response['statusCode'] == 200
+        mock_profile.assert_not_called()
+
+    def test_token_signature_and_age(self):
+        """Le header n'est valide que signé pour la même route et récent"""
+        with patch('profiling.SECRET', 's3cret'):
+            token = profiling.make_token('GET', '/user', now=1000)
+
+            assert profiling.verify_token(token, 'GET', '/user', now=1100)
+            assert not profiling.verify_token(token, 'POST', '/user', now=1100)
+            assert not profiling.verify_token(token, 'GET', '/user', now=1000 + profiling.PROFILE_TOKEN_MAX_AGE + 1)
+            assert not profiling.verify_token('1000.deadbeef', 'GET', '/user', now=1100)
+            assert not profiling.verify_token('garbage', 'GET', '/user', now=1100)
+
+    def test_non_ascii_signature_is_rejected(self):
+        """Une signature non ASCII est refusée sans exception"""
+        with patch('profiling.SECRET', 's3cret'):
+            assert not profiling.verify_token('1000.é', 'GET', '/user', now=1100)
+            assert not profiling.verify_token('1000.\ud800', 'GET', '/user', now=1100)
+
+    @patch('user_service.get_dynamodb_table')
+    def test_failing_profiling_check_serves_the_request(self, mock_get_table, capsys):
+        """Un header qui fait échouer la vérification ne fait pas échouer l'invocation"""
+        mock_get_table.return_value.get_item.return_value = {'Item': dict(ITEM)}
+
+        with patch('profiling.ENABLED', True), patch('profiling.SECRET', 's3cret'), \
+                patch('profiling.verify_token', side_effect=TypeError('boom')), \
+                patch('profiling.profile_request') as mock_profile:
+            response = handler(get_event(f'{int(time.time())}.é'), {})
+
+        assert response['statusCode'] == 200
+        mock_profile.assert_not_called()
+        assert 'Error in profiling check' in capsys.readouterr().out
+
+    def test_sample_rate(self):
+        """Le taux d'échantillonnage s'applique aux requêtes sans header"""
+        with patch('profiling.SAMPLE_RATE', 0.5), patch('profiling.random.random', side_effect=[0.2, 0.8]):
+            assert profiling.should_profile(None, 'GET', '/user')
+            assert not profiling.should_profile(None, 'GET', '/user')
+
+    @patch('user_service.get_dynamodb_table')
+    def test_signed_request_writes_flamegraph_and_log(self, mock_get_table, tmp_path, capsys):
+        """Une requête signée produit des piles repliées et une ligne de log"""
+        mock_get_table.return_value.get_item.return_value = {'Item': dict(ITEM)}
+        context = Mock(aws_request_id='req-1')
+
+        with patch('profiling.ENABLED', True), patch('profiling.SECRET', 's3cret'), \
+                patch('profiling.OUTPUT_DIR', str(tmp_path)):
+            response = handler(get_event(profiling.make_token('GET', '/user')), context)
+
+        assert response['statusCode'] == 200
+        assert json.loads(response['body'])['userId'] == 'u1'
+
+        [report] = profile_lines(capsys.readouterr().out)
+        assert report['requestId'] == 'req-1'
+        assert report['flamegraph'] == str(tmp_path / 'profile-req-1.folded')
+        assert report['topFunctions']
+        assert isinstance(report['topAllocations'], list)
+
+        lines = (tmp_path / 'profile-req-1.folded').read_text().splitlines()
+        assert lines
+        assert any('index.py:route_request' in line for line in lines)
+        for line in lines:
+            stack, value = line.rsplit(' ', 1)
+            assert stack and int(value) > 0
+
+    @patch('user_service.get_dynamodb_table')
+    def test_unsigned_request_is_not_profiled(self, mock_get_table, tmp_path, capsys):
+        """Un header mal signé est ignoré"""
+        mock_get_table.return_value.get_item.return_value = {'Item': dict(ITEM)}
+
+        with patch('profiling.ENABLED', True), patch('profiling.SECRET', 's3cret'), \
+                patch('profiling.OUTPUT_DIR', str(tmp_path)):
+            response = handler(get_event(profiling.make_token('GET', '/user', secret='other')), {})
+
+        assert response['statusCode'] == 200
+        assert profile_lines(capsys.readouterr().out) == []
+        assert list(tmp_path.iterdir()) == []
+
+    def test_only_most_recent_reports_are_kept(self, tmp_path):
+        for index in range(5):
+            path = tmp_path / f'profile-req-{index}.folded'
+            path.write_text('main 1\n')
+            os.utime(path, (1000 + index, 1000 + index))
+        (tmp_path / 'other.txt').write_text('')
+
+        with patch('profiling.OUTPUT_DIR', str(tmp_path)), patch('profiling.MAX_FILES', 3):
+            profiling.write_report('req-5', 0.001, {}, Mock(filter_traces=Mock(return_value=Mock(statistics=Mock(return_value=[])))))
+
+        assert sorted(path.name for path in tmp_path.iterdir()) == [
+            'other.txt', 'profile-req-3.folded', 'profile-req-4.folded', 'profile-req-5.folded'
+        ]
+
+    def test_collapsed_stacks_split_shared_callee(self):
+        """Le temps d'une fonction appelée de deux endroits est réparti entre les piles"""
+        main = ('app.py', 1, 'main')
+        a = ('app.py', 10, 'a')
+        b = ('app.py', 20, 'b')
+        leaf = ('app.py', 30, 'leaf')
+        stats = {
+            main: (1, 1, 0.001, 0.010, {}),
+            a: (1, 1, 0.001, 0.004, {main: (1, 1, 0.001, 0.004)}),
+            b: (1, 1, 0.001, 0.005, {main: (1, 1, 0.001, 0.005)}),
+            leaf: (2, 2, 0.007, 0.007, {a: (1, 1, 0.003, 0.003), b: (1, 1, 0.004, 0.004)})
+        }
+
+        stacks = profiling.collapsed_stacks(stats)
+
+        assert stacks['app.py:main:1'] == 1000
+        assert stacks['app.py:main:1;app.py:a:10;app.py:leaf:30'] == 3000
+        assert stacks['app.py:main:1;app.py:b:20;app.py:leaf:30'] == 4000
@@ -0,0 +1,253 @@
+import json
+import os
+import socket
+import sys
+import time
+from unittest.mock import Mock, patch
+
+import pytest
+
+# Ajouter le répertoire src au PYTHONPATH
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../backend/function/siteUserHandler/src'))
+
+from http_request import parse_request
+from index import ROUTE_UNMATCHED, handler, resolve_route
+from rate_limiter import LocalBuckets, RateLimitCounters, RateLimiter, client_key, parse_rules
+from shared_cache import LocalSharedCache, RedisCache
+
+ITEM = {'userId': 'u1', 'name': 'Alice', 'email': 'alice@example.com'}
+
+def get_event(source_ip='192.0.2.1', api_key=None, api_key_header=None):
+    event = {
+        'httpMethod': 'GET', 'path': '/user', 'queryStringParameters': {'userId': 'u1'},
+        'requestContext': {'identity': {'sourceIp': source_ip}}
+    }
+    if api_key:
+        event['requestContext']['identity']['apiKey'] = api_key
+    if api_key_header:
+        event['headers'] = {'X-Api-Key': api_key_header}
+    return event
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+class TestRules:
+    """Tests pour la configuration et l'identification des clients"""
+
+    def test_parse_rules(self):
+        """Débit, capacité (par défaut égale au débit) et route générique"""
+        rules = parse_rules('GET  /user=20:40, POST /user=2,*=50:100')
+
+        assert rules == {'GET /user': (20.0, 40.0), 'POST /user': (2.0, 2.0), '*': (50.0, 100.0)}
+        assert parse_rules('') == {}
+        with pytest.raises(ValueError):
+            parse_rules('GET /user=0:5')
+
+    def test_client_key_prefers_validated_api_key(self):
+        """La clé d'API validée par API Gateway (hachée) prime sur l'adresse IP"""
+        by_key = client_key(parse_request(get_event(api_key='secret-key')))
+        by_ip = client_key(parse_request(get_event()))
+
+        assert by_key.startswith('key:') and 'secret-key' not in by_key
+        assert by_ip == 'ip:192.0.2.1'
+
+    def test_client_key_ignores_client_supplied_identity(self):
+        """Ni le header x-api-key ni les entrées X-Forwarded-For du client ne changent l'identité"""
+        rotated = {client_key(parse_request(get_event(api_key_header=f'key-{n}'))) for n in range(3)}
+        alb = parse_request({
+            'requestContext': {'elb': {'targetGroupArn': 'arn:aws:elasticloadbalancing:eu-west-1:123:targetgroup/users/abc'}},
+            'httpMethod': 'GET', 'path': '/user',
+            'headers': {'x-api-key': 'k', 'x-forwarded-for': '1.2.3.4, 198.51.100.4'}
+        })
+        http_api = parse_request({
+            'version': '2.0', 'rawPath': '/user', 'rawQueryString': '', 'headers': {'x-api-key': 'k'},
+            'requestContext': {'http': {'method': 'GET', 'path': '/user', 'sourceIp': '203.0.113.7'}}
+        })
+
+        assert rotated == {'ip:192.0.2.1'}
+        assert client_key(alb) == 'ip:198.51.100.4'
+        assert client_key(http_api) == 'ip:203.0.113.7'
+
+    def test_resolve_route_ignores_path_variants(self):
+        """Les chemins servis par une même route ont le même nom de route"""
+        assert {resolve_route('GET', path) for path in ('/user', '/user/', '/dev/user')} == {'GET /user'}
+        assert resolve_route('GET', '/dev/users/search/') == 'GET /users/search'
+        assert resolve_route('POST', '/user/') == 'POST /user'
+        assert resolve_route('OPTIONS', '/anything') == 'OPTIONS *'
+        assert resolve_route('DELETE', '/user') == ROUTE_UNMATCHED
+
+class TestBuckets:
+    """Tests pour les seaux de jetons"""
+
+    def test_burst_then_refill(self):
+        """La capacité autorise une rafale, puis les jetons reviennent au débit"""
+        clock = FakeClock()
+        buckets = LocalBuckets(clock=clock)
+
+        assert [buckets.take_token('k', 2.0, 3.0) for _ in range(3)] == [0.0, 0.0, 0.0]
+        assert buckets.take_token('k', 2.0, 3.0) == pytest.approx(0.5)
+
+        clock.now += 0.5
+        assert buckets.take_token('k', 2.0, 3.0) == 0.0
+
+    def test_keys_are_bounded(self):
+        """Les seaux les moins récents sont oubliés au-delà de max_keys"""
+        buckets = LocalBuckets(max_keys=2)
+        for key in ('a', 'b', 'c'):
+            buckets.take_token(key, 1.0, 1.0)
+
+        assert len(buckets) == 2
+        assert buckets.take_token('a', 1.0, 1.0) == 0.0
+
+    def test_shared_store_buckets(self):
+        """Le store partagé applique le même seau à tous les conteneurs"""
+        store = LocalSharedCache()
+        first = RateLimiter({'GET /user': (1.0, 2.0)}, store=store)
+        second = RateLimiter({'GET /user': (1.0, 2.0)}, store=store)
+        request = parse_request(get_event())
+
+        assert first.acquire(request, 'GET /user') is None
+        assert second.acquire(request, 'GET /user') is None
+        assert first.acquire(request, 'GET /user') > 0
+
+    def test_redis_take_token_runs_the_bucket_script(self):
+        """Redis : un seul EVAL atomique, l'attente revient en texte"""
+        store = RedisCache('redis://localhost:6379/0')
+        with patch.object(store, '_execute', return_value=[b'0.25']) as mock_execute:
+            wait = store.take_token('ratelimit:GET /user|ip:192.0.2.1', 2.0, 4.0)
+
+        assert wait == 0.25
+        [[command]] = mock_execute.call_args[0]
+        assert command[0] == 'EVAL' and command[1] == RedisCache.TOKEN_SCRIPT
+        assert command[2:] == (1, 'ratelimit:GET /user|ip:192.0.2.1', 2.0, 4.0)
+
+    def test_store_failure_lets_requests_through(self, capsys):
+        """Une panne du store partagé ne bloque pas les requêtes"""
+        store = Mock()
+        store.take_token.side_effect = ConnectionError('down')
+        limiter = RateLimiter({'*': (1.0, 1.0)}, store=store)
+
+        assert limiter.acquire(parse_request(get_event()), 'GET /user') is None
+        assert 'Rate limit store unavailable' in capsys.readouterr().out
+
+    def test_hung_store_is_skipped_after_first_timeout(self, capsys):
+        """Un Redis qui ne répond pas coûte un délai court, puis le disjoncteur laisse passer"""
+        listener = socket.create_server(('127.0.0.1', 0))
+        try:
+            store = RedisCache(f'redis://127.0.0.1:{listener.getsockname()[1]}/0', timeout=0.05)
+            limiter = RateLimiter({'*': (1.0, 1.0)}, store=store, store_cooldown=30)
+            request = parse_request(get_event())
+
+            started = time.monotonic()
+            waits = [limiter.acquire(request, 'GET /user') for _ in range(20)]
+            elapsed = time.monotonic() - started
+        finally:
+            listener.close()
+
+        assert waits == [None] * 20
+        assert elapsed < 0.5
+        assert capsys.readouterr().out.count('Rate limit store unavailable') == 1
+
+    def test_store_is_retried_after_cooldown(self):
+        """À la fin du délai, le store est de nouveau interrogé"""
+        clock = FakeClock()
+        store = Mock()
+        store.take_token.side_effect = [ConnectionError('down'), 2.0]
+        limiter = RateLimiter({'*': (1.0, 1.0)}, store=store, store_cooldown=5, clock=clock)
+        request = parse_request(get_event())
+
+        assert limiter.acquire(request, 'GET /user') is None
+        assert limiter.acquire(request, 'GET /user') is None
+        clock.now += 5
+        assert limiter.acquire(request, 'GET /user') == 2.0
+        assert store.take_token.call_count == 2
+
+class TestCounters:
+    """Tests pour les compteurs exportés"""
+
+    def test_flush_emits_emf_once_per_interval(self, capsys):
+        """Les refus sont publiés au format EMF, au plus une fois par intervalle"""
+        clock = FakeClock()
+        counters = RateLimitCounters(interval=60, clock=clock)
+        counters.record('GET /user', False)
+        counters.record('GET /user', False)
+        counters.record('GET /user', True)
+
+        assert counters.flush() == 0
+        clock.now += 61
+        assert counters.flush() == 1
+        assert counters.flush() == 0
+
+        line = json.loads(capsys.readouterr().out)
+        assert line['RateLimitRejected'] == 2
+        assert line['Route'] == 'GET /user'
+        assert line['_aws']['CloudWatchMetrics'][0]['Metrics'][0]['Name'] == 'RateLimitRejected'
+        assert counters.snapshot() == {'allowed': {'GET /user': 1}, 'rejected': {'GET /user': 2}}
+
+class TestHandlerRateLimit:
+    """Tests du handler avec la limitation de débit"""
+
+    @patch('user_service.get_dynamodb_table')
+    def test_rejects_with_429_before_reading_the_table(self, mock_get_table):
+        """Au-delà de la rafale : 429 et Retry-After, sans appel au service"""
+        mock_table = Mock()
+        mock_table.get_item.return_value = {'Item': dict(ITEM)}
+        mock_get_table.return_value = mock_table
+        limiter = RateLimiter({'GET /user': (0.5, 2.0)})
+
+        with patch('rate_limiter.limiter', limiter):
+            statuses = [handler(get_event(), {})['statusCode'] for _ in range(2)]
+            rejected = handler(get_event(), {})
+            other_client = handler(get_event(source_ip='192.0.2.99'), {})
+
+        assert statuses == [200, 200]
+        assert rejected['statusCode'] == 429
+        assert rejected['headers']['Retry-After'] == '2'
+        assert rejected['headers']['Access-Control-Allow-Origin'] == '*'
+        assert json.loads(rejected['body']) == {'error': 'Too many requests'}
+        assert other_client['statusCode'] == 200
+        assert mock_table.get_item.call_count == 3
+        assert limiter.counters.snapshot()['rejected'] == {'GET /user': 1}
+
+    @patch('user_service.get_dynamodb_table')
+    def test_path_variants_share_the_route_bucket(self, mock_get_table):
+        """'/user/' et '/dev/user' ne contournent pas la limite de GET /user"""
+        mock_get_table.return_value.get_item.return_value = {'Item': dict(ITEM)}
+        limiter = RateLimiter({'GET /user': (0.5, 2.0)})
+
+        with patch('rate_limiter.limiter', limiter):
+            statuses = [handler(dict(get_event(), path=path), {})['statusCode'] for path in ('/user', '/user/', '/dev/user')]
+
+        assert statuses == [200, 200, 429]
+
+    def test_wildcard_rule_keeps_a_bucket_per_route(self):
+        """Avec la règle '*', chaque route garde ses propres seaux"""
+        limiter = RateLimiter({'*': (0.5, 1.0)})
+
+        with patch('rate_limiter.limiter', limiter):
+            options = handler({'httpMethod': 'OPTIONS', 'path': '/user', 'requestContext': {'identity': {'sourceIp': '192.0.2.1'}}}, {})
+            unmatched = handler({'httpMethod': 'DELETE', 'path': '/user', 'requestContext': {'identity': {'sourceIp': '192.0.2.1'}}}, {})
+            unmatched_again = handler({'httpMethod': 'PUT', 'path': '/user', 'requestContext': {'identity': {'sourceIp': '192.0.2.1'}}}, {})
+
+        assert options['statusCode'] == 200
+        assert unmatched['statusCode'] == 405
+        assert unmatched_again['statusCode'] == 429
+        assert limiter.counters.snapshot() == {
+            'allowed': {'OPTIONS *': 1, ROUTE_UNMATCHED: 1},
+            'rejected': {ROUTE_UNMATCHED: 1}
+        }
+
+    @patch('index.add_user')
+    def test_routes_without_rule_are_not_limited(self, mock_add_user):
+        """Sans règle pour la route ni règle '*', la requête passe"""
+        mock_add_user.return_value = {'success': True, 'message': 'User created successfully', 'userId': 'u1'}
+        event = {'httpMethod': 'POST', 'path': '/user', 'body': json.dumps(ITEM)}
+
+        with patch('rate_limiter.limiter', RateLimiter({'GET /user': (1.0, 1.0)})):
+            statuses = [handler(dict(event), {})['statusCode'] for _ in range(3)]
+
+        assert statuses == [201, 201, 201]
@@ -0,0 +1,190 @@
+import io
+import os
+import sys
+import threading
+from unittest.mock import Mock, patch
+
+# Ajouter le répertoire src au PYTHONPATH
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../backend/function/siteUserHandler/src'))
+
+import shared_cache
+from shared_cache import MISSING, LocalSharedCache, SharedUserCache, decode_user, encode_command, encode_user, read_reply
+from user_events import publish, user_change
+from user_model import User
+from user_service import add_user, get_user, get_users
+
+ITEM = {'userId': 'u1', 'name': 'Alice', 'email': 'alice@example.com', 'version': 300, 'updatedAt': '2026-01-01T00:00:00.000+00:00', 'tags': ['a']}
+
+class TestEncoding:
+    """Tests pour l'encodage binaire et le protocole RESP"""
+
+    def test_user_round_trip(self):
+        user = User.from_item(ITEM)
+
+        data = encode_user(user)
+
+        assert decode_user(data) == user
+        assert len(data) < len(user.to_json())
+        assert decode_user(encode_user(MISSING)) is MISSING
+
+    def test_resp_encoding_and_replies(self):
+        assert encode_command('MGET', 'a', b'b') == b'*3\r\n$4\r\nMGET\r\n$1\r\na\r\n$1\r\nb\r\n'
+        reader = io.BytesIO(b'*3\r\n$3\r\nfoo\r\n$-1\r\n:2\r\n+OK\r\n')
+
+        assert read_reply(reader) == [b'foo', None, 2]
+        assert read_reply(reader) == 'OK'
+
+    def test_protocol_error_discards_the_connection(self):
+        """Une connexion désynchronisée n'est pas remise dans le pool"""
+        connection = Mock()
+        connection.execute.side_effect = shared_cache.RedisError("Unexpected reply b'?'")
+        backend = shared_cache.RedisCache('redis://localhost:6379')
+
+        with patch('shared_cache.RedisConnection', return_value=connection):
+            try:
+                backend.get_many(['user:u1'])
+                assert False, 'RedisError attendue'
+            except shared_cache.RedisError:
+                pass
+
+        connection.close.assert_called_once()
+        assert backend._pool.empty()
+
+class TestSharedUserCache:
+    """Tests pour le cache partagé avec le remplaçant local"""
+
+    def test_load_uses_single_loader_under_contention(self):
+        """Avec le verrou, un seul appelant lit la table pour un même utilisateur"""
+        cache = SharedUserCache(LocalSharedCache())
+        started = threading.Event()
+        loader = Mock(side_effect=lambda user_id: started.wait(1) and User.from_item(ITEM))
+        results = []
+
+        threads = [threading.Thread(target=lambda: results.append(cache.load('u1', loader))) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        started.set()
+        for thread in threads:
+            thread.join()
+
+        assert loader.call_count == 1
+        assert all(result == User.from_item(ITEM) for result in results)
+
+    def test_missing_users_are_cached_negatively(self):
+        cache = SharedUserCache(LocalSharedCache())
+        loader = Mock(return_value=None)
+
+        assert cache.load('ghost', loader) is None
+        assert cache.load('ghost', loader) is None
+        loader.assert_called_once()
+
+    def test_corrupt_entry_is_a_miss_and_is_deleted(self):
+        backend = LocalSharedCache()
+        backend.set_many({'user:u1': b'\x01\x10\x01a\x02{x', 'user:u2': encode_user(User.from_item(dict(ITEM, userId='u2')))}, 60)
+        cache = SharedUserCache(backend)
+
+        assert cache.get_many(['u1', 'u2']) == {'u2': User.from_item(dict(ITEM, userId='u2'))}
+        assert backend.get_many(['user:u1']) == {}
+        assert cache.is_available()
+
+    def test_lock_error_skips_the_wait(self):
+        """Une erreur sur le verrou n'est pas prise pour un verrou tenu"""
+        backend = Mock()
+        backend.get_many.return_value = {}
+        backend.acquire_lock.side_effect = ConnectionError('refused')
+        cache = SharedUserCache(backend)
+        loader = Mock(return_value=User.from_item(ITEM))
+
+        with patch('shared_cache.time.sleep') as mock_sleep:
+            assert cache.load('u1', loader) == User.from_item(ITEM)
+
+        mock_sleep.assert_not_called()
+        loader.assert_called_once_with('u1')
+        backend.set_many.assert_not_called()
+        backend.release_lock.assert_not_called()
+
+    def test_breaker_skips_backend_after_error(self):
+        """Après une erreur, le backend est ignoré jusqu'à la fin du délai"""
+        clock = Mock(return_value=100.0)
+        backend = Mock()
+        backend.get_many.side_effect = ConnectionError('refused')
+        cache = SharedUserCache(backend, breaker_cooldown=5, clock=clock)
+        loader = Mock(return_value=None)
+
+        assert cache.load('u1', loader) is None
+        assert cache.load('u2', loader) is None
+        assert backend.get_many.call_count == 1
+        backend.acquire_lock.assert_not_called()
+        assert loader.call_count == 2
+
+        clock.return_value = 105.0
+        backend.get_many.side_effect = None
+        backend.get_many.return_value = {}
+        backend.acquire_lock.return_value = 'token'
+        cache.load('u3', loader)
+
+        assert cache.is_available()
+        assert backend.get_many.call_count == 2
+        backend.release_lock.assert_called_once_with('lock:user:u3', 'token')
+
+class TestUserServiceWithSharedCache:
+    """Tests pour get_user / get_users devant DynamoDB"""
+
+    def setup_method(self):
+        self.env = patch.dict(os.environ, {'USER_SHARED_CACHE_URL': f'local://{id(self)}'})
+        self.env.start()
+
+    def teardown_method(self):
+        self.env.stop()
+        shared_cache._shared_cache = None
+
+    @patch('user_service.get_dynamodb_table')
+    def test_second_container_is_served_by_shared_cache(self, mock_get_table):
+        """Un autre conteneur (cache local vide) ne relit pas DynamoDB"""
+        mock_table = Mock()
+        mock_table.get_item.return_value = {'Item': dict(ITEM)}
+        mock_get_table.return_value = mock_table
+
+        get_user('u1')
+        result = get_user('u1')
+
+        assert result['user'] == User.from_item(ITEM)
+        mock_table.get_item.assert_called_once()
+
+    @patch('user_service.get_dynamodb_table')
+    def test_change_event_invalidates_shared_entry(self, mock_get_table):
+        mock_table = Mock()
+        mock_table.get_item.return_value = {'Item': dict(ITEM)}
+        mock_get_table.return_value = mock_table
+        get_user('u1')
+
+        publish([user_change('MODIFY', 'u1', dict(ITEM, name='Alicia'))])
+        get_user('u1')
+
+        assert mock_table.get_item.call_count == 2
+
+    @patch('user_service.get_dynamodb_table')
+    def test_write_in_fresh_container_invalidates_missing_entry(self, mock_get_table):
+        """Un POST traité par un conteneur qui n'a rien lu efface l'absence mise en cache"""
+        # Absence écrite par un autre conteneur
+        backend = shared_cache.create_backend(os.environ['USER_SHARED_CACHE_URL'])
+        SharedUserCache(backend).set_many({'u1': MISSING})
+        mock_get_table.return_value.get_item.return_value = {}
+
+        assert add_user(dict(ITEM))['success'] is True
+
+        assert backend.get_many(['user:u1']) == {}
+
+    def test_get_users_multi_gets_then_batch_reads_misses(self):
+        dynamodb = Mock()
+        dynamodb.batch_get_item.return_value = {'Responses': {'siteUserTable': [dict(ITEM)]}}
+        shared_cache.get_shared_cache().set_many({'u2': User.from_item(dict(ITEM, userId='u2'))})
+
+        first = get_users(['u1', 'u2', 'u3'], dynamodb)
+        second = get_users(['u1', 'u2', 'u3'], dynamodb)
+
+        assert set(first['users']) == {'u1', 'u2'}
+        assert set(second['users']) == {'u1', 'u2'}
+        keys = dynamodb.batch_get_item.call_args.kwargs['RequestItems']['siteUserTable']['Keys']
+        assert keys == [{'userId': 'u1'}, {'userId': 'u3'}]
+        dynamodb.batch_get_item.assert_called_once()
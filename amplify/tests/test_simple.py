@@ -63,7 +63,11 @@ class TestUserService:
         
         # Vérifier que les bonnes méthodes ont été appelées
         mock_table.get_item.assert_called_once_with(Key={'userId': 'user123'})
-        mock_table.put_item.assert_called_once_with(Item=user_data)
+        mock_table.put_item.assert_called_once()
+        written = mock_table.put_item.call_args.kwargs['Item']
+        assert {k: written[k] for k in user_data} == user_data
+        assert written['version'] == 1
+        assert 'updatedAt' in written
     
     def test_add_user_missing_fields(self):
         """Test d'ajout d'un utilisateur avec des champs manquants"""
@@ -0,0 +1,115 @@
+import io
+import os
+import sys
+from unittest.mock import patch
+
+import pytest
+
+# Ajouter le répertoire src au PYTHONPATH
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../backend/function/siteUserHandler/src'))
+
+import local_table
+import user_search
+from soak import EventMix, percentile, run_soak
+from user_events import unsubscribe
+from user_service import get_user
+
+# SOAK_EVENTS=2000000 pour un vrai test d'endurance
+SOAK_EVENTS = int(os.environ.get('SOAK_EVENTS', '3000'))
+
+@pytest.fixture
+def local_engine(tmp_path):
+    with patch('user_service.DB_ENGINE', 'local'), \
+            patch.object(user_search, 'SNAPSHOT_PATH', str(tmp_path / 'search.idx')):
+        user_search._index = None
+        yield
+        if user_search._index is not None:
+            unsubscribe(user_search._index.on_user_changes)
+        user_search._index = None
+        local_table.reset()
+
+class TestSoak:
+    """Tests pour le test d'endurance sur la table locale"""
+
+    def test_requires_local_engine(self):
+        """Le test refuse de s'exécuter contre une vraie table"""
+        result = run_soak(events=10, window=5)
+
+        assert result['success'] is False
+        assert 'USER_DB_ENGINE=local' in result['errors'][0]
+
+    def test_local_table_round_trip(self, local_engine):
+        """La table locale sert les lectures de user_service"""
+        local_table.LocalUserTable('siteUserTable').put_item(Item={'userId': 'u1', 'name': 'Alice', 'email': 'a@example.com'})
+
+        result = get_user('u1')
+
+        assert result['success'] is True
+        assert result['user']['name'] == 'Alice'
+
+    def test_tables_share_one_lock_per_store(self, local_engine):
+        """Deux LocalUserTable d'une même table écrivent sous le même verrou"""
+        first = local_table.LocalUserTable('siteUserTable')
+        second = local_table.LocalUserTable('siteUserTable')
+
+        assert first._lock is second._lock
+        assert first._lock is not local_table.LocalUserTable('otherTable')._lock
+
+    def test_warm_handler_stays_flat(self, local_engine):
+        """Un handler sain passe les seuils de croissance et de dérive"""
+        window = max(SOAK_EVENTS // 6, 100)
+        out = io.StringIO()
+
+        result = run_soak(
+            events=SOAK_EVENTS, window=window, users=50, warmup=window,
+            max_heap_growth_mb=8, max_p99_drift=20, out=out
+        )
+
+        assert result['success'] is True, result['errors']
+        assert len(result['windows']) >= 3
+        assert all(stats['p99Ms'] >= stats['p50Ms'] for stats in result['windows'])
+        assert 'soak events=' in out.getvalue()
+        assert result['cacheHits'] > 0
+        assert result['sharedCacheCalls'] > 0
+        assert 'USER_SHARED_CACHE_URL' not in os.environ
+
+    def test_leak_is_detected(self, local_engine):
+        """Un handler qui retient de la mémoire à chaque appel fait échouer le test"""
+        from index import handler
+        retained = []
+
+        def leaky_handler(event, context):
+            retained.append(bytearray(4096))
+            return handler(event, context)
+
+        result = run_soak(
+            events=1200, window=200, users=20, max_heap_growth_mb=1, out=io.StringIO(), handler=leaky_handler
+        )
+
+        assert result['success'] is False
+        assert any('heap grew' in error for error in result['errors'])
+        assert result['topGrowth']
+
+    def test_server_errors_fail_the_run(self, local_engine):
+        """Une réponse 5xx fait échouer le test"""
+        result = run_soak(
+            events=400, window=100, users=10, out=io.StringIO(), trace=False,
+            handler=lambda event, context: {'statusCode': 500}
+        )
+
+        assert result['success'] is False
+        assert '400 responses with status >= 500' in result['errors']
+
+    def test_event_mix_is_reproducible(self):
+        """La même graine produit la même suite d'événements"""
+        first, second = EventMix(users=10, seed=3), EventMix(users=10, seed=3)
+
+        assert [first.next_event() for _ in range(50)] == [second.next_event() for _ in range(50)]
+
+    def test_percentile(self):
+        """Percentile au rang le plus proche"""
+        values = list(range(1, 101))
+
+        assert percentile(values, 0.5) == 50
+        assert percentile(values, 0.99) == 99
+        assert percentile([], 0.99) == 0.0
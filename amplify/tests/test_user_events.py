@@ -0,0 +1,119 @@
+import os
+import sys
+from unittest.mock import Mock, patch
+
+# Ajouter le répertoire src au PYTHONPATH
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../backend/function/siteUserHandler/src'))
+
+from index import handler
+from user_cache import cache
+from user_events import UserCounters, counters, subscribe, unsubscribe, user_change
+from user_service import add_user, get_user
+
+def stream_record(event_name, user_id, sequence, name=None):
+    record = {
+        'eventName': event_name,
+        'eventSource': 'aws:dynamodb',
+        'dynamodb': {
+            'Keys': {'userId': {'S': user_id}},
+            'SequenceNumber': sequence
+        }
+    }
+    if name:
+        record['dynamodb']['NewImage'] = {'userId': {'S': user_id}, 'name': {'S': name}, 'age': {'N': '42'}}
+    return record
+
+class TestUserEvents:
+    """Tests pour la publication des modifications"""
+
+    def setup_method(self):
+        self.received = []
+        subscribe(self.received.extend)
+        counters.reset()
+
+    def teardown_method(self):
+        unsubscribe(self.received.extend)
+        cache.ttl = 0
+        cache.clear()
+
+    def test_stream_event_is_published_to_subscribers(self):
+        """Les images du flux sont désérialisées et transmises en un lot"""
+        event = {'Records': [stream_record('INSERT', 'u1', '1', 'Alice'), stream_record('REMOVE', 'u2', '2')]}
+
+        response = handler(event, {})
+
+        assert response == {'batchItemFailures': []}
+        assert [c['type'] for c in self.received] == ['INSERT', 'REMOVE']
+        assert self.received[0]['newImage']['name'] == 'Alice'
+        assert self.received[0]['source'] == 'stream'
+        assert self.received[1]['newImage'] is None
+        assert counters.snapshot()['usersDelta'] == 0
+
+    def test_failing_subscriber_replays_batch(self):
+        """Un abonné en échec fait rejouer le lot à partir du premier enregistrement"""
+        failing = Mock(side_effect=RuntimeError('index unavailable'))
+        subscribe(failing)
+        try:
+            response = handler({'Records': [stream_record('MODIFY', 'u1', '7', 'Bob')]}, {})
+        finally:
+            unsubscribe(failing)
+
+        assert response == {'batchItemFailures': [{'itemIdentifier': '7'}]}
+        assert len(self.received) == 1
+
+    @patch('user_service.get_dynamodb_table')
+    def test_add_user_publishes_and_invalidates_cache(self, mock_get_table):
+        """Une création publie un INSERT qui invalide le cache local"""
+        cache.ttl = 60
+        cache.set('u1', {'userId': 'u1', 'name': 'Stale'})
+        mock_table = Mock()
+        mock_table.get_item.return_value = {}
+        mock_get_table.return_value = mock_table
+
+        add_user({'userId': 'u1', 'name': 'Alice', 'email': 'alice@example.com'})
+
+        assert self.received[0]['type'] == 'INSERT'
+        assert self.received[0]['source'] == 'local'
+        assert cache.get('u1') is None
+        assert counters.snapshot()['INSERT'] == 1
+
+    @patch('user_service.get_dynamodb_table')
+    def test_get_user_is_served_from_cache(self, mock_get_table):
+        """Le second appel à get_user ne lit pas DynamoDB"""
+        cache.ttl = 60
+        mock_table = Mock()
+        mock_table.get_item.return_value = {'Item': {'userId': 'u1', 'name': 'Alice'}}
+        mock_get_table.return_value = mock_table
+
+        get_user('u1')
+        result = get_user('u1')
+
+        assert result['user']['name'] == 'Alice'
+        mock_table.get_item.assert_called_once()
+
+    @patch('user_service.get_dynamodb_table')
+    def test_counters_count_each_write_once(self, mock_get_table):
+        """Publication locale, enregistrement du flux et lot rejoué : un seul INSERT"""
+        stream_counters = subscribe(UserCounters(source='stream'))
+        mock_get_table.return_value.get_item.return_value = {}
+        event = {'Records': [stream_record('INSERT', 'u1', '11', 'Alice')]}
+        try:
+            add_user({'userId': 'u1', 'name': 'Alice', 'email': 'alice@example.com'})
+            handler(event, {})
+            handler(event, {})
+        finally:
+            unsubscribe(stream_counters)
+
+        assert stream_counters.snapshot()['INSERT'] == 1
+        assert stream_counters.snapshot()['usersDelta'] == 1
+        assert counters.snapshot()['INSERT'] == 1
+
+    def test_counters_forget_old_sequences(self):
+        """Les SequenceNumber retenus sont bornés"""
+        stream_counters = UserCounters(source='stream', max_seen=2)
+        for sequence in ('1', '2', '3'):
+            stream_counters([user_change('MODIFY', 'u1', source='stream', sequence=sequence)])
+        stream_counters([user_change('MODIFY', 'u1', source='stream', sequence='3')])
+
+        assert stream_counters.snapshot()['MODIFY'] == 3
+        assert len(stream_counters._seen) == 2
@@ -0,0 +1,59 @@
+import json
+import os
+import sys
+from decimal import Decimal
+from unittest.mock import Mock, patch
+
+import pytest
+
+# Ajouter le répertoire src au PYTHONPATH
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../backend/function/siteUserHandler/src'))
+
+from index import handler
+from user_model import User
+from user_service import get_user
+
+ITEM = {'userId': 'u1', 'name': 'Alice', 'email': 'alice@example.com', 'age': Decimal('42'), 'tags': {'beta'}}
+
+class TestUserModel:
+    """Tests pour le modèle User"""
+
+    def test_round_trip_keeps_extra_attributes(self):
+        """Les attributs hors schéma sont conservés"""
+        user = User.from_item(ITEM)
+
+        assert user.user_id == 'u1'
+        assert user.to_item() == ITEM
+        assert user['age'] == Decimal('42')
+        assert user.get('missing') is None
+
+    def test_user_is_compact_and_immutable(self):
+        """Pas de __dict__ par objet, et aucune modification possible"""
+        user = User.from_item(ITEM)
+
+        assert not hasattr(user, '__dict__')
+        with pytest.raises(AttributeError):
+            user.name = 'Bob'
+
+    def test_json_body_is_computed_once(self):
+        """Le corps JSON est mémorisé et convertit les types boto3"""
+        user = User.from_item(ITEM)
+
+        body = user.to_json()
+
+        assert user.to_json() is body
+        assert json.loads(body) == {'userId': 'u1', 'name': 'Alice', 'email': 'alice@example.com', 'age': 42, 'tags': ['beta']}
+
+    @patch('user_service.get_dynamodb_table')
+    def test_get_user_returns_user_served_by_handler(self, mock_get_table):
+        """get_user construit un User que le handler renvoie tel quel"""
+        mock_table = Mock()
+        mock_table.get_item.return_value = {'Item': dict(ITEM)}
+        mock_get_table.return_value = mock_table
+
+        assert isinstance(get_user('u1')['user'], User)
+
+        response = handler({'httpMethod': 'GET', 'path': '/user', 'queryStringParameters': {'userId': 'u1'}}, {})
+
+        assert response['statusCode'] == 200
+        assert json.loads(response['body'])['age'] == 42
@@ -0,0 +1,133 @@
+import json
+import os
+import sys
+from unittest.mock import Mock, patch
+
+# Ajouter le répertoire src au PYTHONPATH
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../backend/function/siteUserHandler/src'))
+
+from index import handler
+from user_queue import LocalQueue, get_queue_client
+from user_service import TABLE_NAME, add_users
+
+def user(user_id):
+    return {'userId': user_id, 'name': f'User {user_id}', 'email': f'{user_id}@example.com'}
+
+class TestAddUsers:
+    """Tests pour la création d'utilisateurs par lots"""
+
+    def test_add_users_groups_reads_and_writes(self):
+        """Un seul BatchGetItem et un seul BatchWriteItem pour tout le lot"""
+        dynamodb = Mock()
+        dynamodb.batch_get_item.return_value = {'Responses': {TABLE_NAME: [user('u2')]}}
+        dynamodb.batch_write_item.return_value = {'UnprocessedItems': {}}
+
+        results = add_users([user('u1'), user('u2'), {'userId': 'u3'}, user('u1')], dynamodb)
+
+        assert results[0]['success'] is True
+        assert 'already exists' in results[1]['error']
+        assert 'Missing required fields' in results[2]['error']
+        assert 'already exists' in results[3]['error']
+        assert not any(r.get('retryable') for r in results)
+        dynamodb.batch_get_item.assert_called_once()
+        written = dynamodb.batch_write_item.call_args.kwargs['RequestItems'][TABLE_NAME]
+        assert len(written) == 1
+        assert written[0]['PutRequest']['Item']['userId'] == 'u1'
+        assert written[0]['PutRequest']['Item']['version'] == 1
+
+    def test_non_string_user_id_is_rejected(self):
+        """Un userId liste ou objet est refusé sans faire échouer le lot"""
+        dynamodb = Mock()
+        dynamodb.batch_get_item.return_value = {'Responses': {TABLE_NAME: []}}
+        dynamodb.batch_write_item.return_value = {'UnprocessedItems': {}}
+
+        results = add_users([dict(user('u1'), userId=['u1']), dict(user('u2'), userId={'id': 'u2'}), user('u3')], dynamodb)
+
+        assert 'Invalid required fields' in results[0]['error']
+        assert 'Invalid required fields' in results[1]['error']
+        assert not results[0]['retryable'] and not results[1]['retryable']
+        assert results[2]['success'] is True
+
+class TestSqsEvents:
+    """Tests pour la consommation des lots SQS"""
+
+    def setup_method(self):
+        self.queue = LocalQueue()
+        for user_id in ('u1', 'u2'):
+            self.queue.send_message(QueueUrl=self.queue.queue_url, MessageBody=json.dumps(user(user_id)))
+        self.queue.send_message(QueueUrl=self.queue.queue_url, MessageBody='{invalid')
+
+    @patch('user_queue.add_users')
+    def test_only_retryable_failures_are_reported(self, mock_add_users):
+        """Seuls les échecs transitoires figurent dans batchItemFailures"""
+        mock_add_users.return_value = [
+            {'success': True, 'message': 'User created successfully', 'userId': 'u1'},
+            {'success': False, 'error': 'Database error: throttled', 'retryable': True}
+        ]
+        event = self.queue.receive_event()
+
+        response = handler(event, {})
+
+        assert response == {'batchItemFailures': [{'itemIdentifier': event['Records'][1]['messageId']}]}
+        mock_add_users.assert_called_once_with([user('u1'), user('u2')])
+
+        self.queue.acknowledge(event, response)
+        retried = self.queue.receive_event()
+        assert [r['body'] for r in retried['Records']] == [json.dumps(user('u2'))]
+        assert retried['Records'][0]['attributes']['ApproximateReceiveCount'] == '2'
+
+    @patch('user_service.get_dynamodb_resource')
+    def test_non_string_user_id_is_dropped(self, mock_get_resource):
+        """Un message au userId invalide est abandonné, les autres sont créés"""
+        queue = LocalQueue()
+        queue.send_message(QueueUrl=queue.queue_url, MessageBody=json.dumps(dict(user('u1'), userId=['u1'])))
+        queue.send_message(QueueUrl=queue.queue_url, MessageBody=json.dumps(user('u2')))
+        dynamodb = mock_get_resource.return_value
+        dynamodb.batch_get_item.return_value = {'Responses': {TABLE_NAME: []}}
+        dynamodb.batch_write_item.return_value = {'UnprocessedItems': {}}
+
+        response = handler(queue.receive_event(), {})
+
+        assert response == {'batchItemFailures': []}
+        written = dynamodb.batch_write_item.call_args.kwargs['RequestItems'][TABLE_NAME]
+        assert [request['PutRequest']['Item']['userId'] for request in written] == ['u2']
+
+class TestAsyncPostUser:
+    """Tests pour POST /user en mode asynchrone"""
+
+    @patch.dict(os.environ, {'USER_QUEUE_URL': 'local://test-signup'})
+    @patch('index.add_user')
+    def test_post_user_is_queued(self, mock_add_user):
+        """POST /user répond 202 et dépose le message sans écrire en base"""
+        event = {'httpMethod': 'POST', 'path': '/user', 'body': json.dumps(user('u9'))}
+
+        response = handler(event, {})
+
+        assert response['statusCode'] == 202
+        assert json.loads(response['body'])['userId'] == 'u9'
+        mock_add_user.assert_not_called()
+
+        queued = get_queue_client('local://test-signup').receive_event()
+        assert json.loads(queued['Records'][0]['body']) == user('u9')
+
+    @patch.dict(os.environ, {'USER_QUEUE_URL': 'local://test-signup'})
+    def test_post_user_invalid_is_rejected_synchronously(self):
+        """Les erreurs de validation restent synchrones (400)"""
+        event = {'httpMethod': 'POST', 'path': '/user', 'body': json.dumps({'userId': 'u9'})}
+
+        response = handler(event, {})
+
+        assert response['statusCode'] == 400
+
+    def test_non_object_body_is_rejected_in_both_modes(self):
+        """Un corps JSON qui n'est pas un objet donne 400, en synchrone comme en asynchrone"""
+        for body in ('[1]', '"x"'):
+            event = {'httpMethod': 'POST', 'path': '/user', 'body': body}
+
+            sync_response = handler(dict(event), {})
+            with patch.dict(os.environ, {'USER_QUEUE_URL': 'local://test-signup'}):
+                async_response = handler(dict(event), {})
+
+            assert sync_response['statusCode'] == 400
+            assert async_response['statusCode'] == 400
+            assert json.loads(sync_response['body']) == {'error': 'User data must be a JSON object'}
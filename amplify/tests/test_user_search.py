@@ -0,0 +1,161 @@
+import json
+import os
+import sys
+from datetime import datetime, timezone
+from unittest.mock import Mock, patch
+
+import pytest
+
+# Ajouter le répertoire src au PYTHONPATH
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../backend/function/siteUserHandler/src'))
+
+import user_search
+from index import handler
+from user_events import publish, unsubscribe, user_change
+from user_search import SnapshotIndex, SnapshotLoader, UserSearchIndex, build_snapshot
+
+USERS = [
+    {'userId': 'u1', 'name': 'Alice Martin', 'email': 'alice.martin@example.com'},
+    {'userId': 'u2', 'name': 'Alicia Keys', 'email': 'akeys@music.org'},
+    {'userId': 'u3', 'name': 'Bob Léger', 'email': 'bob@example.com'},
+    {'userId': 'u4', 'name': 'Martine Alix', 'email': 'martine@example.fr'}
+]
+
+@pytest.fixture
+def snapshot_path(tmp_path):
+    path = str(tmp_path / 'users.idx')
+    build_snapshot(path, [(USERS[:2], {'userId': 'u2'}), (USERS[2:], None)])
+    return path
+
+@pytest.fixture
+def search_index(snapshot_path):
+    """Index du conteneur chargé depuis le snapshot de test"""
+    with patch.object(user_search, 'SNAPSHOT_PATH', snapshot_path):
+        user_search._index = None
+        index = user_search.get_search_index()
+        yield index
+        unsubscribe(index.on_user_changes)
+        user_search._index = None
+
+def user_ids(results):
+    return [result['userId'] for result in results]
+
+class TestUserSearch:
+    """Tests pour l'index de recherche"""
+
+    def test_prefix_search_ranks_exact_and_name_matches_first(self, snapshot_path):
+        """Un préfixe trouve nom et email, les termes les plus courts en tête"""
+        index = UserSearchIndex(SnapshotIndex(snapshot_path))
+
+        assert user_ids(index.search('ali')) == ['u4', 'u1', 'u2']
+        assert user_ids(index.search('martin')) == ['u1', 'u4']
+        assert user_ids(index.search('ali', limit=1)) == ['u4']
+        assert index.search('Alicia')[0]['userId'] == 'u2'
+
+    def test_search_ignores_accents_and_requires_all_words(self, snapshot_path):
+        """La recherche ignore les accents et combine les mots en ET"""
+        index = UserSearchIndex(SnapshotIndex(snapshot_path))
+
+        assert user_ids(index.search('leger')) == ['u3']
+        assert set(user_ids(index.search('martin ali'))) == {'u1', 'u4'}
+        assert user_ids(index.search('bob example.com')) == ['u3']
+        assert index.search('zzz') == []
+
+    def test_fuzzy_search_tolerates_typos(self, snapshot_path):
+        """Une faute de frappe retrouve le terme proche"""
+        index = UserSearchIndex(SnapshotIndex(snapshot_path))
+
+        assert user_ids(index.search('marrtin')) == ['u1', 'u4']
+        assert user_ids(index.search('akeyz')) == ['u2']
+
+    def test_changes_update_the_index_incrementally(self, search_index):
+        """Les modifications publiées masquent ou remplacent les entrées du snapshot"""
+        publish([
+            user_change('INSERT', 'u5', {'userId': 'u5', 'name': 'Alizée Durand', 'email': 'alizee@example.com'}),
+            user_change('REMOVE', 'u1', old_image=USERS[0]),
+            user_change('MODIFY', 'u3', {'userId': 'u3', 'name': 'Robert Léger', 'email': 'bob@example.com'})
+        ])
+
+        assert 'u5' in user_ids(search_index.search('aliz'))
+        assert 'u1' not in user_ids(search_index.search('alice'))
+        assert user_ids(search_index.search('robert')) == ['u3']
+
+    def test_handler_search_route(self, search_index):
+        """GET /users/search renvoie des résultats classés et limités"""
+        event = {
+            'httpMethod': 'GET',
+            'path': '/users/search',
+            'queryStringParameters': {'q': 'ali', 'limit': '2'}
+        }
+
+        response = handler(event, {})
+
+        assert response['statusCode'] == 200
+        body = json.loads(response['body'])
+        assert body['count'] == 2
+        assert body['results'][0]['score'] >= body['results'][1]['score']
+
+    @patch('user_search.scan_users', side_effect=AssertionError('no scan in a request'))
+    def test_missing_snapshot_does_not_scan(self, mock_scan, tmp_path):
+        """Sans snapshot, la première recherche ne scanne pas la table"""
+        with patch.object(user_search, 'SNAPSHOT_PATH', str(tmp_path / 'missing.idx')):
+            user_search._index = None
+            index = user_search.get_search_index()
+            try:
+                publish([user_change('INSERT', 'u9', {'userId': 'u9', 'name': 'Zoé Petit', 'email': 'zoe@example.com'})])
+
+                assert index.snapshot is None
+                assert user_ids(index.search('zoe')) == ['u9']
+            finally:
+                unsubscribe(index.on_user_changes)
+                user_search._index = None
+        mock_scan.assert_not_called()
+
+    def test_rebuilt_snapshot_is_reloaded(self, snapshot_path):
+        """Un snapshot reconstruit est rechargé ; les modifications qu'il contient quittent l'index en mémoire"""
+        clock = Mock(return_value=0.0)
+        loader = SnapshotLoader(snapshot_path, refresh_interval=60, clock=clock)
+        index = UserSearchIndex(clock=Mock(return_value=1000.0))
+        user_search.refresh_search_index(index, loader)
+        index.on_user_changes([user_change('INSERT', 'u5', {'userId': 'u5', 'name': 'Alizée', 'email': 'alizee@example.com'})])
+        index.clock.return_value = 3000.0
+        index.on_user_changes([user_change('INSERT', 'u6', {'userId': 'u6', 'name': 'Alix', 'email': 'alix@example.com'})])
+
+        build_snapshot(snapshot_path, [(USERS[1:] + [{'userId': 'u5', 'name': 'Alizée', 'email': 'alizee@example.com'}], None)])
+        os.utime(snapshot_path, (2000.0, 2000.0))
+
+        assert not loader.due()
+        clock.return_value = 61.0
+        assert loader.due()
+        assert user_search.refresh_search_index(index, loader) is True
+        assert not user_search.refresh_search_index(index, loader)
+
+        assert len(index.snapshot) == 4
+        assert set(index.delta.docs) == {'u6'}
+        assert 'u1' not in user_ids(index.search('alice'))
+        assert set(user_ids(index.search('aliz'))) == {'u5'}
+        assert 'u6' in user_ids(index.search('alix'))
+
+    def test_s3_snapshot_is_downloaded_once_per_version(self, snapshot_path, tmp_path):
+        """Le snapshot S3 n'est téléchargé que si son ETag change"""
+        s3 = Mock()
+        s3.head_object.return_value = {
+            'ETag': '"v1"', 'LastModified': datetime(2026, 1, 1, tzinfo=timezone.utc), 'Metadata': {'built-at': '1700000000.0'}
+        }
+        s3.download_file.side_effect = lambda bucket, key, path: os.replace(snapshot_path, path) if os.path.exists(snapshot_path) else None
+        loader = SnapshotLoader(str(tmp_path / 'download.idx'), 's3://search-bucket/users.idx')
+
+        with patch('user_search.boto3.client', return_value=s3):
+            snapshot, built_at = loader.load()
+            assert loader.load() is None
+
+        assert len(snapshot) == 4
+        assert built_at == 1700000000.0
+        s3.download_file.assert_called_once_with('search-bucket', 'users.idx', str(tmp_path / 'download.idx.part'))
+        snapshot.close()
+
+    def test_handler_search_requires_query(self):
+        """GET /users/search sans q répond 400"""
+        response = handler({'httpMethod': 'GET', 'path': '/users/search', 'queryStringParameters': None}, {})
+
+        assert response['statusCode'] == 400